@@ -1,5 +1,5 @@
+import os
 import sys
-print(sys.path)
 
 from logging.config import fileConfig
 from sqlalchemy import engine_from_config, pool
@@ -14,11 +14,14 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# the models live in lib/ and import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+
+from models import Base
+
 # add your model's MetaData object here
 # for 'autogenerate' support
-# from your_application import db_url, models
-# target_metadata = models.Base.metadata
-target_metadata = None  # Update with your actual target metadata
+target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -55,9 +58,6 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
-    # Replace 'your_application' with the actual import path
-    from phase_3_group_2_project import db_url, models
-
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -0,0 +1,44 @@
+"""add workout access path indexes
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_workouts_user_id_date', 'workouts', ['user_id', 'date']),
+    ('ix_workout_exercises_exercise_id', 'workout_exercises', ['exercise_id']),
+]
+
+
+def existing_indexes(table_name):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table_name):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def upgrade() -> None:
+    # tables created later by setup_database() get these indexes from create_all
+    for name, table_name, columns in INDEXES:
+        indexes = existing_indexes(table_name)
+        if indexes is not None and name not in indexes:
+            op.create_index(name, table_name, columns)
+
+
+def downgrade() -> None:
+    for name, table_name, columns in reversed(INDEXES):
+        indexes = existing_indexes(table_name)
+        if indexes and name in indexes:
+            op.drop_index(name, table_name=table_name)
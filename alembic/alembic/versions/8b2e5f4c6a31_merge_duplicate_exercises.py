@@ -0,0 +1,73 @@
+"""merge duplicate exercises into a catalog
+
+Revision ID: 8b2e5f4c6a31
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e5f4c6a31'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('exercises'):
+        # setup_database() will create the table with the unique index
+        return
+
+    # every duplicate exercise mapped to the lowest ID with the same name and type
+    op.execute("""
+        CREATE TEMP TABLE exercise_merge AS
+        SELECT e.id AS old_id, keep.keep_id
+        FROM exercises e
+        JOIN (
+            SELECT lower(trim(name)) AS name_key, lower(type) AS type_key, min(id) AS keep_id
+            FROM exercises
+            GROUP BY lower(trim(name)), lower(type)
+        ) keep ON lower(trim(e.name)) = keep.name_key AND lower(e.type) = keep.type_key
+        WHERE e.id <> keep.keep_id
+    """)
+
+    # a workout can now reference the same exercise more than once, so those
+    # links are combined: sets are added up and reps averaged over the sets,
+    # rounded to whole reps with halves up (as services.average_reps does)
+    op.execute("""
+        CREATE TEMP TABLE merged_links AS
+        SELECT we.workout_id,
+               coalesce(m.keep_id, we.exercise_id) AS exercise_id,
+               sum(we.sets_completed) AS sets_completed,
+               CASE WHEN count(*) = 1 THEN max(we.reps_completed)
+                    ELSE CAST(round(sum(we.sets_completed * we.reps_completed) * 1.0 / nullif(sum(we.sets_completed), 0)) AS INTEGER)
+               END AS reps_completed
+        FROM workout_exercises we
+        LEFT JOIN exercise_merge m ON m.old_id = we.exercise_id
+        GROUP BY we.workout_id, coalesce(m.keep_id, we.exercise_id)
+        HAVING max(m.old_id IS NOT NULL)
+    """)
+    op.execute("""
+        DELETE FROM workout_exercises
+        WHERE exercise_id IN (SELECT old_id FROM exercise_merge)
+           OR (workout_id, exercise_id) IN (SELECT workout_id, exercise_id FROM merged_links)
+    """)
+    op.execute("""
+        INSERT INTO workout_exercises (workout_id, exercise_id, sets_completed, reps_completed)
+        SELECT workout_id, exercise_id, sets_completed, reps_completed FROM merged_links
+    """)
+    op.execute("DELETE FROM exercises WHERE id IN (SELECT old_id FROM exercise_merge)")
+    op.execute("DROP TABLE merged_links")
+    op.execute("DROP TABLE exercise_merge")
+
+    if 'uq_exercises_name_type' not in {index['name'] for index in inspector.get_indexes('exercises')}:
+        op.execute("CREATE UNIQUE INDEX uq_exercises_name_type ON exercises (lower(trim(name)), lower(type))")
+
+
+def downgrade() -> None:
+    # merged exercises cannot be split apart again; only the constraint is removed
+    op.execute("DROP INDEX IF EXISTS uq_exercises_name_type")
@@ -0,0 +1,62 @@
+"""keep the bests of archived workouts where the personal record triggers can read them
+
+Revision ID: a4e7c1f9b352
+Revises: f2b9c6d4e718
+Create Date: 2026-10-19 12:00:00.000000
+
+Databases that already have an archive should run ``python cli.py
+rebuild-records`` afterwards, which fills the new table from the archive.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models import personal_record_triggers
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e7c1f9b352'
+down_revision = 'f2b9c6d4e718'
+branch_labels = None
+depends_on = None
+
+
+# the triggers whose recompute statement changed
+TRIGGER_NAMES = [
+    'personal_records_after_delete',
+    'personal_records_after_update',
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('archived_personal_records'):
+        # setup_database() creates the table
+        op.create_table(
+            'archived_personal_records',
+            sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('exercise_id', sa.Integer, sa.ForeignKey('exercises.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('best_sets', sa.Integer, nullable=False),
+            sa.Column('best_sets_workout_id', sa.Integer, nullable=False),
+            sa.Column('best_reps', sa.Integer, nullable=False),
+            sa.Column('best_reps_workout_id', sa.Integer, nullable=False),
+            sa.Column('best_volume', sa.Integer, nullable=False),
+            sa.Column('best_volume_workout_id', sa.Integer, nullable=False),
+        )
+    if bind.dialect.name != 'sqlite' or not sa.inspect(bind).has_table('personal_records'):
+        return
+    for name in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    # the others already exist and are skipped
+    for trigger in personal_record_triggers():
+        op.execute(trigger)
+
+
+def downgrade() -> None:
+    # the triggers read the table, so they go back to recomputing from hot rows only first
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite' and sa.inspect(bind).has_table('personal_records'):
+        for name in TRIGGER_NAMES:
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for trigger in personal_record_triggers(archived_bests=False):
+            op.execute(trigger)
+    op.drop_table('archived_personal_records')
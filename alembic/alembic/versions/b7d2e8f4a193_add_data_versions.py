@@ -0,0 +1,31 @@
+"""add data versions for caches built from workouts
+
+Revision ID: b7d2e8f4a193
+Revises: e5a9b3c7d214
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e8f4a193'
+down_revision = 'e5a9b3c7d214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('data_versions'):
+        # setup_database() creates the table
+        return
+    op.create_table(
+        'data_versions',
+        sa.Column('name', sa.String, primary_key=True),
+        sa.Column('version', sa.Integer, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('data_versions')
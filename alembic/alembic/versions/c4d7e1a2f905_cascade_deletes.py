@@ -0,0 +1,74 @@
+"""cascade deletes from users to workouts to workout exercises
+
+Revision ID: c4d7e1a2f905
+Revises: 8b2e5f4c6a31
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7e1a2f905'
+down_revision = '8b2e5f4c6a31'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, referenced table) for every foreign key that should cascade
+FOREIGN_KEYS = [
+    ('workouts', 'user_id', 'users'),
+    ('workout_exercises', 'workout_id', 'workouts'),
+    ('workout_exercises', 'exercise_id', 'exercises'),
+]
+
+
+def table_definitions(ondelete):
+    metadata = sa.MetaData()
+    workouts = sa.Table(
+        'workouts', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('date', sa.Date, nullable=False),
+        sa.Column('duration', sa.Integer),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete=ondelete), nullable=False),
+        sa.Index('ix_workouts_user_id_date', 'user_id', 'date'),
+    )
+    workout_exercises = sa.Table(
+        'workout_exercises', metadata,
+        sa.Column('workout_id', sa.Integer, sa.ForeignKey('workouts.id', ondelete=ondelete), primary_key=True),
+        sa.Column('exercise_id', sa.Integer, sa.ForeignKey('exercises.id', ondelete=ondelete), primary_key=True),
+        sa.Column('sets_completed', sa.Integer),
+        sa.Column('reps_completed', sa.Integer),
+        sa.Index('ix_workout_exercises_exercise_id', 'exercise_id'),
+    )
+    return [workouts, workout_exercises]
+
+
+def rebuild_foreign_keys(ondelete):
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if bind.dialect.name == 'sqlite':
+        # SQLite cannot alter a constraint, so each table is copied into a new
+        # definition; existing orphans are kept and can be removed with purge-orphans
+        for table in table_definitions(ondelete):
+            if inspector.has_table(table.name):
+                with op.batch_alter_table(table.name, copy_from=table, recreate='always'):
+                    pass
+        return
+
+    for table_name, column, referred_table in FOREIGN_KEYS:
+        if not inspector.has_table(table_name):
+            continue
+        for foreign_key in inspector.get_foreign_keys(table_name):
+            if foreign_key['constrained_columns'] == [column]:
+                op.drop_constraint(foreign_key['name'], table_name, type_='foreignkey')
+        op.create_foreign_key(f'fk_{table_name}_{column}', table_name, referred_table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    rebuild_foreign_keys('CASCADE')
+
+
+def downgrade() -> None:
+    rebuild_foreign_keys(None)
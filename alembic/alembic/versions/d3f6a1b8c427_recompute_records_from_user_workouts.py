@@ -0,0 +1,41 @@
+"""recompute personal records starting from the user's workouts
+
+Revision ID: d3f6a1b8c427
+Revises: b7d2e8f4a193
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models import personal_record_triggers
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f6a1b8c427'
+down_revision = 'b7d2e8f4a193'
+branch_labels = None
+depends_on = None
+
+
+# the triggers whose recompute statement changed
+TRIGGER_NAMES = [
+    'personal_records_after_delete',
+    'personal_records_after_update',
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite' or not sa.inspect(bind).has_table('personal_records'):
+        return
+    for name in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    # the others already exist and are skipped
+    for trigger in personal_record_triggers(archived_bests=False):
+        op.execute(trigger)
+
+
+def downgrade() -> None:
+    # the previous triggers computed the same records, only with a slower plan
+    pass
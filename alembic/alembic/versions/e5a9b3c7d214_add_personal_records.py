@@ -0,0 +1,56 @@
+"""add personal records maintained by triggers
+
+Revision ID: e5a9b3c7d214
+Revises: c4d7e1a2f905
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models import personal_record_triggers, PERSONAL_RECORDS_COLUMNS, personal_records_select
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9b3c7d214'
+down_revision = 'c4d7e1a2f905'
+branch_labels = None
+depends_on = None
+
+
+TRIGGER_NAMES = [
+    'personal_records_after_insert',
+    'personal_records_after_delete',
+    'personal_records_after_update',
+    'personal_records_before_workout_delete',
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('workout_exercises') or inspector.has_table('personal_records'):
+        # setup_database() creates the table, its triggers and its contents
+        return
+
+    op.create_table(
+        'personal_records',
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('exercise_id', sa.Integer, sa.ForeignKey('exercises.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('best_sets', sa.Integer, nullable=False),
+        sa.Column('best_sets_workout_id', sa.Integer, nullable=False),
+        sa.Column('best_reps', sa.Integer, nullable=False),
+        sa.Column('best_reps_workout_id', sa.Integer, nullable=False),
+        sa.Column('best_volume', sa.Integer, nullable=False),
+        sa.Column('best_volume_workout_id', sa.Integer, nullable=False),
+    )
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in personal_record_triggers(archived_bests=False):
+            op.execute(trigger)
+    op.execute(f"INSERT INTO personal_records ({PERSONAL_RECORDS_COLUMNS}) {personal_records_select()}")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        for name in TRIGGER_NAMES:
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_table('personal_records')
@@ -0,0 +1,61 @@
+"""never reuse workout IDs, so archived workouts keep theirs
+
+Revision ID: f2b9c6d4e718
+Revises: d3f6a1b8c427
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models import personal_record_triggers
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b9c6d4e718'
+down_revision = 'd3f6a1b8c427'
+branch_labels = None
+depends_on = None
+
+
+# SQLite refuses to rename a table while a trigger refers to the old name
+TRIGGER_NAMES = [
+    'personal_records_after_insert',
+    'personal_records_after_delete',
+    'personal_records_after_update',
+    'personal_records_before_workout_delete',
+]
+
+def workouts_definition(autoincrement):
+    return sa.Table(
+        'workouts', sa.MetaData(),
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('date', sa.Date, nullable=False),
+        sa.Column('duration', sa.Integer),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Index('ix_workouts_user_id_date', 'user_id', 'date'),
+        sqlite_autoincrement=autoincrement,
+    )
+
+
+def rebuild_workouts(autoincrement):
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite' or not sa.inspect(bind).has_table('workouts'):
+        return
+    for name in TRIGGER_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    # copying the rows sets the high-water mark to the highest hot ID; the
+    # archive command raises it above the archived IDs
+    with op.batch_alter_table('workouts', copy_from=workouts_definition(autoincrement), recreate='always'):
+        pass
+    if sa.inspect(bind).has_table('personal_records'):
+        for trigger in personal_record_triggers(archived_bests=False):
+            op.execute(trigger)
+
+
+def upgrade() -> None:
+    rebuild_workouts(True)
+
+
+def downgrade() -> None:
+    rebuild_workouts(False)
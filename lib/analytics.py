@@ -0,0 +1,192 @@
+"""Per-user training aggregates computed in the database.
+
+Every report is a single GROUP BY query over the (user_id, date) index, so the
+cost depends on the number of periods returned rather than the number of
+workouts and exercise rows behind them.
+"""
+from datetime import date, timedelta
+from sqlalchemy import func, distinct, case, cast, literal, literal_column, Integer, Date
+from models import Workout, Exercise, WorkoutExercises
+
+PERIODS = ('week', 'month')
+
+def iso_week(session, column):
+    """The ISO 8601 week (YYYY-Www) of a date column; weeks start on Monday and a year's first week holds its first Thursday"""
+    if session.get_bind().dialect.name == 'sqlite':
+        # SQLite before 3.46 has no %G/%V, so the week is counted from the Thursday of the same week
+        thursday = func.date(column, 'weekday 0', '-3 days')
+        return func.printf('%s-W%02d', func.strftime('%Y', thursday), (cast(func.strftime('%j', thursday), Integer) + 6) / 7)
+    return func.to_char(column, 'IYYY-"W"IW')
+
+def period_bucket(session, column, period):
+    """Label a date column with the ISO week (YYYY-Www) or month (YYYY-MM) it falls in"""
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}, expected one of: {', '.join(PERIODS)}")
+    if period == 'week':
+        return iso_week(session, column)
+    if session.get_bind().dialect.name == 'sqlite':
+        return func.strftime('%Y-%m', column)
+    return func.to_char(column, 'YYYY-MM')
+
+def filter_range(query, user_id, start=None, end=None):
+    query = query.filter(Workout.user_id == user_id)
+    if start is not None:
+        query = query.filter(Workout.date >= start)
+    if end is not None:
+        query = query.filter(Workout.date <= end)
+    return query
+
+def training_volume(session, user_id, period='week', start=None, end=None):
+    """Sets x reps (and sets x reps x difficulty) per period, with the change from the previous period"""
+    bucket = period_bucket(session, Workout.date, period).label('period')
+    reps = WorkoutExercises.sets_completed * WorkoutExercises.reps_completed
+    query = session.query(
+        bucket,
+        func.sum(reps).label('total_reps'),
+        func.sum(reps * Exercise.difficulty).label('volume'),
+    ).select_from(Workout).join(WorkoutExercises).join(Exercise)
+    per_period = filter_range(query, user_id, start, end).group_by(bucket).subquery()
+
+    previous_volume = func.lag(per_period.c.volume).over(order_by=per_period.c.period)
+    return session.query(
+        per_period.c.period,
+        per_period.c.total_reps,
+        per_period.c.volume,
+        (per_period.c.volume - previous_volume).label('volume_change'),
+    ).order_by(per_period.c.period).all()
+
+def workout_durations(session, user_id, period='week', start=None, end=None):
+    """Number of workouts and minutes trained per period, with a running total of minutes"""
+    bucket = period_bucket(session, Workout.date, period).label('period')
+    query = session.query(
+        bucket,
+        func.count(Workout.id).label('workouts'),
+        func.coalesce(func.sum(Workout.duration), 0).label('minutes'),
+        func.avg(Workout.duration).label('average_minutes'),
+    )
+    per_period = filter_range(query, user_id, start, end).group_by(bucket).subquery()
+
+    running_minutes = func.sum(per_period.c.minutes).over(order_by=per_period.c.period)
+    return session.query(
+        per_period.c.period,
+        per_period.c.workouts,
+        per_period.c.minutes,
+        per_period.c.average_minutes,
+        running_minutes.label('running_minutes'),
+    ).order_by(per_period.c.period).all()
+
+def volume_by_type(session, user_id, start=None, end=None):
+    """Training volume per exercise type and its share of the user's total volume"""
+    reps = WorkoutExercises.sets_completed * WorkoutExercises.reps_completed
+    volume = func.sum(reps * Exercise.difficulty)
+    query = session.query(
+        Exercise.type.label('type'),
+        func.count(distinct(Workout.id)).label('workouts'),
+        func.sum(WorkoutExercises.sets_completed).label('sets'),
+        func.sum(reps).label('total_reps'),
+        volume.label('volume'),
+        (100.0 * volume / func.sum(volume).over()).label('share'),
+    ).select_from(Workout).join(WorkoutExercises).join(Exercise)
+    return filter_range(query, user_id, start, end).group_by(Exercise.type).order_by(volume.desc()).all()
+
+def day_offset(session, day_column, offset):
+    """A value that stays constant across consecutive days when ``offset`` counts them"""
+    if session.get_bind().dialect.name == 'sqlite':
+        return func.julianday(day_column) - offset
+    return day_column - offset
+
+def streaks(session, user_id, today=None, start=None, end=None):
+    """Current and longest runs of consecutive training days, in one query.
+
+    Consecutive days minus their row number give the same value, so each run
+    ("island") is one GROUP BY bucket. A run is current if its last day is
+    today or yesterday. Returns a row with ``current``, ``current_since``,
+    ``longest``, ``streaks`` and ``training_days``.
+    """
+    today = today or date.today()
+    end = min(end, today) if end else today
+    days = filter_range(session.query(Workout.date.label('day')), user_id, start, end).distinct().subquery()
+    numbered = session.query(
+        days.c.day,
+        day_offset(session, days.c.day, func.row_number().over(order_by=days.c.day)).label('island'),
+    ).subquery()
+    runs = session.query(
+        func.min(numbered.c.day).label('first_day'),
+        func.max(numbered.c.day).label('last_day'),
+        func.count().label('days'),
+    ).group_by(numbered.c.island).subquery()
+    alive = runs.c.last_day >= today - timedelta(days=1)
+    return session.query(
+        func.coalesce(func.max(case((alive, runs.c.days), else_=0)), 0).label('current'),
+        func.max(case((alive, runs.c.first_day))).label('current_since'),
+        func.coalesce(func.max(runs.c.days), 0).label('longest'),
+        func.count().label('streaks'),
+        func.coalesce(func.sum(runs.c.days), 0).label('training_days'),
+    ).one()
+
+def week_start(session, column):
+    """The Monday of the week a date falls in"""
+    if session.get_bind().dialect.name == 'sqlite':
+        return func.date(column, 'weekday 0', '-6 days')
+    return cast(func.date_trunc('week', column), Date)
+
+def add_days(session, column, days):
+    """The date ``days`` days after a date"""
+    if session.get_bind().dialect.name == 'sqlite':
+        return func.date(column, f'+{days} days')
+    return column + days
+
+def weekly_frequency(session, user_id, start=None, end=None):
+    """Workouts and training days per week, with a rolling four-week average of workouts.
+
+    Weeks without workouts are listed with zeros and count in the average. A
+    recursive CTE generates every week from ``start`` (or the first workout)
+    to ``end`` (or the last one), and the weeks trained are left joined to it.
+    """
+    monday = week_start(session, Workout.date).label('week_start')
+    query = session.query(
+        monday,
+        func.count(Workout.id).label('workouts'),
+        func.count(distinct(Workout.date)).label('days'),
+        func.coalesce(func.sum(Workout.duration), 0).label('minutes'),
+    )
+    per_week = filter_range(query, user_id, start, end).group_by(monday).cte('per_week')
+
+    first_week = literal(start - timedelta(days=start.weekday()), Date) if start else func.min(per_week.c.week_start)
+    last_week = literal(end - timedelta(days=end.weekday()), Date) if end else func.max(per_week.c.week_start)
+    weeks = session.query(first_week.label('week_start'), last_week.label('last_week'))
+    if not (start and end):
+        weeks = weeks.select_from(per_week)
+    weeks = weeks.cte('weeks', recursive=True)
+    weeks = weeks.union_all(
+        session.query(add_days(session, weeks.c.week_start, 7), weeks.c.last_week).filter(weeks.c.week_start < weeks.c.last_week)
+    )
+
+    # a literal zero: SQLAlchemy binds the frame bounds ahead of the function
+    # arguments, so a bound zero would swap places with them
+    workouts = func.coalesce(per_week.c.workouts, literal_column('0'))
+    rolling = func.avg(workouts).over(order_by=weeks.c.week_start, rows=(-3, 0))
+    return session.query(
+        iso_week(session, weeks.c.week_start).label('week'),
+        workouts.label('workouts'),
+        func.coalesce(per_week.c.days, 0).label('days'),
+        func.coalesce(per_week.c.minutes, 0).label('minutes'),
+        rolling.label('rolling_average'),
+    ).select_from(weeks).outerjoin(per_week, per_week.c.week_start == weeks.c.week_start).filter(
+        weeks.c.week_start.isnot(None), weeks.c.last_week.isnot(None)
+    ).order_by(weeks.c.week_start).all()
+
+def calendar_heatmap(session, user_id, start=None, end=None, levels=4):
+    """Workouts and minutes per training day, each day ranked into ``levels`` intensity levels by minutes"""
+    query = session.query(
+        Workout.date.label('day'),
+        func.count(Workout.id).label('workouts'),
+        func.coalesce(func.sum(Workout.duration), 0).label('minutes'),
+    )
+    per_day = filter_range(query, user_id, start, end).group_by(Workout.date).subquery()
+    return session.query(
+        per_day.c.day,
+        per_day.c.workouts,
+        per_day.c.minutes,
+        func.ntile(levels).over(order_by=per_day.c.minutes).label('level'),
+    ).order_by(per_day.c.day).all()
@@ -0,0 +1,310 @@
+"""Local HTTP/JSON API over the models for the mobile app.
+
+Each request runs on its own thread with its own session from a
+``scoped_session`` registry. The session is removed when the request
+finishes, so no ORM state is shared between requests. Connections come from
+the engine's pool (see database.create_database_engine).
+
+    GET    /users?after=<id>&limit=<n>
+    POST   /users                       {"username", "password", "name", "age", "fitness_goals"}
+    GET    /users/<id>
+    GET    /users/<id>/workouts?after=<id>&limit=<n>
+    POST   /users/<id>/workouts         {"date": "YYYY-MM-DD", "duration", "exercises": [...]}
+    GET    /users/<id>/exercises?after=<id>&limit=<n>
+    GET    /users/<id>/records
+    GET    /workouts/<id>               (with its exercises)
+    POST   /workouts/<id>/sets          {"exercise_id", "sets", "reps"}  (queued, 202)
+    DELETE /workouts/<id>
+    GET    /exercises?after=<id>&limit=<n>
+    GET    /exercises/<id>
+    GET    /stats/distributions?metric=<reps_completed|sets_completed|duration>&by=<all|user|type>&user_id=<id>
+    GET    /cache/stats                 (lookup cache hit rate, size and evictions)
+    GET    /ingest/stats                (write-behind queue throughput and commit latency)
+
+    python api_server.py --port 8000
+"""
+import json
+import queue
+import re
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import scoped_session
+from database import setup_database
+from ingest import IngestQueue
+from models import User, Workout, Exercise, PersonalRecord, lookup_cache
+from services import log_workout
+
+USER_FIELDS = ['id', 'username', 'name', 'age', 'fitness_goals']
+WORKOUT_FIELDS = ['id', 'date', 'duration', 'user_id']
+EXERCISE_FIELDS = ['id', 'name', 'type', 'difficulty', 'sets', 'reps']
+RECORD_FIELDS = ['best_sets', 'best_sets_workout_id', 'best_reps', 'best_reps_workout_id', 'best_volume', 'best_volume_workout_id']
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+INGEST_TIMEOUT = 5
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def to_dict(instance, fields):
+    return {field: getattr(instance, field) for field in fields}
+
+def workout_with_exercises(workout):
+    data = to_dict(workout, WORKOUT_FIELDS)
+    data['exercises'] = [dict(to_dict(link.exercise, EXERCISE_FIELDS), sets_completed=link.sets_completed, reps_completed=link.reps_completed) for link in workout.exercises]
+    return data
+
+def record_to_dict(record):
+    return dict(to_dict(record, RECORD_FIELDS), exercise=to_dict(record.exercise, EXERCISE_FIELDS))
+
+def page_params(query):
+    try:
+        after = int(query['after'][0]) if 'after' in query else None
+        limit = min(int(query.get('limit', [DEFAULT_PAGE_SIZE])[0]), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError(400, "after and limit must be integers")
+    if limit <= 0:
+        raise ApiError(400, "limit must be a positive integer")
+    return after, limit
+
+def page(items, fields, limit):
+    return {'items': [to_dict(item, fields) for item in items], 'next_after': items[-1].id if len(items) == limit else None}
+
+def require(found, what):
+    if found is None:
+        raise ApiError(404, f"{what} not found")
+    return found
+
+def positive_int(body, key, required=True):
+    value = body.get(key)
+    if value is None and not required:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise ApiError(400, f"{key} must be a positive integer")
+    return value
+
+def list_users(session, query, body):
+    after, limit = page_params(query)
+    return 200, page(User.page_after(session, after, limit), USER_FIELDS, limit)
+
+def create_user(session, query, body):
+    for key in ('username', 'password', 'name'):
+        if not isinstance(body.get(key), str) or not body[key]:
+            raise ApiError(400, f"{key} is required")
+    try:
+        user = User.create(session, body['username'], body['password'], body['name'], positive_int(body, 'age', required=False), body.get('fitness_goals'))
+    except IntegrityError:
+        session.rollback()
+        raise ApiError(409, "username already exists")
+    return 201, to_dict(user, USER_FIELDS)
+
+def get_user(session, query, body, user_id):
+    return 200, to_dict(require(User.lookup(session, user_id), "user"), USER_FIELDS)
+
+def list_user_workouts(session, query, body, user_id):
+    after, limit = page_params(query)
+    return 200, page(Workout.page_after(session, after, limit, user_id=user_id), WORKOUT_FIELDS, limit)
+
+def create_user_workout(session, query, body, user_id):
+    require(User.lookup(session, user_id), "user")
+    try:
+        workout_date = date.fromisoformat(str(body.get('date')))
+    except ValueError:
+        raise ApiError(400, "date must be YYYY-MM-DD")
+    exercises = body.get('exercises', [])
+    if not isinstance(exercises, list):
+        raise ApiError(400, "exercises must be a list")
+    for exercise in exercises:
+        if not isinstance(exercise, dict) or not exercise.get('name') or not exercise.get('type'):
+            raise ApiError(400, "each exercise needs a name and type")
+        for key in ('difficulty', 'sets', 'reps'):
+            positive_int(exercise, key)
+    try:
+        workout = log_workout(session, user_id, workout_date, positive_int(body, 'duration'), exercises)
+    except IntegrityError as e:
+        raise ApiError(400, f"invalid workout: {e.orig}")
+    data = workout_with_exercises(Workout.find_with_exercises(session, workout.id))
+    data['new_records'] = [record_to_dict(record) for record in PersonalRecord.set_by_workout(session, workout.id)]
+    return 201, data
+
+def list_user_exercises(session, query, body, user_id):
+    after, limit = page_params(query)
+    return 200, page(Exercise.page_after(session, after, limit, user_id=user_id), EXERCISE_FIELDS, limit)
+
+def list_user_records(session, query, body, user_id):
+    require(User.lookup(session, user_id), "user")
+    return 200, {'items': [record_to_dict(record) for record in PersonalRecord.get_user_records(session, user_id)]}
+
+def get_workout(session, query, body, workout_id):
+    return 200, workout_with_exercises(require(Workout.find_with_exercises(session, workout_id), "workout"))
+
+def delete_workout(session, query, body, workout_id):
+    require(Workout.lookup(session, workout_id), "workout")
+    Workout.delete(session, workout_id)
+    return 204, None
+
+def log_workout_sets(session, query, body, workout_id):
+    require(Workout.lookup(session, workout_id), "workout")
+    exercise_id = positive_int(body, 'exercise_id')
+    require(Exercise.lookup(session, exercise_id), "exercise")
+    try:
+        # a full queue holds the request back for a while before giving up
+        ingest_queues[session.get_bind()].log_sets(workout_id, exercise_id, positive_int(body, 'sets', required=False) or 1, positive_int(body, 'reps'), timeout=INGEST_TIMEOUT)
+    except (queue.Full, RuntimeError):
+        raise ApiError(503, "too many queued set completions, try again later")
+    return 202, {'queued': True}
+
+def get_ingest_stats(session, query, body):
+    return 200, ingest_queues[session.get_bind()].stats()
+
+def list_exercises(session, query, body):
+    after, limit = page_params(query)
+    return 200, page(Exercise.page_after(session, after, limit), EXERCISE_FIELDS, limit)
+
+def get_exercise(session, query, body, exercise_id):
+    return 200, to_dict(require(Exercise.lookup(session, exercise_id), "exercise"), EXERCISE_FIELDS)
+
+def get_distributions(session, query, body):
+    from columnar import snapshot_for
+    metric = query.get('metric', ['reps_completed'])[0]
+    by = query.get('by', ['all'])[0]
+    try:
+        user_id = int(query['user_id'][0]) if 'user_id' in query else None
+        rows = snapshot_for(session.get_bind()).distribution(metric, by, user_id)
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    return 200, {'metric': metric, 'by': by, 'items': [row._asdict() for row in rows]}
+
+def get_cache_stats(session, query, body):
+    return 200, lookup_cache(session).stats()
+
+ROUTES = [
+    ('GET', r'/users', list_users),
+    ('POST', r'/users', create_user),
+    ('GET', r'/users/(\d+)', get_user),
+    ('GET', r'/users/(\d+)/workouts', list_user_workouts),
+    ('POST', r'/users/(\d+)/workouts', create_user_workout),
+    ('GET', r'/users/(\d+)/exercises', list_user_exercises),
+    ('GET', r'/users/(\d+)/records', list_user_records),
+    ('GET', r'/workouts/(\d+)', get_workout),
+    ('DELETE', r'/workouts/(\d+)', delete_workout),
+    ('POST', r'/workouts/(\d+)/sets', log_workout_sets),
+    ('GET', r'/exercises', list_exercises),
+    ('GET', r'/exercises/(\d+)', get_exercise),
+    ('GET', r'/stats/distributions', get_distributions),
+    ('GET', r'/cache/stats', get_cache_stats),
+    ('GET', r'/ingest/stats', get_ingest_stats),
+]
+ROUTES = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in ROUTES]
+
+def make_handler(Session):
+    """Build a request handler class bound to a scoped session registry"""
+
+    class ApiRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # responses are written as headers then body; don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def dispatch(self, method):
+            url = urlsplit(self.path)
+            path = url.path.rstrip('/') or '/'
+            try:
+                allowed = False
+                for route_method, pattern, handler in ROUTES:
+                    match = pattern.match(path)
+                    if not match:
+                        continue
+                    allowed = True
+                    if route_method == method:
+                        break
+                else:
+                    raise ApiError(405 if allowed else 404, "method not allowed" if allowed else "no such endpoint")
+
+                body = self.read_body() if method == 'POST' else {}
+                status, payload = handler(Session(), parse_qs(url.query), body, *(int(group) for group in match.groups()))
+            except ApiError as e:
+                status, payload = e.status, {'error': str(e)}
+            except Exception as e:
+                Session().rollback()
+                status, payload = 500, {'error': f"internal error: {e}"}
+            finally:
+                Session.remove()
+            self.send_json(status, payload)
+
+        def read_body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                raise ApiError(400, "request body must be JSON")
+            if not isinstance(body, dict):
+                raise ApiError(400, "request body must be a JSON object")
+            return body
+
+        def send_json(self, status, payload):
+            data = b'' if payload is None else json.dumps(payload, default=str).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self.dispatch('GET')
+
+        def do_POST(self):
+            self.dispatch('POST')
+
+        def do_DELETE(self):
+            self.dispatch('DELETE')
+
+        def log_message(self, format, *args):
+            if self.server.verbose:
+                super().log_message(format, *args)
+
+    return ApiRequestHandler
+
+# the write-behind queue for set completions of each server's engine
+ingest_queues = {}
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def server_close(self):
+        # commit the queued set completions before going away
+        ingest_queues.pop(self.engine).close()
+        super().server_close()
+
+def make_server(host='127.0.0.1', port=8000, database=None, verbose=False):
+    """Create (but do not start) a threaded API server and its scoped session registry"""
+    DBSession, engine = setup_database(database)
+    Session = scoped_session(DBSession)
+    ingest_queues[engine] = IngestQueue(DBSession)
+    server = ApiServer((host, port), make_handler(Session))
+    server.engine = engine
+    server.verbose = verbose
+    return server
+
+if __name__ == '__main__':
+    import click
+
+    @click.command()
+    @click.option('--host', default='127.0.0.1', show_default=True)
+    @click.option('--port', default=8000, show_default=True, type=int)
+    @click.option('--database', help='Database URL (defaults to the FITNESS_TRACKER_DATABASE_URL setting)')
+    @click.option('--verbose', is_flag=True, help='Log every request')
+    def main(host, port, database, verbose):
+        """Serve users, workouts and exercises as JSON"""
+        server = make_server(host, port, database, verbose)
+        click.echo(f"Serving the Fitness Tracker API on http://{host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+        finally:
+            server.server_close()
+
+    main()
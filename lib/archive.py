@@ -0,0 +1,223 @@
+"""Move old workouts out of the hot database into an attached archive file.
+
+Workouts dated before a cutoff, with their workout exercises, are moved from
+``fitness_tracker.db`` into ``fitness_tracker_archive.db`` next to it, one
+chunk of workouts per transaction. Once the archive file exists every
+connection ATTACHes it as ``archive`` when it is checked out and defines TEMP
+views (``all_workouts``, ``all_workout_exercises``) over both files, and
+Workout.get_user_workouts reads the view when a date range starts before the
+cutoff. Other reports only read the hot tables.
+
+Workout IDs are AUTOINCREMENT, so SQLite never hands out the ID of an
+archived workout again and an ID names one workout across both files.
+
+Personal records set by archived workouts are kept: the best rows of each
+user and exercise in the archive are summarized in ``archived_personal_records``
+in the main database, which the record triggers read. With a WAL database a
+transaction that writes both files is atomic per file only, so a crash can
+leave a chunk in both; running the archival again repairs it.
+"""
+import os
+import sqlite3
+import weakref
+from collections import namedtuple
+from datetime import date
+from sqlalchemy import event, text, bindparam
+from sqlalchemy.exc import OperationalError
+from models import ARCHIVE_SCHEMA, PERSONAL_RECORDS_COLUMNS, personal_records_select, improve_record, lookup_caches, bump_data_version
+
+ARCHIVE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS workouts (
+        id INTEGER PRIMARY KEY,
+        date DATE NOT NULL,
+        duration INTEGER,
+        user_id INTEGER NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_workouts_user_id_date ON workouts (user_id, date)",
+    """CREATE TABLE IF NOT EXISTS workout_exercises (
+        workout_id INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        sets_completed INTEGER,
+        reps_completed INTEGER,
+        PRIMARY KEY (workout_id, exercise_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_workout_exercises_exercise_id ON workout_exercises (exercise_id)",
+    # one row: workouts before this date may be in the archive
+    "CREATE TABLE IF NOT EXISTS archive_cutoff (cutoff DATE NOT NULL)",
+]
+
+# a view in main cannot refer to an attached database, so these are TEMP views per connection
+ARCHIVE_VIEWS = [
+    f"""CREATE TEMP VIEW IF NOT EXISTS all_workouts AS
+        SELECT id, date, duration, user_id FROM main.workouts
+        UNION ALL SELECT id, date, duration, user_id FROM {ARCHIVE_SCHEMA}.workouts""",
+    f"""CREATE TEMP VIEW IF NOT EXISTS all_workout_exercises AS
+        SELECT workout_id, exercise_id, sets_completed, reps_completed FROM main.workout_exercises
+        UNION ALL SELECT workout_id, exercise_id, sets_completed, reps_completed FROM {ARCHIVE_SCHEMA}.workout_exercises""",
+]
+
+# the configured archive file of each engine; see attach_archive
+archive_paths = weakref.WeakKeyDictionary()
+
+TableSize = namedtuple('TableSize', ['database', 'table', 'rows', 'bytes'])
+
+def default_archive_path(database_path):
+    root, extension = os.path.splitext(database_path)
+    return f"{root}_archive{extension or '.db'}"
+
+def attach_archive(engine, path):
+    """ATTACH the archive at ``path`` to each connection the engine hands out, once the file exists
+
+    Pooled connections are checked again at every checkout, so they pick up
+    an archive another process created after they were opened.
+    """
+    archive_paths[engine] = path
+
+    @event.listens_for(engine, 'connect')
+    def attach(dbapi_connection, connection_record):
+        if ARCHIVE_SCHEMA in connection_record.info.get('attached', ()) or not os.path.exists(path):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+        for view in ARCHIVE_VIEWS:
+            cursor.execute(view)
+        cursor.close()
+        connection_record.info.setdefault('attached', set()).add(ARCHIVE_SCHEMA)
+
+    @event.listens_for(engine, 'checkout')
+    def attach_on_checkout(dbapi_connection, connection_record, connection_proxy):
+        attach(dbapi_connection, connection_record)
+
+def create_archive(path):
+    """Create the archive file and its tables if missing; returns whether the file is new"""
+    created = not os.path.exists(path)
+    connection = sqlite3.connect(path)
+    try:
+        for statement in ARCHIVE_TABLES:
+            connection.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+    return created
+
+def table_sizes(connection, database='main'):
+    """Rows and bytes (with indexes) of each table in ``database``; bytes are None without SQLite's dbstat"""
+    tables = [name for (name,) in connection.exec_driver_sql(
+        f"SELECT name FROM {database}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    try:
+        size_by_table = dict(connection.exec_driver_sql(
+            f"SELECT m.tbl_name, sum(s.pgsize) FROM dbstat('{database}') s JOIN {database}.sqlite_master m ON m.name = s.name GROUP BY m.tbl_name"
+        ).all())
+    except OperationalError:
+        size_by_table = {}
+    return [
+        TableSize(database, name, connection.exec_driver_sql(f'SELECT count(*) FROM {database}."{name}"').scalar(), size_by_table.get(name))
+        for name in tables
+    ]
+
+def database_sizes(engine):
+    """table_sizes for the main database and, when attached, the archive"""
+    with engine.connect() as connection:
+        sizes = table_sizes(connection)
+        if ARCHIVE_SCHEMA in connection.info.get('attached', ()):
+            sizes += table_sizes(connection, ARCHIVE_SCHEMA)
+    return sizes
+
+def set_cutoff(connection, cutoff):
+    """Record ``cutoff``, or keep the stored one if it is later; returns the stored cutoff"""
+    previous = connection.execute(text(f"SELECT cutoff FROM {ARCHIVE_SCHEMA}.archive_cutoff")).scalar()
+    if previous is not None and date.fromisoformat(previous) >= cutoff:
+        return date.fromisoformat(previous)
+    connection.execute(text(f"DELETE FROM {ARCHIVE_SCHEMA}.archive_cutoff"))
+    connection.execute(text(f"INSERT INTO {ARCHIVE_SCHEMA}.archive_cutoff (cutoff) VALUES (:cutoff)"), {'cutoff': cutoff.isoformat()})
+    return cutoff
+
+def expanding(sql):
+    return text(sql).bindparams(bindparam('ids', expanding=True))
+
+# the bests of the moved rows, merged into the archived bests the record triggers read
+ARCHIVE_BESTS = expanding(f"""
+    INSERT INTO main.archived_personal_records ({PERSONAL_RECORDS_COLUMNS})
+    {personal_records_select('WHERE we.workout_id IN :ids')}
+    ON CONFLICT (user_id, exercise_id) DO UPDATE SET {improve_record('sets')}, {improve_record('reps')}, {improve_record('volume')}""")
+MOVE_STATEMENTS = [
+    (None, ARCHIVE_BESTS),
+    ('workouts', expanding(f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.workouts (id, date, duration, user_id) SELECT id, date, duration, user_id FROM main.workouts WHERE id IN :ids")),
+    ('workout_exercises', expanding(
+        f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.workout_exercises (workout_id, exercise_id, sets_completed, reps_completed) "
+        "SELECT workout_id, exercise_id, sets_completed, reps_completed FROM main.workout_exercises WHERE workout_id IN :ids"
+    )),
+    (None, expanding("DELETE FROM main.workout_exercises WHERE workout_id IN :ids")),
+    (None, expanding("DELETE FROM main.workouts WHERE id IN :ids")),
+]
+
+def move_workouts(connection, workout_ids):
+    """Move workouts and their workout exercises to the archive; the caller owns the transaction"""
+    # the archived bests are written before the hot rows go, so the delete
+    # triggers recompute the records from both and they stay as they were
+    counts = {'workouts': 0, 'workout_exercises': 0}
+    for table, statement in MOVE_STATEMENTS:
+        result = connection.execute(statement, {'ids': workout_ids})
+        if table:
+            counts[table] += result.rowcount
+    # the workouts left the hot tables, which is all that columnar snapshots read
+    bump_data_version(connection)
+    return counts
+
+def keep_ids_above_archive(connection):
+    """Raise the AUTOINCREMENT high-water mark of workouts above every archived ID
+
+    Moving a workout never lowers it, but an archive written before workouts
+    was AUTOINCREMENT can hold IDs above the mark.
+    """
+    if not connection.execute(text("SELECT 1 FROM main.sqlite_master WHERE name = 'sqlite_sequence'")).scalar():
+        return
+    archived_max = connection.execute(text(f"SELECT max(id) FROM {ARCHIVE_SCHEMA}.workouts")).scalar()
+    if archived_max is None:
+        return
+    if connection.execute(text("UPDATE main.sqlite_sequence SET seq = max(seq, :id) WHERE name = 'workouts'"), {'id': archived_max}).rowcount == 0:
+        connection.execute(text("INSERT INTO main.sqlite_sequence (name, seq) VALUES ('workouts', :id)"), {'id': archived_max})
+
+def archive_workouts(engine, cutoff, chunk_size=1000, on_chunk=None):
+    """Move workouts dated before ``cutoff`` and their workout exercises into the archive.
+
+    Each chunk of ``chunk_size`` workouts is moved in its own transaction, and
+    ``on_chunk(counts)`` is called after each one with the running totals.
+    Returns the totals per table.
+    """
+    path = archive_paths.get(engine)
+    if path is None:
+        raise ValueError("Archiving needs a SQLite file database.")
+    # connections attach the new file when they are next checked out
+    create_archive(path)
+
+    counts = {'workouts': 0, 'workout_exercises': 0}
+    with engine.connect() as connection:
+        with connection.begin():
+            set_cutoff(connection, cutoff)
+            keep_ids_above_archive(connection)
+        last_id = 0
+        while True:
+            with connection.begin():
+                workout_ids = connection.execute(
+                    text("SELECT id FROM main.workouts WHERE id > :last_id AND date < :cutoff ORDER BY id LIMIT :limit"),
+                    {'last_id': last_id, 'cutoff': cutoff.isoformat(), 'limit': chunk_size},
+                ).scalars().all()
+                if not workout_ids:
+                    break
+                for table, moved in move_workouts(connection, workout_ids).items():
+                    counts[table] += moved
+            last_id = workout_ids[-1]
+            if on_chunk:
+                on_chunk(counts)
+
+    cache = lookup_caches.get(engine)
+    if cache is not None:
+        cache.discard_matching(lambda key, value: key[0] == 'workout')
+    return counts
+
+def vacuum(engine):
+    """Rebuild the main database file so the space freed by archiving goes back to the filesystem"""
+    with engine.connect() as connection:
+        connection.exec_driver_sql("VACUUM main")
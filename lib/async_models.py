@@ -0,0 +1,260 @@
+"""Async versions of the model classmethods for asyncio front-ends.
+
+These use the same declarative ``Base`` and mapped classes as models.py but
+take an ``AsyncSession``. That way many lookups can wait on the database at
+once without blocking the event loop. The engine keeps a bounded pool of
+aiosqlite connections (or a server driver's), so concurrency is capped by
+pool size. Callers queue for a free connection instead of opening new ones.
+
+    python async_models.py --lookups 2000 --concurrency 50
+"""
+import asyncio
+import os
+from sqlalchemy import select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker, selectinload, joinedload
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from database import DEFAULT_DATABASE_URL, DEFAULT_PROFILE, sqlite_pragmas, apply_sqlite_pragmas
+from models import Base, User, Workout, Exercise, WorkoutExercises, hash_password, exercise_id_cache, normalize_exercise_key
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg', 'mysql': 'mysql+aiomysql'}
+
+def async_url(url):
+    """Swap a database URL's driver for its asyncio equivalent"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if url.drivername in ASYNC_DRIVERS.values() or backend not in ASYNC_DRIVERS:
+        return url
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def create_async_database_engine(url=None, profile=None, pool_size=None, max_overflow=None, pool_timeout=30):
+    """Build an async engine from the same settings as database.create_database_engine"""
+    url = async_url(url or os.environ.get('FITNESS_TRACKER_DATABASE_URL', DEFAULT_DATABASE_URL))
+    profile = profile or os.environ.get('FITNESS_TRACKER_DB_PROFILE', DEFAULT_PROFILE)
+    pool_size = pool_size or int(os.environ.get('FITNESS_TRACKER_POOL_SIZE', 5))
+    max_overflow = max_overflow if max_overflow is not None else int(os.environ.get('FITNESS_TRACKER_MAX_OVERFLOW', 10))
+
+    if url.get_backend_name() != 'sqlite':
+        return create_async_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout, pool_pre_ping=True)
+
+    pragmas = sqlite_pragmas(profile)
+    if url.database and url.database != ':memory:':
+        engine = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    else:
+        engine = create_async_engine(url)
+    apply_sqlite_pragmas(engine.sync_engine, pragmas)
+    return engine
+
+async def setup_async_database(url=None, profile=None, **engine_options):
+    engine = create_async_database_engine(url, profile, **engine_options)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    return Session, engine
+
+async def commit_or_flush(session, commit):
+    if commit:
+        await session.commit()
+    else:
+        await session.flush()
+
+async def delete_instance(session, instance):
+    if instance:
+        await session.delete(instance)
+        await session.commit()
+
+class AsyncUser:
+    @classmethod
+    async def create(cls, session, username, password, name, age, fitness_goals, commit=True):
+        # hashing is deliberately slow; keep it off the event loop
+        password_hash = await asyncio.get_running_loop().run_in_executor(None, hash_password, password)
+        user = User(username=username, password_hash=password_hash, name=name, age=age, fitness_goals=fitness_goals)
+        session.add(user)
+        await commit_or_flush(session, commit)
+        return user
+
+    @classmethod
+    async def check_password(cls, user, password):
+        return await asyncio.get_running_loop().run_in_executor(None, user.check_password, password)
+
+    @classmethod
+    async def delete(cls, session, user_id):
+        await delete_instance(session, await cls.find_by_id(session, user_id))
+
+    @classmethod
+    async def get_all(cls, session):
+        return (await session.execute(select(User))).scalars().all()
+
+    @classmethod
+    async def find_by_id(cls, session, user_id):
+        return await session.get(User, user_id)
+
+    @classmethod
+    async def get_by_username(cls, session, username):
+        return (await session.execute(select(User).where(User.username == username))).scalar_one_or_none()
+
+    @classmethod
+    async def page_after(cls, session, last_id, limit):
+        query = select(User).order_by(User.id).limit(limit)
+        if last_id is not None:
+            query = query.where(User.id > last_id)
+        return (await session.execute(query)).scalars().all()
+
+class AsyncWorkout:
+    @classmethod
+    async def create(cls, session, date, duration, user_id, commit=True):
+        workout = Workout(date=date, duration=duration, user_id=user_id)
+        session.add(workout)
+        await commit_or_flush(session, commit)
+        return workout
+
+    @classmethod
+    async def delete(cls, session, workout_id):
+        await delete_instance(session, await cls.find_by_id(session, workout_id))
+
+    @classmethod
+    async def get_all(cls, session):
+        return (await session.execute(select(Workout))).scalars().all()
+
+    @classmethod
+    async def find_by_id(cls, session, workout_id):
+        return await session.get(Workout, workout_id)
+
+    @classmethod
+    async def get_user_workouts(cls, session, user_id):
+        return (await session.execute(select(Workout).where(Workout.user_id == user_id))).scalars().all()
+
+    @classmethod
+    async def find_with_exercises(cls, session, workout_id):
+        # relationships cannot be lazy loaded under asyncio, so load them up front
+        query = select(Workout).options(joinedload(Workout.exercises).joinedload(WorkoutExercises.exercise)).where(Workout.id == workout_id)
+        return (await session.execute(query)).unique().scalar_one_or_none()
+
+    @classmethod
+    async def get_user_history(cls, session, user_id):
+        query = select(Workout).options(selectinload(Workout.exercises).joinedload(WorkoutExercises.exercise)).where(Workout.user_id == user_id).order_by(Workout.date, Workout.id)
+        return (await session.execute(query)).scalars().all()
+
+class AsyncExercise:
+    @classmethod
+    async def create(cls, session, name, exercise_type, difficulty, sets, reps, commit=True):
+        exercise = Exercise(name=name, type=exercise_type, difficulty=difficulty, sets=sets, reps=reps)
+        session.add(exercise)
+        await commit_or_flush(session, commit)
+        return exercise
+
+    @classmethod
+    async def delete(cls, session, exercise_id):
+        exercise = await cls.find_by_id(session, exercise_id)
+        if exercise:
+            exercise_id_cache(session.sync_session).discard(normalize_exercise_key(exercise.name, exercise.type))
+        await delete_instance(session, exercise)
+
+    @classmethod
+    async def get_or_create_id(cls, session, name, exercise_type, difficulty, sets, reps, commit=True):
+        key = normalize_exercise_key(name, exercise_type)
+        cache = exercise_id_cache(session.sync_session)
+        exercise_id = cache.get(key)
+        if exercise_id is not None:
+            return exercise_id
+
+        query = select(Exercise.id).where(func.lower(func.trim(Exercise.name)) == key[0], func.lower(Exercise.type) == key[1])
+        exercise_id = (await session.execute(query)).scalar()
+        if exercise_id is None:
+            exercise_id = (await cls.create(session, name.strip(), key[1], difficulty, sets, reps, commit=commit)).id
+            if commit:
+                cache.put(key, exercise_id)
+                return exercise_id
+        session.sync_session.info.setdefault('pending_exercise_ids', []).append((cache, key, exercise_id))
+        return exercise_id
+
+    @classmethod
+    async def get_all(cls, session):
+        return (await session.execute(select(Exercise))).scalars().all()
+
+    @classmethod
+    async def find_by_id(cls, session, exercise_id):
+        return await session.get(Exercise, exercise_id)
+
+    @classmethod
+    async def get_user_exercises(cls, session, user_id):
+        query = select(Exercise).join(WorkoutExercises).join(Workout).where(Workout.user_id == user_id).distinct()
+        return (await session.execute(query)).scalars().all()
+
+    @classmethod
+    async def get_workout_exercises(cls, session, workout_id):
+        query = select(Exercise).join(WorkoutExercises).where(WorkoutExercises.workout_id == workout_id)
+        return (await session.execute(query)).scalars().all()
+
+class AsyncWorkoutExercises:
+    @classmethod
+    async def create(cls, session, workout_id, exercise_id, sets_completed, reps_completed, commit=True):
+        workout_exercise = WorkoutExercises(workout_id=workout_id, exercise_id=exercise_id, sets_completed=sets_completed, reps_completed=reps_completed)
+        session.add(workout_exercise)
+        await commit_or_flush(session, commit)
+        return workout_exercise
+
+    @classmethod
+    async def delete(cls, session, workout_id, exercise_id):
+        await delete_instance(session, await cls.find_by_ids(session, workout_id, exercise_id))
+
+    @classmethod
+    async def find_by_ids(cls, session, workout_id, exercise_id):
+        return await session.get(WorkoutExercises, (workout_id, exercise_id))
+
+async def log_workout(session, user_id, date, duration, exercises):
+    """Async services.log_workout: the workout and its exercises in one transaction"""
+    from services import add_exercise_sets
+    try:
+        workout = await AsyncWorkout.create(session, date=date, duration=duration, user_id=user_id, commit=False)
+        links = {}
+        for exercise_data in exercises:
+            exercise_id = await AsyncExercise.get_or_create_id(session, exercise_data['name'], exercise_data['type'], exercise_data['difficulty'], exercise_data['sets'], exercise_data['reps'], commit=False)
+            add_exercise_sets(links, exercise_id, exercise_data['sets'], exercise_data['reps'])
+        for exercise_id, (sets, reps) in links.items():
+            await AsyncWorkoutExercises.create(session, workout.id, exercise_id, sets, reps, commit=False)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    return workout
+
+async def run_lookups(database, lookups, concurrency):
+    """Resolve random usernames and their workouts concurrently and report throughput"""
+    import random
+    import time
+    Session, engine = await setup_async_database(database)
+    async with Session() as session:
+        usernames = (await session.execute(select(User.username).limit(1000))).scalars().all()
+    if not usernames:
+        print("No users to look up; populate the database first (seed_data.py).")
+        await engine.dispose()
+        return
+
+    rng = random.Random(0)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup():
+        async with semaphore, Session() as session:
+            user = await AsyncUser.get_by_username(session, rng.choice(usernames))
+            await AsyncWorkout.get_user_workouts(session, user.id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(lookup() for _ in range(lookups)))
+    elapsed = time.perf_counter() - start
+    print(f"{lookups} lookups with {concurrency} in flight: {lookups / elapsed:,.0f} lookups/sec")
+    await engine.dispose()
+
+if __name__ == '__main__':
+    import click
+
+    @click.command()
+    @click.option('--database', help='Database URL (defaults to the FITNESS_TRACKER_DATABASE_URL setting)')
+    @click.option('--lookups', default=2000, show_default=True, type=click.IntRange(min=1))
+    @click.option('--concurrency', default=50, show_default=True, type=click.IntRange(min=1))
+    def main(database, lookups, concurrency):
+        """Measure concurrent username + workout lookups through the async layer"""
+        asyncio.run(run_lookups(database, lookups, concurrency))
+
+    main()
@@ -0,0 +1,142 @@
+"""Online backups of the SQLite database while it is in use.
+
+Pages are copied with SQLite's backup API a step at a time. Between steps
+the backup pauses briefly and holds no lock, so writers keep going. If
+another connection writes during the copy, SQLite starts the copy again at
+the next step, so the finished file is a consistent snapshot of one moment.
+When writes keep restarting it, the copy is finished in a single step instead.
+Each copy is checked with ``PRAGMA integrity_check`` and can be gzipped. The
+archive database (see archive.py) is backed up next to the main one when it
+is attached.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from models import ARCHIVE_SCHEMA
+
+class BackupStats:
+    def __init__(self, database, path):
+        self.database = database
+        self.path = path
+        self.pages = 0
+        self.copied = 0
+        self.steps = 0
+        self.restarts = 0
+        # copied in one step after too many restarts
+        self.single_step = False
+        self.seconds = 0.0
+        self.bytes = 0
+
+    @property
+    def pages_per_second(self):
+        # counts pages copied again after a restart
+        return self.copied / self.seconds if self.seconds else 0.0
+
+class RestartLimit(Exception):
+    """Raised from the progress callback to stop a stepped copy that keeps restarting"""
+
+def default_backup_path(database_path, directory='backups'):
+    name = os.path.splitext(os.path.basename(database_path))[0]
+    return os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.db")
+
+def integrity_problems(path):
+    """Run PRAGMA integrity_check on a database file; an empty list means it is intact"""
+    connection = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    finally:
+        connection.close()
+    return [] if problems == ['ok'] else problems
+
+def compress_file(path):
+    """gzip ``path`` into ``path + '.gz'`` and remove the original"""
+    compressed_path = path + '.gz'
+    with open(path, 'rb') as source, gzip.open(compressed_path, 'wb', compresslevel=6) as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    os.remove(path)
+    return compressed_path
+
+def copy_database(source, path, database='main', pages_per_step=1024, pause=0.005, on_step=None, max_restarts=100):
+    """Copy one database of an open sqlite3 connection into the file at ``path``
+
+    After ``max_restarts`` restarts the database is copied again in a single
+    step. That step holds a read transaction until it ends, so with a rollback
+    journal it blocks writers for the whole copy.
+    """
+    stats = BackupStats(database, path)
+    remaining_before = None
+
+    def progress(status, remaining, total):
+        nonlocal remaining_before
+        # a step that does not bring the remaining count down means another
+        # connection wrote and SQLite started over
+        if remaining_before is None or remaining >= remaining_before:
+            if remaining_before is not None:
+                stats.restarts += 1
+            stats.copied += total - remaining
+        else:
+            stats.copied += remaining_before - remaining
+        if stats.restarts > max_restarts and not stats.single_step:
+            raise RestartLimit()
+        remaining_before = remaining
+        stats.steps += 1
+        stats.pages = total
+        if on_step:
+            on_step(stats, remaining)
+        if remaining and pause:
+            time.sleep(pause)
+
+    if os.path.exists(path):
+        raise ValueError(f"{path} already exists.")
+    target = sqlite3.connect(path)
+    start = time.perf_counter()
+    try:
+        try:
+            source.backup(target, pages=pages_per_step, progress=progress, name=database)
+        except RestartLimit:
+            stats.single_step = True
+            remaining_before = None
+            source.backup(target, pages=-1, progress=progress, name=database)
+    except Exception:
+        target.close()
+        os.remove(path)
+        raise
+    target.close()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+def backup_database(engine, path, pages_per_step=1024, pause=0.005, compress=False, on_step=None):
+    """Back up the engine's SQLite database (and its attached archive) to ``path``.
+
+    Every copy is checked for integrity before it is compressed; a copy that
+    fails the check is kept uncompressed and ValueError is raised. Returns a
+    BackupStats per database file.
+    """
+    if engine.dialect.name != 'sqlite' or not engine.url.database or engine.url.database == ':memory:':
+        raise ValueError("Backups need a SQLite file database.")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    raw = engine.raw_connection()
+    try:
+        source = raw.connection
+        databases = [row[1] for row in source.execute("PRAGMA database_list")]
+        root, extension = os.path.splitext(path)
+        targets = [('main', path)]
+        if ARCHIVE_SCHEMA in databases:
+            targets.append((ARCHIVE_SCHEMA, f"{root}_archive{extension}"))
+        results = [copy_database(source, target, database, pages_per_step, pause, on_step) for database, target in targets]
+    finally:
+        raw.close()
+
+    for stats in results:
+        problems = integrity_problems(stats.path)
+        if problems:
+            raise ValueError(f"The backup {stats.path} failed its integrity check: {'; '.join(problems[:5])}")
+        if compress:
+            stats.path = compress_file(stats.path)
+        stats.bytes = os.path.getsize(stats.path)
+    return results
@@ -0,0 +1,104 @@
+"""Time date-range lookups and streak/calendar reports on long training histories.
+
+Each benchmarked user trains almost every day for ``--years`` years, next to
+``--other_users`` users with seed_data's shorter histories, so lookups have to
+seek into a large workouts table. Range queries and reports are compared with
+loading a user's whole history.
+
+    python benchmark_activity.py --users 20 --years 12
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+import click
+import analytics
+from database import setup_database
+from models import User, Workout
+from profiling import percentile
+from seed_data import populate
+
+def add_daily_histories(session, users, years, rest_probability, rng):
+    """Add users who train most days for ``years`` years up to today; return their IDs"""
+    first_user_id = (session.query(User.id).order_by(User.id.desc()).limit(1).scalar() or 0) + 1
+    workout_id = Workout.max_id(session) + 1
+    today = date.today()
+    first_day = today - timedelta(days=365 * years)
+    user_ids = list(range(first_user_id, first_user_id + users))
+    User.bulk_insert(session, [{'id': user_id, 'username': f'daily{user_id}', 'password_hash': 'x', 'name': f'Daily {user_id}'} for user_id in user_ids])
+    for user_id in user_ids:
+        rows = []
+        day = first_day
+        while day <= today:
+            if rng.random() >= rest_probability:
+                rows.append({'id': workout_id, 'date': day, 'duration': rng.randint(15, 120), 'user_id': user_id})
+                workout_id += 1
+            day += timedelta(days=1)
+        Workout.bulk_insert(session, rows)
+    session.commit()
+    return user_ids
+
+def operations(session, rng, user_ids):
+    today = date.today()
+    year_ago = today - timedelta(days=364)
+
+    def random_month():
+        day = today - timedelta(days=rng.randint(0, 365 * 5))
+        return day.year, day.month
+
+    return {
+        'Workout.get_user_workouts (all)': lambda: Workout.get_user_workouts(session, rng.choice(user_ids)),
+        'Workout.get_user_workouts_in_month': lambda: Workout.get_user_workouts_in_month(session, rng.choice(user_ids), *random_month()),
+        'Workout.count_user_workouts (1 year)': lambda: Workout.count_user_workouts(session, rng.choice(user_ids), year_ago, today),
+        'analytics.streaks': lambda: analytics.streaks(session, rng.choice(user_ids), today=today),
+        'analytics.weekly_frequency (1 year)': lambda: analytics.weekly_frequency(session, rng.choice(user_ids), year_ago, today),
+        'analytics.weekly_frequency (all)': lambda: analytics.weekly_frequency(session, rng.choice(user_ids)),
+        'analytics.calendar_heatmap (1 year)': lambda: analytics.calendar_heatmap(session, rng.choice(user_ids), year_ago, today),
+    }
+
+def range_query_plan(session, user_id):
+    query = Workout.user_range_query(session, user_id, date(2020, 3, 1), date(2020, 3, 31)).order_by(Workout.date, Workout.id)
+    statement = query.statement.compile(session.get_bind(), compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in session.execute(f"EXPLAIN QUERY PLAN {statement}")]
+
+@click.command()
+@click.option('--users', default=20, show_default=True, type=click.IntRange(min=1), help='Users with daily histories')
+@click.option('--years', default=10, show_default=True, type=click.IntRange(min=1), help='Length of each daily history')
+@click.option('--rest_probability', default=0.15, show_default=True, type=click.FloatRange(0, 1), help='Chance of skipping a given day')
+@click.option('--other_users', default=2000, show_default=True, type=click.IntRange(min=0), help='Background users with 100 workouts each')
+@click.option('--iterations', default=100, show_default=True, type=click.IntRange(min=1), help='Runs of each operation')
+@click.option('--seed', default=0, show_default=True)
+def benchmark_activity(users, years, rest_probability, other_users, iterations, seed):
+    """Benchmark date-range queries and streak/frequency/calendar reports"""
+    from prettytable import PrettyTable
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        Session, engine = setup_database(f"sqlite:///{os.path.join(directory, 'activity.db')}")
+        session = Session()
+        click.echo(f"Generating {other_users} background users and {users} users with {years} years of daily workouts...")
+        if other_users:
+            populate(session, other_users, 100, exercises_per_workout=0, seed=seed)
+        user_ids = add_daily_histories(session, users, years, rest_probability, rng)
+        click.echo(f"{session.query(Workout).count():,} workouts in total.")
+        click.echo("Range query plan: " + '; '.join(range_query_plan(session, user_ids[0])))
+
+        table = PrettyTable()
+        table.field_names = ["Operation", "Median ms", "p95 ms"]
+        table.align["Operation"] = 'l'
+        for name, operation in operations(session, rng, user_ids).items():
+            durations = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                operation()
+                durations.append(time.perf_counter() - start)
+                session.expunge_all()
+            durations.sort()
+            table.add_row([name, f"{statistics.median(durations) * 1000:.2f}", f"{percentile(durations, 0.95) * 1000:.2f}"])
+        click.echo(table)
+        session.close()
+        engine.dispose()
+
+if __name__ == '__main__':
+    benchmark_activity()
@@ -0,0 +1,103 @@
+"""Compare committing every set completion with the write-behind ingest queue.
+
+``--producers`` threads each log ``--events`` set completions against random
+seeded workouts and exercises, first with one upsert and commit per event
+(what a synchronous WorkoutExercises write costs) and then through
+ingest.IngestQueue, which groups them into commits.
+
+    python benchmark_ingest.py --producers 16 --events 500 --max_batch 500 --max_delay 0.05
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+import click
+from database import setup_database
+from ingest import IngestQueue
+from models import WorkoutExercises, Workout, Exercise
+from profiling import percentile
+from seed_data import populate
+
+def producer_events(seed, count, workout_ids, exercise_ids):
+    rng = random.Random(seed)
+    return [(rng.choice(workout_ids), rng.choice(exercise_ids), 1, rng.randint(1, 20)) for _ in range(count)]
+
+def run_producers(events_by_producer, log):
+    """Run one thread per event list calling ``log(*event)``; returns (elapsed, sorted call latencies)"""
+    latencies = []
+
+    def produce(events):
+        durations = []
+        for event in events:
+            start = time.perf_counter()
+            log(*event)
+            durations.append(time.perf_counter() - start)
+        latencies.extend(durations)
+
+    threads = [threading.Thread(target=produce, args=(events,)) for events in events_by_producer]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sorted(latencies)
+
+def synchronous(Session, events_by_producer):
+    sessions = threading.local()
+
+    def log(workout_id, exercise_id, sets, reps):
+        if not hasattr(sessions, 'session'):
+            sessions.session = Session()
+        WorkoutExercises.add_sets_many(sessions.session, [{'workout_id': workout_id, 'exercise_id': exercise_id, 'sets_completed': sets, 'reps_completed': reps}])
+        sessions.session.commit()
+
+    elapsed, latencies = run_producers(events_by_producer, log)
+    return elapsed, latencies, None
+
+def write_behind(Session, events_by_producer, max_batch, max_delay, max_pending):
+    ingest = IngestQueue(Session, max_batch=max_batch, max_delay=max_delay, max_pending=max_pending)
+    elapsed, latencies = run_producers(events_by_producer, ingest.log_sets)
+    start = time.perf_counter()
+    ingest.close()
+    # events only count once they are committed
+    return elapsed + (time.perf_counter() - start), latencies, ingest.stats()
+
+@click.command()
+@click.option('--producers', default=16, show_default=True, type=click.IntRange(min=1), help='Threads logging set completions')
+@click.option('--events', default=500, show_default=True, type=click.IntRange(min=1), help='Events per producer')
+@click.option('--max_batch', default=500, show_default=True, type=click.IntRange(min=1), help='Most events per group commit')
+@click.option('--max_delay', default=0.05, show_default=True, type=click.FloatRange(min=0), help='Longest wait in seconds before committing a group')
+@click.option('--max_pending', default=10000, show_default=True, type=click.IntRange(min=1), help='Queued events before producers block')
+@click.option('--users', default=200, show_default=True, type=click.IntRange(min=1), help='Users to seed')
+@click.option('--seed', default=0, show_default=True)
+def benchmark_ingest(producers, events, max_batch, max_delay, max_pending, users, seed):
+    """Benchmark per-event commits against the write-behind queue"""
+    from prettytable import PrettyTable
+    with tempfile.TemporaryDirectory() as directory:
+        Session, engine = setup_database(f"sqlite:///{os.path.join(directory, 'ingest.db')}")
+        session = Session()
+        populate(session, users, 20, seed=seed)
+        workout_ids = [workout_id for (workout_id,) in session.query(Workout.id)]
+        exercise_ids = [exercise_id for (exercise_id,) in session.query(Exercise.id)]
+        session.close()
+        events_by_producer = [producer_events(seed + index, events, workout_ids, exercise_ids) for index in range(producers)]
+        total = producers * events
+
+        table = PrettyTable()
+        table.field_names = ["Mode", "Events/sec", "Call p50 ms", "Call p99 ms", "Commits", "Commit p99 ms", "Event to commit p99 ms"]
+        elapsed, latencies, _ = synchronous(Session, events_by_producer)
+        table.add_row(["commit per event", f"{total / elapsed:,.0f}", f"{percentile(latencies, 0.5) * 1000:.3f}", f"{percentile(latencies, 0.99) * 1000:.3f}", total, "", ""])
+        elapsed, latencies, stats = write_behind(Session, events_by_producer, max_batch, max_delay, max_pending)
+        table.add_row([
+            "write-behind queue", f"{total / elapsed:,.0f}", f"{percentile(latencies, 0.5) * 1000:.3f}", f"{percentile(latencies, 0.99) * 1000:.3f}",
+            stats['batches'], f"{stats['commit_ms_p99']:.2f}", f"{stats['latency_ms_p99']:.2f}",
+        ])
+        click.echo(f"{producers} producers x {events} set completions")
+        click.echo(table)
+        click.echo(f"Queue: mean group {stats['mean_batch']:.0f} events, {stats['rows_written']:,} rows written, "
+                   f"max depth {stats['max_queue_depth']}, {stats['blocked_puts']} blocked puts, {stats['rejected']} rejected")
+        engine.dispose()
+
+if __name__ == '__main__':
+    benchmark_ingest()
@@ -0,0 +1,171 @@
+"""Time the model layer at several data sizes and catch regressions.
+
+Each size ("USERSxWORKOUTS") is generated with seed_data into a fresh SQLite
+file. Every operation runs a fixed number of times against random users, and
+the median and p95 latency are written to a JSON results file. Given a
+baseline file from an earlier run, the suite fails if any median got slower
+than the allowed tolerance. Loading whole tables as ORM instances is also
+compared with the read-only row records, in time and in memory.
+
+    python benchmark_models.py --size 100x50 --size 1000x100 --output bench.json
+    python benchmark_models.py --size 1000x100 --baseline bench.json --tolerance 1.5
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+import click
+from database import setup_database
+from models import User, Workout, Exercise
+from profiling import percentile
+from seed_data import populate
+from services import log_workout
+
+def operations(session, rng, users, created_workouts):
+    """Map each benchmarked operation to a zero-argument callable"""
+    def random_user_id():
+        return rng.randint(1, users)
+
+    def create_workout():
+        workout = Workout.create(session, date=date(2024, 1, 1), duration=30, user_id=random_user_id())
+        created_workouts.append(workout.id)
+
+    def log_full_workout():
+        log_workout(session, random_user_id(), date(2024, 1, 2), 45, [
+            {'name': 'Squat', 'type': 'legs', 'difficulty': 3, 'sets': 5, 'reps': 5},
+            {'name': 'Plank', 'type': 'core', 'difficulty': 1, 'sets': 3, 'reps': 1},
+        ])
+
+    def delete_workout():
+        # deletes the workouts added by create_workout, which have no exercises
+        if created_workouts:
+            Workout.delete(session, created_workouts.pop())
+
+    return {
+        'User.get_by_username': lambda: User.get_by_username(session, f'user{random_user_id()}'),
+        'User.find_by_id': lambda: User.find_by_id(session, random_user_id()),
+        'Workout.get_user_workouts': lambda: Workout.get_user_workouts(session, random_user_id()),
+        'Exercise.get_user_exercises': lambda: Exercise.get_user_exercises(session, random_user_id()),
+        'Workout.get_user_history': lambda: Workout.get_user_history(session, random_user_id()),
+        'Workout.create': create_workout,
+        'services.log_workout': log_full_workout,
+        'Workout.delete': delete_workout,
+    }
+
+LISTINGS = {
+    'User.get_all': lambda session: User.get_all(session),
+    'User.get_all(rows=True)': lambda session: User.get_all(session, rows=True),
+    'Workout.get_all': lambda session: Workout.get_all(session),
+    'Workout.get_all(rows=True)': lambda session: Workout.get_all(session, rows=True),
+    'Exercise.get_all': lambda session: Exercise.get_all(session),
+    'Exercise.get_all(rows=True)': lambda session: Exercise.get_all(session, rows=True),
+}
+
+def benchmark_listings(session, repeats):
+    """Time each listing, then measure the memory it holds and peaks at with tracemalloc"""
+    results = {}
+    for name, listing in LISTINGS.items():
+        durations = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            listing(session)
+            durations.append(time.perf_counter() - start)
+            session.expunge_all()
+        durations.sort()
+        tracemalloc.start()
+        rows = listing(session)
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows
+        session.expunge_all()
+        results[name] = {'median_ms': statistics.median(durations) * 1000, 'p95_ms': percentile(durations, 0.95) * 1000, 'held_mb': held / 2**20, 'peak_mb': peak / 2**20}
+    return results
+
+def benchmark_size(path, users, workouts, iterations, seed, listing_repeats):
+    Session, engine = setup_database(f'sqlite:///{path}')
+    session = Session()
+    populate(session, users, workouts, seed=seed)
+    rng = random.Random(seed)
+    created_workouts = []
+
+    results = {}
+    for name, operation in operations(session, rng, users, created_workouts).items():
+        durations = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            operation()
+            durations.append(time.perf_counter() - start)
+            session.expunge_all()
+        durations.sort()
+        results[name] = {'median_ms': statistics.median(durations) * 1000, 'p95_ms': percentile(durations, 0.95) * 1000}
+    results.update(benchmark_listings(session, listing_repeats))
+    session.close()
+    engine.dispose()
+    return results
+
+def parse_size(value):
+    users, workouts = value.lower().split('x')
+    return int(users), int(workouts)
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for size, operations_by_name in results.items():
+        for name, timings in operations_by_name.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous and timings['median_ms'] > previous['median_ms'] * tolerance:
+                regressions.append(f"{size} {name}: {previous['median_ms']:.2f} ms -> {timings['median_ms']:.2f} ms")
+    return regressions
+
+@click.command()
+@click.option('--size', 'sizes', multiple=True, default=['100x20', '1000x50'], show_default=True, help='Data size as USERSxWORKOUTS_PER_USER (repeatable)')
+@click.option('--iterations', default=200, show_default=True, type=click.IntRange(min=1), help='Runs of each operation per size')
+@click.option('--listing_repeats', default=5, show_default=True, type=click.IntRange(min=1), help='Runs of each whole-table listing per size')
+@click.option('--seed', default=0, show_default=True, help='Random seed for data and lookups')
+@click.option('--output', default='bench_output.json', show_default=True, type=click.Path(dir_okay=False), help='File to write results to')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Earlier results to compare against')
+@click.option('--tolerance', default=1.5, show_default=True, help='Allowed slowdown factor against the baseline')
+def benchmark_models(sizes, iterations, listing_repeats, seed, output, baseline, tolerance):
+    """Benchmark model queries, creates and deletes at several data sizes"""
+    from prettytable import PrettyTable
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            users, workouts = parse_size(size)
+            click.echo(f"Generating {users} users x {workouts} workouts...")
+            results[size] = benchmark_size(os.path.join(directory, f'{size}.db'), users, workouts, iterations, seed, listing_repeats)
+
+    table = PrettyTable()
+    table.field_names = ["Operation"] + [f"{size} median / p95 ms" for size in sizes]
+    table.align["Operation"] = 'l'
+    for name in results[sizes[0]]:
+        table.add_row([name] + [f"{results[size][name]['median_ms']:.2f} / {results[size][name]['p95_ms']:.2f}" for size in sizes])
+    click.echo(table)
+
+    memory = PrettyTable()
+    memory.field_names = ["Listing"] + [f"{size} held / peak MB" for size in sizes]
+    memory.align["Listing"] = 'l'
+    for name in LISTINGS:
+        memory.add_row([name] + [f"{results[size][name]['held_mb']:.2f} / {results[size][name]['peak_mb']:.2f}" for size in sizes])
+    click.echo(memory)
+
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    click.echo(f"Results written to {output}")
+
+    if baseline:
+        with open(baseline) as file:
+            regressions = find_regressions(results, json.load(file), tolerance)
+        if regressions:
+            click.echo(click.style("Regressions against the baseline:", fg='red'))
+            for regression in regressions:
+                click.echo(click.style(f"  {regression}", fg='red'))
+            sys.exit(1)
+        click.echo(click.style(f"No operation is more than {tolerance}x slower than the baseline.", fg='green'))
+
+if __name__ == '__main__':
+    benchmark_models()
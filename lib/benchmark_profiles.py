@@ -0,0 +1,69 @@
+"""Compare write and read throughput of the SQLite engine profiles.
+
+Each profile gets a fresh database file in a temporary directory. Writes are
+measured both as one commit per workout (the CLI's pattern) and as batched
+transactions; reads repeat the per-user workout lookup.
+
+    python benchmark_profiles.py --rows 2000 --reads 2000
+"""
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+import click
+from database import SQLITE_PROFILES, setup_database
+from models import User, Workout
+
+def rate(count, elapsed):
+    return count / elapsed if elapsed else float('inf')
+
+def benchmark_profile(path, profile, rows, reads, batch_size):
+    Session, engine = setup_database(f'sqlite:///{path}', profile)
+    session = Session()
+    users = [User(username=f'bench{n}', password_hash='x', name=f'Bench {n}') for n in range(10)]
+    session.add_all(users)
+    session.commit()
+    user_ids = [user.id for user in users]
+    start_date = date(2020, 1, 1)
+
+    start = time.perf_counter()
+    for n in range(rows):
+        Workout.create(session, date=start_date + timedelta(days=n), duration=30, user_id=user_ids[n % len(user_ids)])
+    commit_per_row = rate(rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        for n in range(offset, min(offset + batch_size, rows)):
+            Workout.create(session, date=start_date + timedelta(days=n), duration=45, user_id=user_ids[n % len(user_ids)], commit=False)
+        session.commit()
+    batched = rate(rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for n in range(reads):
+        Workout.get_user_workouts(session, user_ids[n % len(user_ids)])
+        session.expunge_all()
+    reads_per_sec = rate(reads, time.perf_counter() - start)
+
+    session.close()
+    engine.dispose()
+    return commit_per_row, batched, reads_per_sec
+
+@click.command()
+@click.option('--rows', default=2000, show_default=True, type=click.IntRange(min=1), help='Workouts written per write test')
+@click.option('--reads', default=500, show_default=True, type=click.IntRange(min=1), help='Per-user workout lookups')
+@click.option('--batch_size', default=500, show_default=True, type=click.IntRange(min=1), help='Workouts per transaction in the batched test')
+@click.option('--profile', 'profiles', multiple=True, type=click.Choice(list(SQLITE_PROFILES)), help='Profiles to compare (default: all)')
+def benchmark_profiles(rows, reads, batch_size, profiles):
+    """Report write and read throughput for each SQLite profile"""
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ["Profile", "Commit/row (rows/s)", "Batched (rows/s)", "User lookups/s"]
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in profiles or SQLITE_PROFILES:
+            path = os.path.join(directory, f'{profile}.db')
+            commit_per_row, batched, reads_per_sec = benchmark_profile(path, profile, rows, reads, batch_size)
+            table.add_row([profile, f'{commit_per_row:,.0f}', f'{batched:,.0f}', f'{reads_per_sec:,.0f}'])
+    click.echo(table)
+
+if __name__ == '__main__':
+    benchmark_profiles()
@@ -0,0 +1,54 @@
+"""Measure CLI cold start and fail when it goes over budget.
+
+Imports cli.py in fresh interpreters with ``python -X importtime`` and reports
+the median import time plus the slowest modules, so an eager heavy import or
+new import-time side effect shows up before it ships.
+
+    python benchmark_startup.py --runs 5 --budget_ms 500
+"""
+import os
+import statistics
+import subprocess
+import sys
+import click
+
+LIB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def import_times(module):
+    """Import ``module`` in a fresh interpreter and return {module: (self_us, cumulative_us)}"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=LIB_DIR, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+@click.command()
+@click.option('--module', default='cli', show_default=True, help='Module to import')
+@click.option('--runs', default=5, show_default=True, type=click.IntRange(min=1), help='Fresh interpreters to measure')
+@click.option('--budget_ms', default=500.0, show_default=True, help='Maximum median import time in milliseconds')
+@click.option('--top', default=10, show_default=True, help='Number of slowest modules to list')
+def benchmark_startup(module, runs, budget_ms, top):
+    """Report the cold import time of the CLI against a budget"""
+    samples = [import_times(module) for _ in range(runs)]
+    totals_ms = [sample[module][1] / 1000 for sample in samples]
+    median_ms = statistics.median(totals_ms)
+
+    click.echo(f"import {module}: median {median_ms:.1f} ms over {runs} runs (min {min(totals_ms):.1f}, max {max(totals_ms):.1f})")
+    click.echo(f"Slowest modules by self time (last run):")
+    slowest = sorted(samples[-1].items(), key=lambda item: item[1][0], reverse=True)[:top]
+    for name, (self_us, cumulative_us) in slowest:
+        click.echo(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    heavy = [name for name in ('pyfiglet', 'prettytable', 'werkzeug.security') if name in samples[-1]]
+    if heavy:
+        click.echo(click.style(f"Eagerly imported: {', '.join(heavy)}", fg='yellow'))
+    if median_ms > budget_ms:
+        click.echo(click.style(f"Cold start {median_ms:.1f} ms is over the {budget_ms:.0f} ms budget.", fg='red'))
+        sys.exit(1)
+    click.echo(click.style(f"Cold start is within the {budget_ms:.0f} ms budget.", fg='green'))
+
+if __name__ == '__main__':
+    benchmark_startup()
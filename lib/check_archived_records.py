@@ -0,0 +1,73 @@
+"""Check that personal records set by archived workouts survive later writes.
+
+Builds a file database with a user whose best sets are in workouts that get
+archived and whose later workouts stay hot, archives the old ones, then
+updates and deletes hot and archived rows. After each step the stored
+records must match PersonalRecord.check's fresh computation over both
+databases; any difference is printed and the script exits non-zero.
+
+    python check_archived_records.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+from archive import archive_workouts
+from database import setup_database
+from models import User, Workout, Exercise, WorkoutExercises, PersonalRecord
+
+CUTOFF = date(2024, 1, 1)
+
+def populate(session):
+    user = User(username='archived', password_hash='x', name='Archived')
+    exercise = Exercise(name='Squat', type='legs', difficulty=2, sets=3, reps=10)
+    session.add_all([user, exercise])
+    session.flush()
+    # (date, sets, reps): the first two are archived, the best sets among them first
+    workouts = []
+    for workout_date, sets, reps in [(date(2023, 1, 1), 10, 10), (date(2023, 6, 1), 5, 12), (date(2024, 6, 1), 1, 1)]:
+        workout = Workout(date=workout_date, duration=30, user_id=user.id)
+        workout.exercises = [WorkoutExercises(exercise=exercise, sets_completed=sets, reps_completed=reps)]
+        session.add(workout)
+        workouts.append(workout)
+    session.flush()
+    ids = user.id, exercise.id, [workout.id for workout in workouts]
+    # committed last, so the session holds no connection that predates the archive
+    session.commit()
+    return ids
+
+def check_steps(Session, engine):
+    """Run each step and return a list of (step, problems) for the steps that left records wrong"""
+    session = Session()
+    user_id, exercise_id, (best_id, archived_id, hot_id) = populate(session)
+    steps = [
+        ('archive', lambda: archive_workouts(engine, CUTOFF)),
+        ('add sets to the hot row', lambda: (WorkoutExercises.add_sets_many(session, [{'workout_id': hot_id, 'exercise_id': exercise_id, 'sets_completed': 1, 'reps_completed': 1}]), session.commit())),
+        ('delete the archived best', lambda: Workout.delete(session, best_id)),
+        ('delete the hot workout', lambda: Workout.delete(session, hot_id)),
+        ('rebuild', lambda: PersonalRecord.rebuild(session)),
+    ]
+    failures = []
+    for name, step in steps:
+        step()
+        session.expire_all()
+        problems = PersonalRecord.check(session)
+        print(f"{name}: {len(problems)} problems")
+        if problems:
+            failures.append((name, problems))
+    session.close()
+    return failures
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        Session, engine = setup_database(f"sqlite:///{os.path.join(directory, 'records.db')}")
+        try:
+            failures = check_steps(Session, engine)
+        finally:
+            engine.dispose()
+    if failures:
+        for name, problems in failures:
+            for problem in problems:
+                print(f"after {name}: {problem}")
+        sys.exit(1)
+    print("Personal records match the hot and archived workouts after every step.")
@@ -0,0 +1,69 @@
+"""Check that loading workout history takes a fixed number of queries per 500 workouts.
+
+Builds in-memory databases of increasing size, walks the relationships
+returned by the eager-loading helpers and counts the SQL statements emitted.
+selectinload sends parent IDs in batches of 500, so each selectin level may
+add one query per further 500 workouts. If a helper's count grows faster than
+that, some relationship is being lazy loaded row by row (an N+1 query) and
+the script exits non-zero.
+
+    python check_query_counts.py
+"""
+import sys
+from datetime import date, timedelta
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from models import Base, User, Workout, Exercise, WorkoutExercises
+
+# workouts per user, below and above selectinload's batch of 500 parent IDs
+SIZES = [5, 50, 400, 1200]
+SELECTIN_BATCH = 500
+EXERCISES_PER_WORKOUT = 4
+
+def populate(session, workouts):
+    user = User(username='history', password_hash='x', name='History')
+    exercises = [Exercise(name=f'Exercise {n}', type='core', difficulty=1, sets=3, reps=10) for n in range(EXERCISES_PER_WORKOUT)]
+    session.add(user)
+    session.add_all(exercises)
+    session.flush()
+    for n in range(workouts):
+        workout = Workout(date=date(2020, 1, 1) + timedelta(days=n), duration=30, user_id=user.id)
+        workout.exercises = [WorkoutExercises(exercise=exercise, sets_completed=3, reps_completed=10) for exercise in exercises]
+        session.add(workout)
+    session.commit()
+    return user.id
+
+def walk_workouts(workouts):
+    return sum(workout_exercise.exercise.reps for workout in workouts for workout_exercise in workout.exercises)
+
+# (name, selectin loads whose IN list holds every workout, helper)
+HELPERS = [
+    ('User.find_with_history', 1, lambda session, user_id: walk_workouts(User.find_with_history(session, user_id).workouts)),
+    ('Workout.get_user_history', 1, lambda session, user_id: walk_workouts(Workout.get_user_history(session, user_id))),
+    ('Workout.find_with_exercises', 0, lambda session, user_id: walk_workouts([Workout.find_with_exercises(session, 1)])),
+]
+
+def extra_batches(size):
+    return -(-size // SELECTIN_BATCH) - 1
+
+def count_statements(size, helper):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    user_id = populate(sessionmaker(bind=engine)(), size)
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    helper(sessionmaker(bind=engine)(), user_id)
+    return len(statements)
+
+if __name__ == '__main__':
+    failures = []
+    for name, batched_loads, helper in HELPERS:
+        counts = [count_statements(size, helper) for size in SIZES]
+        print(f"{name}: {', '.join(f'{count} queries for {size} workouts' for size, count in zip(SIZES, counts))}")
+        if len({count - batched_loads * extra_batches(size) for size, count in zip(SIZES, counts)}) > 1:
+            failures.append(name)
+    if failures:
+        print(f"Query count grows faster than one per {SELECTIN_BATCH} rows for: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"Every helper loads history in a fixed number of queries per {SELECTIN_BATCH} workouts.")
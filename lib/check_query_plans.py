@@ -0,0 +1,99 @@
+"""Check that the per-user and per-workout model queries are served by indexes.
+
+Runs every model query against an in-memory database, captures the SQL it
+emits and asks SQLite for its EXPLAIN QUERY PLAN. Any plan step that scans a
+whole table is reported and the script exits with a non-zero status.
+
+    python check_query_plans.py
+"""
+import sys
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from models import Base, User, Workout, Exercise, WorkoutExercises, PersonalRecord, personal_records_select, recompute_where, recompute_archived_where
+
+MODEL_QUERIES = [
+    ('User.find_by_id', lambda session: User.find_by_id(session, 1)),
+    ('User.get_by_username', lambda session: User.get_by_username(session, 'someone')),
+    ('Workout.find_by_id', lambda session: Workout.find_by_id(session, 1)),
+    ('Workout.get_user_workouts', lambda session: Workout.get_user_workouts(session, 1)),
+    ('Workout.get_user_workouts_in_month', lambda session: Workout.get_user_workouts_in_month(session, 1, 2024, 3)),
+    ('Exercise.find_by_id', lambda session: Exercise.find_by_id(session, 1)),
+    ('Exercise.get_user_exercises', lambda session: Exercise.get_user_exercises(session, 1)),
+    ('Exercise.get_workout_exercises', lambda session: Exercise.get_workout_exercises(session, 1)),
+    ('WorkoutExercises.find_by_ids', lambda session: WorkoutExercises.find_by_ids(session, 1, 1)),
+    ('PersonalRecord.find', lambda session: PersonalRecord.find(session, 1, 1)),
+    ('PersonalRecord.get_user_records', lambda session: PersonalRecord.get_user_records(session, 1)),
+    ('PersonalRecord.set_by_workout', lambda session: PersonalRecord.set_by_workout(session, 1)),
+]
+
+# statements the personal record triggers run, with the index each must not use
+TRIGGER_STATEMENTS = [
+    ('personal record recompute', personal_records_select(recompute_where('?', '?'), archived_where=recompute_archived_where('?', '?')), (1, 1, 1, 1, 1, 1, 1, 1), 'ix_workout_exercises_exercise_id'),
+]
+
+# planner statistics of a large database (a million workout exercises over a
+# catalog of 20000 exercises, 5000 workouts per user), so plans are chosen as
+# they would be in production rather than for empty tables
+STATISTICS = [
+    ('workouts', 'ix_workouts_user_id_date', '250000 5000 1'),
+    ('workout_exercises', 'sqlite_autoindex_workout_exercises_1', '1000000 4 1'),
+    ('workout_exercises', 'ix_workout_exercises_exercise_id', '1000000 50'),
+]
+
+def load_statistics(engine):
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+        connection.exec_driver_sql("INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (?, ?, ?)", STATISTICS)
+        # makes SQLite read the statistics again
+        connection.exec_driver_sql("ANALYZE sqlite_master")
+
+def capture_statements(engine, query):
+    """Run a model query and return the (sql, parameters) pairs it executed"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        query(sessionmaker(bind=engine)())
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+def query_plan(engine, statement, parameters):
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+def check_query_plans(engine):
+    """Return a list of (name, plan) for queries that fall back to a table scan"""
+    failures = []
+    for name, query in MODEL_QUERIES:
+        for statement, parameters in capture_statements(engine, query):
+            plan = query_plan(engine, statement, parameters)
+            if any(step.startswith('SCAN') for step in plan):
+                failures.append((name, plan))
+            print(f"{name}:")
+            for step in plan:
+                print(f"    {step}")
+    for name, statement, parameters, avoided_index in TRIGGER_STATEMENTS:
+        plan = query_plan(engine, statement, parameters)
+        # the window function subqueries are always scanned; only scans of the tables count
+        table_scans = [step for step in plan if step.split()[:2] in (['SCAN', 'w'], ['SCAN', 'we'], ['SCAN', 'u'], ['SCAN', 'e'], ['SCAN', 'a'])]
+        if table_scans or any(avoided_index in step for step in plan):
+            failures.append((name, plan))
+        print(f"{name}:")
+        for step in plan:
+            print(f"    {step}")
+    return failures
+
+if __name__ == '__main__':
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    load_statistics(engine)
+    failures = check_query_plans(engine)
+    if failures:
+        print(f"{len(failures)} queries scan a full table or use the wrong index: {', '.join(name for name, plan in failures)}")
+        sys.exit(1)
+    print("All model queries use an index.")
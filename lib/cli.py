@@ -1,21 +1,33 @@
 import click
-from datetime import datetime
-from sqlalchemy.orm import sessionmaker
+from datetime import datetime, date, timedelta
 from sqlalchemy.orm.exc import NoResultFound
-from models import Base, User, Workout, Exercise, WorkoutExercises
+from models import User, Workout, Exercise, WorkoutExercises, PersonalRecord, begin_write
 from database import setup_database
-from prettytable import PrettyTable
-import pyfiglet
+from services import log_workout, add_exercise_sets, purge_orphans
+import analytics
 import time
 import random
+import csv
+import json
+import os
+import atexit
+import copy
 
-DBSession, engine = setup_database()
-
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-session = DBSession()
-
+session = None
 current_user = None
+batch_mode = False
+output_format = 'table'
+profiler = None
+
+def get_session():
+    """Connect to the database on first use so importing the CLI stays cheap"""
+    global session
+    if session is None:
+        DBSession, engine = setup_database()
+        if profiler is not None:
+            profiler.attach_engine(engine)
+        session = DBSession()
+    return session
 
 quotes = [
    "Be stronger than your excuse: Determination is stronger than any excuse.",
@@ -33,12 +45,24 @@ quotes = [
     "Crushing goals, one workout at a time"
 ]
 
-def display_progress_bar():
-    with click.progressbar(range(10), label='Creating User') as bar:
+def display_progress_bar(label):
+    if batch_mode:
+        return
+    with click.progressbar(range(10), label=label) as bar:
         for _ in bar:
             time.sleep(0.1)
+    click.clear()
+
+def return_to_menu(menu_name, menu):
+    """Offer to go back to a menu, unless running non-interactively"""
+    if batch_mode:
+        return
+    if click.confirm(f"Do you want to return to the {menu_name}?", default=True):
+        menu()
 
 def display_random_quote():
+    if batch_mode:
+        return
     random_quote = random.choice(quotes)
     colors = ['blue', 'cyan']
     random_color = random.choice(colors)
@@ -55,17 +79,101 @@ def validate_date_format(value):
     except ValueError:
         raise ValueError(click.style("Invalid date format. Please use MM-DD-YYYY.", fg='red'))
 
+IMPORT_EXERCISE_FIELDS = {'exercise_name': 'name', 'exercise_type': 'type', 'difficulty': 'difficulty', 'sets': 'sets', 'reps': 'reps'}
+
+def read_import_rows(path, file_format):
+    """Yield raw records from a CSV or JSONL file one at a time"""
+    with open(path, newline='') as file:
+        if file_format == 'csv':
+            for row in csv.DictReader(file):
+                yield row
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+def parse_import_row(row):
+    """Validate a raw import record and return a workout with its exercises"""
+    user_id = int(row['user_id'])
+    validate_positive_integer(user_id, "User ID")
+    duration = int(row['duration'])
+    validate_positive_integer(duration, "Duration")
+    date_obj = validate_date_format(str(row['date']))
+
+    exercises = row.get('exercises')
+    if exercises is None:
+        exercises = [{key: row[column] for column, key in IMPORT_EXERCISE_FIELDS.items()}] if row.get('exercise_name') else []
+
+    parsed_exercises = []
+    for exercise in exercises:
+        difficulty = int(exercise['difficulty'])
+        sets = int(exercise['sets'])
+        reps = int(exercise['reps'])
+        validate_positive_integer(difficulty, "Difficulty")
+        validate_positive_integer(sets, "Number of sets")
+        validate_positive_integer(reps, "Number of reps")
+        parsed_exercises.append({'name': exercise['name'], 'type': str(exercise['type']).lower(), 'difficulty': difficulty, 'sets': sets, 'reps': reps})
+
+    return {'user_id': user_id, 'date': date_obj.date(), 'duration': duration, 'exercises': parsed_exercises}
+
+def write_import_batch(session, records):
+    """Insert a batch of parsed workouts in a single transaction using executemany.
+
+    Returns the number of workouts written and the records skipped because
+    their user does not exist.
+    """
+    workout_rows, link_rows = [], []
+    try:
+        # IDs are assigned here so the links can refer to them; the lock keeps concurrent writers off them
+        begin_write(session)
+        # checked under the lock, so the users cannot be deleted before the commit
+        user_ids = User.existing_ids(session, [record['user_id'] for record in records])
+        unknown_user = [record for record in records if record['user_id'] not in user_ids]
+        next_workout_id = Workout.max_id(session) + 1
+        for record in records:
+            if record['user_id'] not in user_ids:
+                continue
+            workout_id = next_workout_id
+            next_workout_id += 1
+            workout_rows.append({'id': workout_id, 'date': record['date'], 'duration': record['duration'], 'user_id': record['user_id']})
+            links = {}
+            for exercise in record['exercises']:
+                exercise_id = Exercise.get_or_create_id(session, exercise['name'], exercise['type'], exercise['difficulty'], exercise['sets'], exercise['reps'], commit=False)
+                add_exercise_sets(links, exercise_id, exercise['sets'], exercise['reps'])
+            for exercise_id, (sets, reps) in links.items():
+                link_rows.append({'workout_id': workout_id, 'exercise_id': exercise_id, 'sets_completed': sets, 'reps_completed': reps})
+
+        Workout.bulk_insert(session, workout_rows)
+        WorkoutExercises.bulk_insert(session, link_rows)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return len(workout_rows), unknown_user
+
+def load_import_checkpoint(checkpoint_path):
+    """Return the number of source records already committed by a previous run"""
+    try:
+        with open(checkpoint_path, 'r') as file:
+            return json.load(file)['rows']
+    except FileNotFoundError:
+        return 0
+
+def save_import_checkpoint(checkpoint_path, rows):
+    """Record how many source records have been committed so far"""
+    with open(checkpoint_path, 'w') as file:
+        json.dump({'rows': rows}, file)
+
 def display_users_table(users):
+    from prettytable import PrettyTable
     table = PrettyTable()
     table.field_names = ["ID", "Name", "Age", "Fitness Goals"]
     for user in users:
         table.add_row([user.id, user.name, user.age, user.fitness_goals])
     click.echo(table)
-    return_to_main_menu = click.confirm("Do you want to return to the Main Menu?", default=True)
-    if return_to_main_menu:
-        main_menu()
 
 def display_workouts_table(workouts):
+    from prettytable import PrettyTable
     table = PrettyTable()
     table.field_names = ["ID", "Date", "Duration", "User ID"]
     for workout in workouts:
@@ -74,22 +182,144 @@ def display_workouts_table(workouts):
     click.echo(table)
 
 def display_exercises_table(exercises):
+    from prettytable import PrettyTable
     table = PrettyTable()
     table.field_names = ["ID", "Name", "Type", "Difficulty", "Sets", "Reps"]
     for exercise in exercises:
         table.add_row([exercise.id, exercise.name, exercise.type, exercise.difficulty, exercise.sets, exercise.reps])
     click.echo(table)
 
+USER_FIELDS = ['id', 'name', 'age', 'fitness_goals']
+WORKOUT_FIELDS = ['id', 'date', 'duration', 'user_id']
+EXERCISE_FIELDS = ['id', 'name', 'type', 'difficulty', 'sets', 'reps']
+
+def stream_records(records, fields):
+    """Write records to stdout one at a time as JSON, NDJSON or CSV"""
+    out = click.get_text_stream('stdout')
+    if output_format == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(fields)
+        for record in records:
+            writer.writerow([getattr(record, field) for field in fields])
+        return
+
+    separator = '[\n' if output_format == 'json' else ''
+    for record in records:
+        line = json.dumps({field: getattr(record, field) for field in fields}, default=str)
+        if output_format == 'json':
+            out.write(separator + line)
+            separator = ',\n'
+        else:
+            out.write(line + '\n')
+    if output_format == 'json':
+        out.write('[]\n' if separator == '[\n' else '\n]\n')
+
+def display_rows(model, display_table, fields, page_size, **filters):
+    """Stream rows in batch mode, otherwise page through them as tables"""
+    if batch_mode and output_format != 'table':
+        stream_records(model.stream(get_session(), rows=True, **filters), fields)
+    else:
+        display_paged(model, display_table, page_size, **filters)
+
+def display_paged(model, display_table, page_size, **filters):
+    """Display a model's rows one page at a time with next/previous navigation"""
+    page = model.page_after(get_session(), None, page_size, rows=True, **filters)
+    while True:
+        display_table(page)
+        if not page:
+            return
+        if batch_mode:
+            if len(page) < page_size:
+                return
+            page = model.page_after(get_session(), page[-1].id, page_size, rows=True, **filters)
+            if not page:
+                return
+            continue
+        has_next = len(page) == page_size
+        action = click.prompt("[n]ext, [p]revious or [q]uit", type=click.Choice(['n', 'p', 'q']), default='n' if has_next else 'q', show_choices=False)
+        if action == 'q':
+            return
+        if action == 'n':
+            new_page = model.page_after(get_session(), page[-1].id, page_size, rows=True, **filters)
+        else:
+            new_page = model.page_before(get_session(), page[0].id, page_size, rows=True, **filters)
+        if new_page:
+            page = new_page
+        else:
+            click.echo("No more rows in that direction.")
+
+def display_report_table(title, rows, fields):
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = [field.replace('_', ' ').title() for field in fields]
+    for row in rows:
+        table.add_row([round(value, 1) if isinstance(value, float) else value for value in row])
+    click.echo(click.style(title, fg='green'))
+    click.echo(table)
+
 def display_title():
+    import pyfiglet
     f = pyfiglet.Figlet(font="slant")
     title_art = f.renderText('Time to get fit!')
     colored_title = click.style(title_art, fg='green')
     click.echo(colored_title)
 
-@click.group()
-def cli():
+def without_prompt(param):
+    """A copy of a prompted option that is required instead, so batch runs fail fast instead of waiting on stdin"""
+    if not isinstance(param, click.Option) or param.prompt is None:
+        return param
+    param = copy.copy(param)
+    param.prompt = None
+    param.required = True
+    return param
+
+class BatchCommand(click.Command):
+    """A command whose prompted options turn into required ones while in batch mode"""
+
+    def get_params(self, ctx):
+        params = super().get_params(ctx)
+        if not batch_mode:
+            return params
+        # copies, so the command still prompts when run interactively later in the same process
+        return [without_prompt(param) for param in params]
+
+class CliGroup(click.Group):
+    command_class = BatchCommand
+
+def start_profiling(profile_json):
+    """Time commands, model methods and SQL, and report them when the CLI exits"""
+    global profiler
+    from profiling import Profiler
+    profiler = Profiler()
+    profiler.instrument_models(User, Workout, Exercise, WorkoutExercises)
+    profiler.instrument_commands(cli)
+    if session is not None:
+        profiler.attach_engine(session.get_bind())
+
+    def report():
+        click.echo(profiler.format_table(), err=True)
+        if profile_json:
+            profiler.write_json(profile_json)
+            click.echo(f"Profile written to {profile_json}", err=True)
+    atexit.register(report)
+
+@click.group(cls=CliGroup, invoke_without_command=True)
+@click.option('--batch', is_flag=True, help='Run without prompts, animations or menus')
+@click.option('--format', 'fmt', type=click.Choice(['table', 'json', 'ndjson', 'csv']), help='Output format for list commands (json, ndjson and csv imply --batch)')
+@click.option('--profile', is_flag=True, help='Print per-call-site timings and SQL statement counts on exit')
+@click.option('--profile_json', type=click.Path(dir_okay=False), help='Also write the profile as JSON to this file (implies --profile)')
+@click.pass_context
+def cli(ctx, batch, fmt, profile, profile_json):
     """Fitness Tracker CLI"""
-    display_title()
+    global batch_mode, output_format
+    batch_mode = batch or fmt not in (None, 'table')
+    output_format = fmt or ('ndjson' if batch_mode else 'table')
+    if (profile or profile_json) and profiler is None:
+        start_profiling(profile_json)
+    if ctx.invoked_subcommand is None:
+        if batch_mode:
+            ctx.fail("Batch mode needs a command to run.")
+        ctx.invoke(main_menu)
 
 @cli.command()
 @click.option('--username', prompt='Enter the username', help='Username', required=True)
@@ -100,33 +330,26 @@ def cli():
 def create_user(username, password, name, age, fitness_goals):
     """Create a new user"""
     try:
-        with click.progressbar(range(10), label='Creating User') as bar:
-            for _ in bar:
-                time.sleep(0.1)
-        click.clear()
+        display_progress_bar('Creating User')
         click.echo("Creating User...")
         display_random_quote()
-        user = User.create(session, username=username, password=password, name=name, age=age, fitness_goals=fitness_goals)
+        user = User.create(get_session(), username=username, password=password, name=name, age=age, fitness_goals=fitness_goals)
         click.echo(click.style(f"User {username} created successfully with ID: {user.id}", fg='green'))
     except Exception as e:
         click.echo(click.style(f"Error creating user: {e}", fg='red'))
-    return_to_main_menu = click.confirm("Do you want to return to the Main Menu?", default=True)
-    if return_to_main_menu:
-        main_menu()
+    return_to_menu("Main Menu", main_menu)
 
 @cli.command()
 @click.option('--user_id', prompt='Enter the user ID to delete', type=int, help='User ID to delete')
 def delete_user(user_id):
     """Delete a user by ID"""
     try:
-        User.delete(session, user_id)
+        User.delete(get_session(), user_id)
         click.echo(click.style(f"User with ID {user_id} deleted successfully!", fg='green'))
     except Exception as e:
         click.echo(click.style(f"Error deleting user: {e}", fg='red'))
 
-    return_to_main_menu = click.confirm("Do you want to return to the Main Menu?", default=True)
-    if return_to_main_menu:
-        main_menu()
+    return_to_menu("Main Menu", main_menu)
 
 @cli.command()
 def add_workout():
@@ -142,7 +365,7 @@ def add_workout():
             duration = click.prompt('Enter workout duration in minutes', type=int)
             date_obj = validate_date_format(date)
             validate_positive_integer(duration, "Duration")
-            workout = Workout.create(session, date=date_obj, duration=duration, user_id=current_user.id)
+            exercises = []
 
             click.echo(f"Add exercises to the workout (type 'done' when finished):")
 
@@ -157,20 +380,18 @@ def add_workout():
                 exercise_sets = click.prompt('Enter the number of sets', type=int)
                 exercise_reps = click.prompt('Enter the number of reps', type=int)
 
-                exercise = Exercise.create(session, name=exercise_name, exercise_type=exercise_type, difficulty=exercise_difficulty, sets=exercise_sets, reps=exercise_reps)
-                WorkoutExercises.create(session, workout_id=workout.id, exercise_id=exercise.id, sets_completed=exercise_sets, reps_completed=exercise_reps)
+                exercises.append({'name': exercise_name, 'type': exercise_type, 'difficulty': exercise_difficulty, 'sets': exercise_sets, 'reps': exercise_reps})
+
+            workout = log_workout(get_session(), current_user.id, date_obj, duration, exercises)
 
-            with click.progressbar(range(10), label='Creating Workout') as bar:
-                for _ in bar:
-                    time.sleep(0.1)
-            click.clear()
+            display_progress_bar('Creating Workout')
             click.echo("Creating Workout...")
 
             click.echo(click.style(f"Workout logged for user ID {current_user.id} on {date} for {duration} minutes with ID: {workout.id}", fg='green'))
+            for record in PersonalRecord.set_by_workout(get_session(), workout.id):
+                click.echo(click.style(f"New personal record for {record.exercise.name}: {record.best_sets} sets, {record.best_reps} reps, volume {record.best_volume}", fg='yellow'))
 
-            return_to_user_menu = click.confirm("Do you want to return to the User Menu?", default=True)
-            if return_to_user_menu:
-                user_menu()
+            return_to_menu("User Menu", user_menu)
 
         except ValueError as ve:
             click.echo(f"Error: {ve}")
@@ -183,46 +404,41 @@ def add_workout():
 def delete_workout(workout_id):
     """Delete a workout"""
     try:
-        Workout.delete(session, workout_id)
+        Workout.delete(get_session(), workout_id)
         click.echo(click.style(f"Workout with ID {workout_id} deleted successfully!", fg= 'green'))
     except Exception as e:
         click.echo(f"Error deleting workout: {e}")
-    return_to_user_menu = click.confirm("Do you want to return to the User Menu?", default=True)
-    if return_to_user_menu:
-        user_menu()
+    return_to_menu("User Menu", user_menu)
         
 @cli.command()
-def display_users():
+@click.option('--page_size', default=20, show_default=True, type=click.IntRange(min=1), help='Rows per page')
+def display_users(page_size):
     """Display all users"""
     try:
-        users = User.get_all(session)
-        display_users_table(users)
+        display_rows(User, display_users_table, USER_FIELDS, page_size)
     except Exception as e:
         click.echo(f"Error displaying users: {e}")
+    return_to_menu("Main Menu", main_menu)
 
 @cli.command()
-def display_workouts():
+@click.option('--page_size', default=20, show_default=True, type=click.IntRange(min=1), help='Rows per page')
+def display_workouts(page_size):
     """Display all workouts"""
     try:
-        workouts = Workout.get_all(session)
-        display_workouts_table(workouts)
+        display_rows(Workout, display_workouts_table, WORKOUT_FIELDS, page_size)
     except Exception as e:
         click.echo(f"Error displaying workouts: {e}")
-    return_to_user_menu = click.confirm("Do you want to return to the User Menu?", default=True)
-    if return_to_user_menu:
-        user_menu()
+    return_to_menu("User Menu", user_menu)
 
 @cli.command()
-def display_exercises():
+@click.option('--page_size', default=20, show_default=True, type=click.IntRange(min=1), help='Rows per page')
+def display_exercises(page_size):
     """Display all exercises"""
     try:
-        exercises = Exercise.get_all(session)
-        display_exercises_table(exercises)
+        display_rows(Exercise, display_exercises_table, EXERCISE_FIELDS, page_size)
     except Exception as e:
         click.echo(f"Error displaying exercises: {e}")
-    return_to_user_menu = click.confirm("Do you want to return to the User Menu?", default=True)
-    if return_to_user_menu:
-        user_menu()
+    return_to_menu("User Menu", user_menu)
 @cli.command()
 def find_user():
     """Find the logged-in user"""
@@ -237,7 +453,7 @@ def find_user():
 def find_workout(workout_id):
     """Find workout by ID"""
     try:
-        workout = Workout.find_by_id(session, workout_id)
+        workout = Workout.find_by_id(get_session(), workout_id)
         if workout:
             click.echo(click.style(f"Workout ID: {workout.id}, Date: {workout.date}, Duration: {workout.duration} minutes", fg = 'green'))
         else:
@@ -250,7 +466,7 @@ def find_workout(workout_id):
 def find_exercise(exercise_id):
     """Find exercise by ID"""
     try:
-        exercise = Exercise.find_by_id(session, exercise_id)
+        exercise = Exercise.find_by_id(get_session(), exercise_id)
         if exercise:
             click.echo(click.style(f"Exercise ID: {exercise.id}, Name: {exercise.name}, Type: {exercise.type}, Difficulty: {exercise.difficulty}", fg= 'green'))
         else:
@@ -273,15 +489,13 @@ def add_exercise(name, type, difficulty, sets, reps):
         validate_positive_integer(sets, "Number of sets")
         validate_positive_integer(reps, "Number of reps")
 
-        exercise = Exercise.create(session, name=name, exercise_type=exercise_type_lower, difficulty=difficulty, sets=sets, reps=reps)
-        click.echo(click.style(f"Exercise {name} added successfully with ID: {exercise.id}", fg='green'))
+        exercise_id = Exercise.get_or_create_id(get_session(), name=name, exercise_type=exercise_type_lower, difficulty=difficulty, sets=sets, reps=reps)
+        click.echo(click.style(f"Exercise {name} is in the catalog with ID: {exercise_id}", fg='green'))
     except ValueError as ve:
         click.echo(f"Error: {ve}")
     except Exception as e:
         click.echo(f"Error adding exercise: {e}")
-    return_to_user_menu = click.confirm("Do you want to return to the User Menu?", default=True)
-    if return_to_user_menu:
-        user_menu()
+    return_to_menu("User Menu", user_menu)
 
 
 @cli.command()
@@ -289,25 +503,23 @@ def add_exercise(name, type, difficulty, sets, reps):
 def delete_exercise(exercise_id):
     """Delete an exercise"""
     try:
-        Exercise.delete(session, exercise_id)
+        Exercise.delete(get_session(), exercise_id)
         click.echo(click.style(f"Exercise with ID {exercise_id} deleted successfully!", fg='green'))
 
     except Exception as e:
         click.echo(f"Error deleting exercise: {e}")
-    return_to_user_menu = click.confirm("Do you want to return to the User Menu?", default=True)
-    if return_to_user_menu:
-        user_menu()
+    return_to_menu("User Menu", user_menu)
 
 @cli.command()
 @click.option('--workout_id', prompt='Enter the workout ID to find', type=int, help='Workout ID to find')
 def find_workout_exercises(workout_id):
     """Display exercises associated with workouts"""
     try:
-        workout = Workout.find_by_id(session, workout_id)
+        workout = Workout.find_with_exercises(get_session(), workout_id)
         if workout:
             click.echo(click.style(f"Workout ID: {workout.id}, Date: {workout.date}, Duration: {workout.duration} minutes", fg='green'))
 
-            exercises = session.query(Exercise).join(WorkoutExercises).filter(WorkoutExercises.workout_id == workout.id).all()
+            exercises = [workout_exercise.exercise for workout_exercise in workout.exercises]
 
             if exercises:
                 click.echo("Exercises:")
@@ -319,9 +531,386 @@ def find_workout_exercises(workout_id):
             click.echo(f"Workout with ID {workout_id} not found.")
     except Exception as e:
         click.echo(f"Error finding workout: {e}")
-    return_to_user_menu = click.confirm("Do you want to return to the User Menu?", default=True)
-    if return_to_user_menu:
-        user_menu()
+    return_to_menu("User Menu", user_menu)
+@cli.command(name='import')
+@click.option('--file', 'path', prompt='Enter the file to import', type=click.Path(exists=True, dir_okay=False), help='CSV or JSONL file of workouts')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), help='File format (defaults to the file extension)')
+@click.option('--batch_size', default=1000, show_default=True, type=click.IntRange(min=1), help='Workouts inserted per transaction')
+@click.option('--resume/--no-resume', default=True, show_default=True, help='Continue from the last committed batch')
+def import_workouts(path, file_format, batch_size, resume):
+    """Bulk import workouts from a CSV or JSONL file"""
+    if file_format is None:
+        file_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+    checkpoint_path = f"{path}.checkpoint"
+    skip = load_import_checkpoint(checkpoint_path) if resume else 0
+    if skip:
+        click.echo(f"Resuming after {skip} previously committed rows.")
+
+    consumed = skip
+    imported = 0
+    rejected = 0
+    batch = []
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal imported, rejected
+        written, unknown_user = write_import_batch(get_session(), batch)
+        imported += written
+        save_import_checkpoint(checkpoint_path, consumed)
+        batch.clear()
+        for record in unknown_user:
+            rejected += 1
+            click.echo(click.style(f"Skipping row {record['line']}: user {record['user_id']} does not exist.", fg='red'))
+        elapsed = time.perf_counter() - start
+        click.echo(f"Committed {imported} workouts ({imported / elapsed:.0f} rows/sec)")
+
+    try:
+        for line_number, row in enumerate(read_import_rows(path, file_format), start=1):
+            if line_number <= skip:
+                continue
+            consumed = line_number
+            try:
+                record = parse_import_row(row)
+                record['line'] = line_number
+                batch.append(record)
+            except (KeyError, TypeError, ValueError) as e:
+                rejected += 1
+                click.echo(click.style(f"Skipping row {line_number}: {e}", fg='red'))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        else:
+            save_import_checkpoint(checkpoint_path, consumed)
+    except Exception as e:
+        click.echo(click.style(f"Error importing workouts: {e}", fg='red'))
+        click.echo(f"Re-run the import to resume after row {load_import_checkpoint(checkpoint_path)}.")
+        return
+
+    os.remove(checkpoint_path)
+    elapsed = time.perf_counter() - start
+    rate = imported / elapsed if elapsed else 0
+    click.echo(click.style(f"Imported {imported} workouts in {elapsed:.2f}s ({rate:.0f} rows/sec), {rejected} rows rejected.", fg='green'))
+
+@cli.command()
+@click.option('--file', 'path', prompt='Enter the file of users to create', type=click.Path(exists=True, dir_okay=False), help='CSV or JSONL file with username, password, name, age and fitness_goals')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), help='File format (defaults to the file extension)')
+@click.option('--batch_size', default=1000, show_default=True, type=click.IntRange(min=1), help='Users inserted per transaction')
+@click.option('--workers', type=click.IntRange(min=1), help='Password hashing processes (defaults to the CPU count)')
+@click.option('--hash_method', help='werkzeug hash method, e.g. pbkdf2:sha256:600000 (defaults to FITNESS_TRACKER_PASSWORD_HASH)')
+def provision_users(path, file_format, batch_size, workers, hash_method):
+    """Create many users from a file, hashing passwords in parallel"""
+    from provisioning import provision_users as provision
+    if file_format is None:
+        file_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+    def report_batch(stats):
+        click.echo(f"Created {stats.created} users ({stats.throughput('hash'):.0f} hashes/sec, {stats.throughput('insert'):.0f} inserts/sec)")
+
+    try:
+        start = time.perf_counter()
+        stats = provision(get_session(), read_import_rows(path, file_format), batch_size=batch_size, workers=workers, method=hash_method, on_batch=report_batch)
+        elapsed = time.perf_counter() - start
+    except Exception as e:
+        click.echo(click.style(f"Error provisioning users: {e}", fg='red'))
+        return
+
+    for stage, seconds in stats.seconds.items():
+        click.echo(f"  {stage:<8} {seconds:8.2f}s  {stats.throughput(stage):10,.0f} users/sec")
+    click.echo(click.style(f"Created {stats.created} users in {elapsed:.2f}s, {stats.skipped} already existed, {stats.rejected} rows rejected.", fg='green'))
+
+@cli.command()
+@click.option('--table', 'tables', multiple=True, type=click.Choice(['all', 'users', 'workouts', 'exercises', 'workout_exercises', 'workout_details']), default=['all'], show_default=True, help='Table to export (repeatable); workout_details joins workouts with their exercises')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'parquet', 'arrow']), default='csv', show_default=True, help='Output file format')
+@click.option('--output', default='export', show_default=True, type=click.Path(file_okay=False), help='Directory to write the files to')
+@click.option('--chunk_size', default=10000, show_default=True, type=click.IntRange(min=1), help='Rows fetched and written at a time')
+def export(tables, file_format, output, chunk_size):
+    """Stream tables to CSV, Parquet or Arrow files in constant memory"""
+    from export import EXPORTS, export_tables
+    if 'all' in tables:
+        tables = [table for table in EXPORTS if table != 'workout_details'] + [table for table in tables if table == 'workout_details']
+
+    try:
+        results = export_tables(get_session().get_bind(), tables, output, file_format, chunk_size)
+    except Exception as e:
+        click.echo(click.style(f"Error exporting: {e}", fg='red'))
+        return
+
+    for stats in results:
+        click.echo(f"  {stats.table:<18} {stats.rows:>10,} rows  {stats.seconds:6.2f}s  {stats.rows_per_second:10,.0f} rows/sec  {stats.path}")
+    total_rows = sum(stats.rows for stats in results)
+    total_seconds = sum(stats.seconds for stats in results)
+    click.echo(click.style(f"Exported {total_rows} rows in {total_seconds:.2f}s ({total_rows / total_seconds if total_seconds else 0:.0f} rows/sec).", fg='green'))
+
+@cli.command(name='backup')
+@click.option('--output', type=click.Path(dir_okay=False), help='File to write (default: backups/<database>-<timestamp>.db)')
+@click.option('--pages_per_step', default=1024, show_default=True, type=click.IntRange(min=1), help='Pages copied before yielding to writers')
+@click.option('--pause', default=0.005, show_default=True, type=click.FloatRange(min=0), help='Seconds to pause between steps')
+@click.option('--compress', is_flag=True, help='gzip the backup after checking it')
+def backup_command(output, pages_per_step, pause, compress):
+    """Back up the database while it is in use, check it and optionally compress it"""
+    from backup import backup_database, default_backup_path
+    engine = get_session().get_bind()
+    path = output or default_backup_path(engine.url.database or '')
+    try:
+        results = backup_database(engine, path, pages_per_step, pause, compress)
+    except Exception as e:
+        click.echo(click.style(f"Error backing up the database: {e}", fg='red'))
+        raise SystemExit(1)
+
+    for stats in results:
+        click.echo(f"  {stats.database:<8} {stats.pages:>10,} pages  {stats.seconds:6.2f}s  {stats.pages_per_second:10,.0f} pages/sec  "
+                   f"{stats.restarts} restarts{' (then one step)' if stats.single_step else ''}  {format_bytes(stats.bytes):>9}  {stats.path}")
+    click.echo(click.style(f"Backed up and checked {len(results)} database file(s).", fg='green'))
+
+@cli.command(name='purge-orphans')
+@click.option('--dry_run', is_flag=True, help='Only count the orphaned rows')
+def purge_orphans_command(dry_run):
+    """Delete workouts and workout exercises whose user, workout or exercise no longer exists"""
+    try:
+        counts = purge_orphans(get_session(), dry_run=dry_run)
+    except Exception as e:
+        click.echo(click.style(f"Error purging orphans: {e}", fg='red'))
+        return
+    verb = "Found" if dry_run else "Deleted"
+    click.echo(click.style(f"{verb} {counts['workouts']} orphaned workouts and {counts['workout_exercises']} orphaned workout exercises.", fg='green'))
+
+def format_bytes(size):
+    if size is None:
+        return "n/a"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def display_table_sizes(before, after):
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ["Database", "Table", "Rows Before", "Rows After", "Size Before", "Size After"]
+    table.align["Table"] = 'l'
+    previous = {(size.database, size.table): size for size in before}
+    for size in after:
+        old = previous.get((size.database, size.table))
+        table.add_row([size.database, size.table, old.rows if old else 0, size.rows, format_bytes(old.bytes if old else 0), format_bytes(size.bytes)])
+    click.echo(table)
+
+@cli.command(name='archive')
+@click.option('--before', prompt='Archive workouts dated before (MM-DD-YYYY)', help='Move workouts dated before this day (MM-DD-YYYY) to the archive database')
+@click.option('--chunk_size', default=1000, show_default=True, type=click.IntRange(min=1), help='Workouts moved per transaction')
+@click.option('--vacuum', 'compact', is_flag=True, help='Rebuild the main database file afterwards so it shrinks on disk')
+def archive_old_workouts(before, chunk_size, compact):
+    """Move old workouts into the archive database and report table sizes"""
+    from archive import archive_workouts, database_sizes, vacuum
+    try:
+        cutoff = validate_date_format(before).date()
+        db_session = get_session()
+        db_session.close()
+        engine = db_session.get_bind()
+        sizes_before = database_sizes(engine)
+        counts = archive_workouts(engine, cutoff, chunk_size, on_chunk=lambda counts: click.echo(f"  {counts['workouts']:,} workouts moved..."))
+        if compact:
+            vacuum(engine)
+        sizes_after = database_sizes(engine)
+    except ValueError as ve:
+        click.echo(ve)
+        return
+    except Exception as e:
+        click.echo(click.style(f"Error archiving workouts: {e}", fg='red'))
+        return
+    display_table_sizes(sizes_before, sizes_after)
+    click.echo(click.style(f"Archived {counts['workouts']} workouts and {counts['workout_exercises']} workout exercises dated before {cutoff}.", fg='green'))
+
+def display_records_table(records):
+    from prettytable import PrettyTable
+    table = PrettyTable()
+    table.field_names = ["Exercise", "Type", "Best Sets", "Best Reps", "Best Volume", "Volume Workout ID"]
+    for record in records:
+        table.add_row([record.exercise.name, record.exercise.type, record.best_sets, record.best_reps, record.best_volume, record.best_volume_workout_id])
+    click.echo(table)
+
+RECORD_FIELDS = ['exercise_id', 'best_sets', 'best_sets_workout_id', 'best_reps', 'best_reps_workout_id', 'best_volume', 'best_volume_workout_id']
+
+@cli.command()
+@click.option('--user_id', prompt='Enter the user ID', type=int, help='User whose records to show')
+def records(user_id):
+    """Show a user's personal records per exercise"""
+    try:
+        user_records = PersonalRecord.get_user_records(get_session(), user_id)
+        if batch_mode and output_format != 'table':
+            stream_records(user_records, RECORD_FIELDS)
+        else:
+            display_records_table(user_records)
+    except Exception as e:
+        click.echo(click.style(f"Error displaying records: {e}", fg='red'))
+
+@cli.command(name='rebuild-records')
+def rebuild_records():
+    """Recompute every personal record from the logged workouts"""
+    try:
+        start = time.perf_counter()
+        count = PersonalRecord.rebuild(get_session())
+    except Exception as e:
+        click.echo(click.style(f"Error rebuilding records: {e}", fg='red'))
+        return
+    click.echo(click.style(f"Rebuilt {count} personal records in {time.perf_counter() - start:.2f}s.", fg='green'))
+
+@cli.command(name='check-records')
+def check_records():
+    """Check the stored personal records against a fresh computation"""
+    problems = PersonalRecord.check(get_session())
+    for problem in problems[:20]:
+        click.echo(click.style(problem, fg='red'))
+    if problems:
+        click.echo(click.style(f"{len(problems)} personal records are out of date; run rebuild-records to fix them.", fg='red'))
+        raise SystemExit(1)
+    click.echo(click.style("All personal records are consistent.", fg='green'))
+
+STATS_REPORTS = {
+    'volume': ('Training volume', ['period', 'total_reps', 'volume', 'volume_change']),
+    'duration': ('Workout time', ['period', 'workouts', 'minutes', 'average_minutes', 'running_minutes']),
+    'types': ('Volume by exercise type', ['type', 'workouts', 'sets', 'total_reps', 'volume', 'share']),
+}
+
+@cli.command()
+@click.option('--user_id', prompt='Enter the user ID', type=int, help='User to report on')
+@click.option('--period', type=click.Choice(analytics.PERIODS), default='week', show_default=True, help='Group by week or month')
+@click.option('--start', help='First workout date to include (MM-DD-YYYY)')
+@click.option('--end', help='Last workout date to include (MM-DD-YYYY)')
+@click.option('--report', type=click.Choice(['all'] + list(STATS_REPORTS)), default='all', show_default=True, help='Report to show')
+def stats(user_id, period, start, end, report):
+    """Show training volume, workout time and exercise type breakdowns"""
+    try:
+        start_date = validate_date_format(start).date() if start else None
+        end_date = validate_date_format(end).date() if end else None
+        if batch_mode and output_format != 'table' and report == 'all':
+            raise ValueError("Choose a single --report for machine-readable output.")
+
+        session = get_session()
+        results = {
+            'volume': lambda: analytics.training_volume(session, user_id, period, start_date, end_date),
+            'duration': lambda: analytics.workout_durations(session, user_id, period, start_date, end_date),
+            'types': lambda: analytics.volume_by_type(session, user_id, start_date, end_date),
+        }
+        for name in (STATS_REPORTS if report == 'all' else [report]):
+            title, fields = STATS_REPORTS[name]
+            if batch_mode and output_format != 'table':
+                stream_records(results[name](), fields)
+            else:
+                display_report_table(title, results[name](), fields)
+    except ValueError as ve:
+        click.echo(f"Error: {ve}")
+    except Exception as e:
+        click.echo(f"Error computing stats: {e}")
+
+HEATMAP_SHADES = '·░▒▓█'
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def render_heatmap(days, start, end):
+    """Draw training days as a weekday x week grid shaded by intensity level"""
+    levels = {row.day: row.level for row in days}
+    first_monday = start - timedelta(days=start.weekday())
+    weeks = (end - first_monday).days // 7 + 1
+    lines = []
+    for weekday, label in enumerate(WEEKDAYS):
+        cells = []
+        for week in range(weeks):
+            day = first_monday + timedelta(days=week * 7 + weekday)
+            cells.append(' ' if day < start or day > end else HEATMAP_SHADES[min(levels.get(day, 0), len(HEATMAP_SHADES) - 1)])
+        lines.append(f"{label} {''.join(cells)}")
+    return '\n'.join(lines)
+
+ACTIVITY_REPORTS = {
+    'streaks': ('Training streaks', ['current', 'current_since', 'longest', 'streaks', 'training_days']),
+    'frequency': ('Weekly frequency', ['week', 'workouts', 'days', 'minutes', 'rolling_average']),
+    'calendar': ('Training calendar', ['day', 'workouts', 'minutes', 'level']),
+}
+
+def show_activity(user_id, start_date, end_date, report='all'):
+    """Streaks over the whole history, weekly frequency and a heatmap for start_date..end_date"""
+    session = get_session()
+    results = {
+        'streaks': lambda: [analytics.streaks(session, user_id, today=date.today())],
+        'frequency': lambda: analytics.weekly_frequency(session, user_id, start_date, end_date),
+        'calendar': lambda: analytics.calendar_heatmap(session, user_id, start_date, end_date),
+    }
+    for name in (ACTIVITY_REPORTS if report == 'all' else [report]):
+        title, fields = ACTIVITY_REPORTS[name]
+        rows = results[name]()
+        if batch_mode and output_format != 'table':
+            stream_records(rows, fields)
+        elif name == 'calendar':
+            click.echo(click.style(f"{title} {start_date} to {end_date} ({HEATMAP_SHADES[0]} rest, {HEATMAP_SHADES[1:]} by minutes trained)", fg='green'))
+            click.echo(render_heatmap(rows, start_date, end_date))
+        else:
+            display_report_table(title, rows, fields)
+
+def parse_date_range(start, end, default_days=365):
+    """Parse MM-DD-YYYY bounds; the range defaults to the year up to today"""
+    end_date = validate_date_format(end).date() if end else date.today()
+    start_date = validate_date_format(start).date() if start else end_date - timedelta(days=default_days - 1)
+    if start_date > end_date:
+        raise ValueError(click.style("The start date must not be after the end date.", fg='red'))
+    return start_date, end_date
+
+@cli.command()
+@click.option('--user_id', prompt='Enter the user ID', type=int, help='User to report on')
+@click.option('--start', help='First day of the frequency and calendar reports (MM-DD-YYYY, default: a year before --end)')
+@click.option('--end', help='Last day of the frequency and calendar reports (MM-DD-YYYY, default: today)')
+@click.option('--report', type=click.Choice(['all'] + list(ACTIVITY_REPORTS)), default='all', show_default=True, help='Report to show')
+def activity(user_id, start, end, report):
+    """Show training streaks, weekly frequency and a calendar heatmap"""
+    try:
+        start_date, end_date = parse_date_range(start, end)
+        if batch_mode and output_format != 'table' and report == 'all':
+            raise ValueError("Choose a single --report for machine-readable output.")
+        show_activity(user_id, start_date, end_date, report)
+    except ValueError as ve:
+        click.echo(f"Error: {ve}")
+    except Exception as e:
+        click.echo(f"Error computing activity: {e}")
+
+@cli.command()
+@click.option('--user_id', prompt='Enter the user ID', type=int, help='User whose workouts to show')
+@click.option('--start', prompt='Enter the first date (MM-DD-YYYY)', help='First workout date to include (MM-DD-YYYY)')
+@click.option('--end', prompt='Enter the last date (MM-DD-YYYY)', help='Last workout date to include (MM-DD-YYYY)')
+def workouts_in_range(user_id, start, end):
+    """Display a user's workouts between two dates"""
+    try:
+        start_date, end_date = parse_date_range(start, end)
+        workouts = Workout.get_user_workouts(get_session(), user_id, start_date, end_date, rows=True)
+        if batch_mode and output_format != 'table':
+            stream_records(workouts, WORKOUT_FIELDS)
+        else:
+            display_workouts_table(workouts)
+            click.echo(f"{len(workouts)} workouts from {start_date} to {end_date}.")
+    except ValueError as ve:
+        click.echo(f"Error: {ve}")
+    except Exception as e:
+        click.echo(f"Error displaying workouts: {e}")
+
+@cli.command()
+@click.option('--metric', type=click.Choice(['sets_completed', 'reps_completed', 'duration']), default='reps_completed', show_default=True, help='Value to summarize')
+@click.option('--by', type=click.Choice(['all', 'user', 'type']), default='type', show_default=True, help='Group per user, per exercise type, or not at all')
+@click.option('--user_id', type=int, help='Only include this user\'s workouts')
+@click.option('--start', help='First workout date to include (MM-DD-YYYY)')
+@click.option('--end', help='Last workout date to include (MM-DD-YYYY)')
+def distributions(metric, by, user_id, start, end):
+    """Show count, mean and percentiles of sets, reps or duration from the columnar cache"""
+    from columnar import snapshot_for, distribution_fields
+    try:
+        start_date = validate_date_format(start).date() if start else None
+        end_date = validate_date_format(end).date() if end else None
+        rows = snapshot_for(get_session().get_bind()).distribution(metric, by, user_id, start_date, end_date)
+        if batch_mode and output_format != 'table':
+            stream_records(rows, distribution_fields())
+        else:
+            display_report_table(f"{metric.replace('_', ' ').capitalize()} by {by}", rows, distribution_fields())
+    except ValueError as ve:
+        click.echo(f"Error: {ve}")
+    except ImportError:
+        click.echo(click.style("The columnar cache needs numpy: pip install numpy", fg='red'))
+
 @cli.command()
 def logout():
     """Log out the current user"""
@@ -344,19 +933,42 @@ def display_user_menu_ascii_art():
 """
     click.echo(user_menu_art)
 
-def display_user_workouts():
+def display_user_workouts(page_size=20):
     """Display workouts for the logged-in user"""
     try:
-        workouts = Workout.get_user_workouts(session, current_user.id)
+        display_paged(Workout, display_workouts_table, page_size, user_id=current_user.id)
+    except Exception as e:
+        click.echo(f"Error displaying user workouts: {e}")
+
+def display_user_workouts_in_range():
+    """Display the logged-in user's workouts between two dates"""
+    try:
+        start_date, end_date = parse_date_range(click.prompt("Enter the first date (MM-DD-YYYY)"), click.prompt("Enter the last date (MM-DD-YYYY)"))
+        workouts = Workout.get_user_workouts(get_session(), current_user.id, start_date, end_date, rows=True)
         display_workouts_table(workouts)
+        click.echo(f"{len(workouts)} workouts from {start_date} to {end_date}.")
     except Exception as e:
         click.echo(f"Error displaying user workouts: {e}")
 
-def display_user_exercises():
+def display_user_activity():
+    """Display streaks, weekly frequency and the past year's calendar for the logged-in user"""
+    try:
+        start_date, end_date = parse_date_range(None, None)
+        show_activity(current_user.id, start_date, end_date)
+    except Exception as e:
+        click.echo(f"Error displaying activity: {e}")
+
+def display_user_records():
+    """Display the logged-in user's personal records"""
+    try:
+        display_records_table(PersonalRecord.get_user_records(get_session(), current_user.id))
+    except Exception as e:
+        click.echo(f"Error displaying records: {e}")
+
+def display_user_exercises(page_size=20):
     """Display exercises for the logged-in user"""
     try:
-        exercises = Exercise.get_user_exercises(session, current_user.id)
-        display_exercises_table(exercises)
+        display_paged(Exercise, display_exercises_table, page_size, user_id=current_user.id)
     except Exception as e:
         click.echo(f"Error displaying user exercises: {e}")
 
@@ -375,9 +987,12 @@ def user_menu():
         click.echo("7. Display User Exercises")
         click.echo("8. Display Exercises")
         click.echo("9. Show Exercises in Workout")
-        click.echo("10. Logout")
+        click.echo("10. Workouts Between Dates")
+        click.echo("11. Streaks & Training Calendar")
+        click.echo("12. Personal Records")
+        click.echo("13. Logout")
 
-        choice = click.prompt("Enter your choice (1-10)", type=int)
+        choice = click.prompt("Enter your choice (1-13)", type=int)
 
         if choice == 1:
             add_workout()
@@ -398,10 +1013,16 @@ def user_menu():
         elif choice == 9:
             find_workout_exercises()
         elif choice == 10:
+            display_user_workouts_in_range()
+        elif choice == 11:
+            display_user_activity()
+        elif choice == 12:
+            display_user_records()
+        elif choice == 13:
             logout()
             break
         else:
-            click.echo("Invalid choice. Please enter a number between 1 and 10.")
+            click.echo("Invalid choice. Please enter a number between 1 and 13.")
 
 @cli.command()
 @click.option('--username', prompt='Enter the username', help='Username')
@@ -410,7 +1031,7 @@ def login(username, password):
     """Log in as an existing user"""
     global current_user
     try:
-        user = User.get_by_username(session, username)
+        user = User.get_by_username(get_session(), username)
         if user and user.check_password(password):
             current_user = user  
             click.echo(click.style(f"Successfully logged in as {username}", fg='green'))
@@ -420,9 +1041,7 @@ def login(username, password):
     except NoResultFound:
         click.echo(click.style("Invalid username or password", fg='red'))
 
-    return_to_main_menu = click.confirm("Do you want to return to the Main Menu?", default=True)
-    if return_to_main_menu:
-        main_menu()
+    return_to_menu("Main Menu", main_menu)
 
 SESSION_FILE = "user_session.txt"
 
@@ -444,18 +1063,16 @@ def load_session():
 def delete_user_by_username(username):
     """Delete a user by username"""
     try:
-        user = User.get_by_username(session, username)
+        user = User.get_by_username(get_session(), username)
         if user:
-            User.delete(session, user.id)
+            User.delete(get_session(), user.id)
             click.echo(click.style(f"User with username {username} deleted successfully!", fg='green'))
         else:
             click.echo(f"User with username {username} not found.")
     except Exception as e:
         click.echo(f"Error deleting user: {e}")
 
-    return_to_main_menu = click.confirm("Do you want to return to the Main Menu?", default=True)
-    if return_to_main_menu:
-        main_menu()
+    return_to_menu("Main Menu", main_menu)
 
 
 def display_main_menu_ascii_art():
@@ -533,9 +1150,5 @@ def main_menu():
     if current_user is not None:
         save_session(current_user.username)
 
-main_menu()
-
-main_menu()
-
 if __name__ == '__main__':
     cli()
\ No newline at end of file
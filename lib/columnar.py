@@ -0,0 +1,201 @@
+"""In-memory columnar snapshot of workouts for dashboard statistics.
+
+``workouts`` and ``workout_exercises`` are held as NumPy arrays: int32 ids,
+dates as int32 day numbers (days since 1970-01-01), exercise types as small
+int codes, and -1 for NULL counts and durations. Grouped counts, means and
+percentiles are then computed with sorts and reductions over whole arrays
+instead of loading ORM objects and looping over them in Python.
+
+``refresh()`` only fetches workouts (and their exercise rows) with an id above
+the highest one already loaded, which covers the append-only way workouts are
+logged and imported. Deletes, edits, sets added to existing workouts and
+archiving bump the workout data version (see models.workouts_changed), and
+the next ``refresh()`` then loads everything again. Needs ``pip install numpy``.
+"""
+import threading
+import weakref
+from collections import namedtuple
+from sqlalchemy import select, func
+from models import Workout, Exercise, WorkoutExercises, data_version
+
+METRICS = {
+    'sets_completed': 'exercises',
+    'reps_completed': 'exercises',
+    'duration': 'workouts',
+}
+GROUPINGS = ('all', 'user', 'type')
+DEFAULT_PERCENTILES = (0.5, 0.9, 0.99)
+
+def distribution_fields(fractions=DEFAULT_PERCENTILES):
+    return ['group', 'count', 'mean'] + [f"p{fraction * 100:g}".replace('.', '_') for fraction in fractions]
+
+def day_numbers(dates):
+    import numpy as np
+    return np.array(dates, dtype='datetime64[D]').astype(np.int32)
+
+def int_column(values):
+    import numpy as np
+    return np.array([-1 if value is None else value for value in values], dtype=np.int32)
+
+def grouped_stats(groups, values, fractions=DEFAULT_PERCENTILES):
+    """Count, mean and linearly interpolated percentiles of ``values`` per distinct ``groups`` key.
+
+    Returns ``(keys, counts, means, [percentile arrays])``. One lexsort orders
+    the values inside each group; every statistic is then read off the sorted
+    array with vectorized indexing.
+    """
+    import numpy as np
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order].astype(np.float64)
+    keys, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    if not len(keys):
+        return keys, counts, np.empty(0), [np.empty(0) for _ in fractions]
+    means = np.add.reduceat(values, starts) / counts
+    percentiles = []
+    for fraction in fractions:
+        position = starts + (counts - 1) * fraction
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        weight = position - lower
+        percentiles.append(values[lower] * (1 - weight) + values[upper] * weight)
+    return keys, counts, means, percentiles
+
+class ColumnarSnapshot:
+    def __init__(self, engine, chunk_size=50000):
+        import numpy as np
+        self.np = np
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.type_codes = {}
+        self.type_names = []
+        self.clear()
+
+    def clear(self):
+        np = self.np
+        empty = np.empty(0, dtype=np.int32)
+        self.workouts = {'id': empty, 'user_id': empty, 'day': empty, 'duration': empty}
+        self.exercises = {'workout_id': empty, 'exercise_id': empty, 'type': np.empty(0, dtype=np.int16), 'sets_completed': empty, 'reps_completed': empty, 'user_id': empty, 'day': empty}
+        self.max_workout_id = 0
+        self.version = None
+
+    def __len__(self):
+        return len(self.workouts['id'])
+
+    def reload(self):
+        with self.lock:
+            self.clear()
+            return self.load_current()
+
+    def refresh(self):
+        """Load workouts added since the last refresh, or all of them again if existing ones changed; returns how many were loaded"""
+        with self.lock:
+            return self.load_current()
+
+    def load_current(self):
+        # read first, so a change made while loading is picked up by the next refresh
+        with self.engine.connect() as connection:
+            version = data_version(connection)
+        if version != self.version:
+            self.clear()
+        loaded = self.load_new()
+        self.version = version
+        return loaded
+
+    def type_code_array(self, types):
+        np = self.np
+        names, inverse = np.unique(np.array(types, dtype=object), return_inverse=True)
+        codes = np.array([self.type_codes.setdefault(name, len(self.type_codes)) for name in names], dtype=np.int16)
+        self.type_names = sorted(self.type_codes, key=self.type_codes.get)
+        return codes[inverse]
+
+    def load_new(self):
+        np = self.np
+        workouts = select(Workout.id, Workout.user_id, Workout.date, Workout.duration).where(Workout.id > self.max_workout_id).order_by(Workout.id)
+        new_workouts = {name: [array] for name, array in self.workouts.items()}
+        new_exercises = {name: [array] for name, array in self.exercises.items() if name not in ('user_id', 'day')}
+        with self.engine.connect() as connection:
+            streaming = connection.execution_options(stream_results=True, max_row_buffer=self.chunk_size)
+            for rows in streaming.execute(workouts).partitions(self.chunk_size):
+                ids, user_ids, dates, durations = zip(*rows)
+                new_workouts['id'].append(np.array(ids, dtype=np.int32))
+                new_workouts['user_id'].append(np.array(user_ids, dtype=np.int32))
+                new_workouts['day'].append(day_numbers(dates))
+                new_workouts['duration'].append(int_column(durations))
+            # only take exercise rows for the workouts just read, even if more were logged meanwhile
+            last_id = int(new_workouts['id'][-1][-1]) if len(new_workouts['id'][-1]) else self.max_workout_id
+            links = (
+                select(WorkoutExercises.workout_id, WorkoutExercises.exercise_id, func.lower(Exercise.type), WorkoutExercises.sets_completed, WorkoutExercises.reps_completed)
+                .join(Exercise, WorkoutExercises.exercise_id == Exercise.id)
+                .where(WorkoutExercises.workout_id > self.max_workout_id, WorkoutExercises.workout_id <= last_id)
+                .order_by(WorkoutExercises.workout_id)
+            )
+            for rows in streaming.execute(links).partitions(self.chunk_size):
+                workout_ids, exercise_ids, types, sets, reps = zip(*rows)
+                new_exercises['workout_id'].append(np.array(workout_ids, dtype=np.int32))
+                new_exercises['exercise_id'].append(np.array(exercise_ids, dtype=np.int32))
+                new_exercises['type'].append(self.type_code_array(types))
+                new_exercises['sets_completed'].append(int_column(sets))
+                new_exercises['reps_completed'].append(int_column(reps))
+
+        loaded = sum(len(array) for array in new_workouts['id']) - len(self.workouts['id'])
+        self.workouts = {name: np.concatenate(arrays) for name, arrays in new_workouts.items()}
+        exercises = {name: np.concatenate(arrays) for name, arrays in new_exercises.items()}
+        # workouts are sorted by id, so each exercise row finds its workout by binary search
+        position = np.searchsorted(self.workouts['id'], exercises['workout_id'])
+        exercises['user_id'] = self.workouts['user_id'][position]
+        exercises['day'] = self.workouts['day'][position]
+        self.exercises = exercises
+        if len(self.workouts['id']):
+            self.max_workout_id = int(self.workouts['id'][-1])
+        return loaded
+
+    def distribution(self, metric, by='all', user_id=None, start=None, end=None, fractions=DEFAULT_PERCENTILES):
+        """Count, mean and percentiles of ``metric`` per user, per exercise type, or overall.
+
+        Returns named tuples with ``distribution_fields(fractions)``, sorted by
+        group. ``start``/``end`` are dates bounding the workouts included.
+        """
+        np = self.np
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of: {', '.join(METRICS)}")
+        if by not in GROUPINGS:
+            raise ValueError(f"Unknown grouping {by!r}, expected one of: {', '.join(GROUPINGS)}")
+        if by == 'type' and METRICS[metric] == 'workouts':
+            raise ValueError(f"{metric} is recorded per workout and cannot be grouped by exercise type")
+
+        with self.lock:
+            columns = self.workouts if METRICS[metric] == 'workouts' else self.exercises
+            values = columns[metric]
+            mask = values >= 0
+            if user_id is not None:
+                mask &= columns['user_id'] == user_id
+            if start is not None:
+                mask &= columns['day'] >= day_numbers([start])[0]
+            if end is not None:
+                mask &= columns['day'] <= day_numbers([end])[0]
+            if by == 'all':
+                groups = np.zeros(int(mask.sum()), dtype=np.int32)
+            else:
+                groups = columns['user_id' if by == 'user' else 'type'][mask]
+            keys, counts, means, percentiles = grouped_stats(groups, values[mask], fractions)
+            type_names = list(self.type_names)
+
+        Row = namedtuple('Distribution', distribution_fields(fractions))
+        rows = []
+        for index, key in enumerate(keys.tolist()):
+            group = 'all' if by == 'all' else type_names[key] if by == 'type' else key
+            rows.append(Row(group, int(counts[index]), float(means[index]), *(float(column[index]) for column in percentiles)))
+        return sorted(rows)
+
+snapshots = weakref.WeakKeyDictionary()
+snapshots_lock = threading.Lock()
+
+def snapshot_for(engine):
+    """The shared snapshot for ``engine``, brought up to date with new workouts"""
+    with snapshots_lock:
+        if engine not in snapshots:
+            snapshots[engine] = ColumnarSnapshot(engine)
+        snapshot = snapshots[engine]
+    snapshot.refresh()
+    return snapshot
@@ -1,9 +1,86 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from models import Base
+from archive import attach_archive, default_archive_path
 
-def setup_database():
-    engine = create_engine('sqlite:///fitness_tracker.db')
+DEFAULT_DATABASE_URL = 'sqlite:///fitness_tracker.db'
+DEFAULT_PROFILE = 'tuned'
+
+# PRAGMAs applied to every new SQLite connection, by profile
+SQLITE_PROFILES = {
+    # SQLite's own defaults: rollback journal, synchronous=FULL, 2MB page cache
+    'legacy': {},
+    # WAL lets readers run alongside the writer; NORMAL only fsyncs at checkpoints
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # WAL concurrency but an fsync on every commit
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+# applied under every profile: SQLite leaves foreign keys (and ON DELETE CASCADE) off by default
+SQLITE_REQUIRED_PRAGMAS = {'foreign_keys': 'ON'}
+
+def sqlite_pragmas(profile):
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown database profile {profile!r}, expected one of: {', '.join(SQLITE_PROFILES)}")
+    return {**SQLITE_REQUIRED_PRAGMAS, **SQLITE_PROFILES[profile]}
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run the given PRAGMAs on each connection the engine opens"""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def create_database_engine(url=None, profile=None, pool_size=None, max_overflow=None, echo=False, archive_path=None):
+    """Build an engine from arguments or the FITNESS_TRACKER_* environment variables.
+
+    SQLite URLs get the PRAGMAs of the chosen profile, and always enforce
+    foreign keys. File databases keep a small pool of open connections so the
+    PRAGMAs only run once per connection, and attach the archive of old
+    workouts (see archive.py) when there is one. Server databases get a sized
+    connection pool instead.
+    """
+    url = make_url(url or os.environ.get('FITNESS_TRACKER_DATABASE_URL', DEFAULT_DATABASE_URL))
+    profile = profile or os.environ.get('FITNESS_TRACKER_DB_PROFILE', DEFAULT_PROFILE)
+    pool_size = pool_size or int(os.environ.get('FITNESS_TRACKER_POOL_SIZE', 5))
+    max_overflow = max_overflow if max_overflow is not None else int(os.environ.get('FITNESS_TRACKER_MAX_OVERFLOW', 10))
+
+    if url.get_backend_name() != 'sqlite':
+        return create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True, echo=echo)
+
+    pragmas = sqlite_pragmas(profile)
+    if url.database and url.database != ':memory:':
+        engine = create_engine(url, poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow, connect_args={'check_same_thread': False}, echo=echo)
+        apply_sqlite_pragmas(engine, pragmas)
+        attach_archive(engine, archive_path or os.environ.get('FITNESS_TRACKER_ARCHIVE_PATH') or default_archive_path(url.database))
+        return engine
+    engine = create_engine(url, echo=echo)
+    apply_sqlite_pragmas(engine, pragmas)
+    return engine
+
+def setup_database(url=None, profile=None, **engine_options):
+    engine = create_database_engine(url, profile, **engine_options)
 
     Base.metadata.create_all(engine)
     Session = sessionmaker(bind=engine)
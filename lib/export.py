@@ -0,0 +1,135 @@
+"""Stream tables out of the database into CSV, Parquet or Arrow IPC files.
+
+Rows are read with a server-side cursor (``stream_results``) and handled in
+fixed-size chunks, so memory stays flat however big the table is. Each chunk
+is written straight to the output file: as CSV rows, or as one Arrow record
+batch / Parquet row group. Parquet and Arrow need ``pip install pyarrow``.
+
+Password hashes are never exported.
+"""
+import csv
+import os
+import time
+from sqlalchemy import select, Integer, Date
+from models import User, Workout, Exercise, WorkoutExercises
+
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+def workout_details():
+    """One row per exercise logged in a workout, with the workout and exercise columns"""
+    return (
+        select(
+            Workout.id.label('workout_id'), Workout.date, Workout.duration, Workout.user_id,
+            Exercise.id.label('exercise_id'), Exercise.name.label('exercise_name'), Exercise.type.label('exercise_type'), Exercise.difficulty,
+            WorkoutExercises.sets_completed, WorkoutExercises.reps_completed,
+        )
+        .select_from(WorkoutExercises)
+        .join(Workout, WorkoutExercises.workout_id == Workout.id)
+        .join(Exercise, WorkoutExercises.exercise_id == Exercise.id)
+        .order_by(WorkoutExercises.workout_id, WorkoutExercises.exercise_id)
+    )
+
+EXPORTS = {
+    'users': lambda: select(User.id, User.username, User.name, User.age, User.fitness_goals).order_by(User.id),
+    'workouts': lambda: select(Workout.id, Workout.date, Workout.duration, Workout.user_id).order_by(Workout.id),
+    'exercises': lambda: select(Exercise.id, Exercise.name, Exercise.type, Exercise.difficulty, Exercise.sets, Exercise.reps).order_by(Exercise.id),
+    'workout_exercises': lambda: select(WorkoutExercises.workout_id, WorkoutExercises.exercise_id, WorkoutExercises.sets_completed, WorkoutExercises.reps_completed).order_by(WorkoutExercises.workout_id, WorkoutExercises.exercise_id),
+    'workout_details': workout_details,
+}
+
+class ExportStats:
+    def __init__(self, table, path):
+        self.table = table
+        self.path = path
+        self.rows = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+def arrow_schema(statement):
+    import pyarrow as pa
+    fields = []
+    for column in statement.selected_columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Date):
+            arrow_type = pa.date32()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+class CsvWriter:
+    def __init__(self, path, statement):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column.name for column in statement.selected_columns])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class ArrowWriter:
+    """Write each chunk as one record batch (Arrow IPC) or row group (Parquet)"""
+
+    def __init__(self, path, statement, file_format):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise RuntimeError(f"{file_format} export needs pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.schema = arrow_schema(statement)
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        batch = self.pa.record_batch([self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)], schema=self.schema)
+        if hasattr(self.writer, 'write_batch'):
+            self.writer.write_batch(batch)
+        else:
+            self.writer.write_table(self.pa.Table.from_batches([batch]))
+
+    def close(self):
+        self.writer.close()
+
+def open_writer(path, statement, file_format):
+    if file_format == 'csv':
+        return CsvWriter(path, statement)
+    return ArrowWriter(path, statement, file_format)
+
+def export_table(connection, table, path, file_format='csv', chunk_size=10000, on_chunk=None):
+    """Stream one of ``EXPORTS`` into ``path`` and return its ExportStats"""
+    statement = EXPORTS[table]()
+    stats = ExportStats(table, path)
+    start = time.perf_counter()
+    writer = open_writer(path, statement, file_format)
+    try:
+        result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(statement)
+        for rows in result.partitions(chunk_size):
+            writer.write(rows)
+            stats.rows += len(rows)
+            stats.seconds = time.perf_counter() - start
+            if on_chunk is not None:
+                on_chunk(stats)
+    finally:
+        writer.close()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+def export_tables(engine, tables, directory, file_format='csv', chunk_size=10000, on_chunk=None):
+    """Export each table to ``<directory>/<table><extension>`` and return their stats"""
+    os.makedirs(directory, exist_ok=True)
+    results = []
+    with engine.connect() as connection:
+        for table in tables:
+            path = os.path.join(directory, table + FORMATS[file_format])
+            results.append(export_table(connection, table, path, file_format, chunk_size, on_chunk))
+    return results
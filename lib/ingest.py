@@ -0,0 +1,200 @@
+"""Write-behind queue for set completions posted at a high rate.
+
+Producers on any thread call ``IngestQueue.log_sets`` and return as soon as
+the event is queued. One writer thread takes events off the queue and commits
+them in groups: a group closes when it reaches ``max_batch`` events or when
+its first event has waited ``max_delay`` seconds. Events for the same workout
+and exercise are merged before writing (see services.add_exercise_sets) and
+every group is one executemany upsert and one commit. When ``max_pending``
+events are waiting, producers block until the writer catches up. ``close``
+stops new events, commits everything already queued and waits for the writer.
+"""
+import collections
+import queue
+import threading
+import time
+from models import WorkoutExercises
+from profiling import percentile
+from services import add_exercise_sets
+
+SetEvent = collections.namedtuple('SetEvent', ['workout_id', 'exercise_id', 'sets_completed', 'reps_completed', 'queued_at'])
+
+# put on the queue by close() after the last event
+STOP = object()
+
+class IngestMetrics:
+    """Counters and latency samples shared by producers and the writer"""
+
+    def __init__(self, samples=100000):
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.accepted = 0
+        self.blocked = 0
+        self.committed = 0
+        self.rows = 0
+        self.batches = 0
+        self.rejected = 0
+        self.last_error = None
+        self.max_depth = 0
+        # seconds per commit, and from log_sets to commit per event
+        self.commit_seconds = collections.deque(maxlen=samples)
+        self.event_seconds = collections.deque(maxlen=samples)
+
+    def record_batch(self, events, rows, commit_seconds, committed_at):
+        with self.lock:
+            self.committed += len(events)
+            self.rows += rows
+            self.batches += 1
+            self.commit_seconds.append(commit_seconds)
+            self.event_seconds.extend(committed_at - event.queued_at for event in events)
+
+    def record_rejected(self, count, error):
+        with self.lock:
+            self.rejected += count
+            self.last_error = str(getattr(error, 'orig', None) or error)
+
+    def snapshot(self, depth=0):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started_at
+            commit_seconds = sorted(self.commit_seconds)
+            event_seconds = sorted(self.event_seconds)
+            return {
+                'accepted': self.accepted,
+                'committed': self.committed,
+                'rejected': self.rejected,
+                'rows_written': self.rows,
+                'batches': self.batches,
+                'mean_batch': self.committed / self.batches if self.batches else 0.0,
+                'events_per_second': self.committed / elapsed if elapsed else 0.0,
+                'queue_depth': depth,
+                'max_queue_depth': self.max_depth,
+                'blocked_puts': self.blocked,
+                'commit_ms_p50': percentile(commit_seconds, 0.50) * 1000,
+                'commit_ms_p99': percentile(commit_seconds, 0.99) * 1000,
+                'latency_ms_p50': percentile(event_seconds, 0.50) * 1000,
+                'latency_ms_p99': percentile(event_seconds, 0.99) * 1000,
+                'last_error': self.last_error,
+            }
+
+class IngestQueue:
+    def __init__(self, Session, max_batch=500, max_delay=0.05, max_pending=10000, on_error=None):
+        self.Session = Session
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_error = on_error
+        self.events = queue.Queue(maxsize=max_pending)
+        self.metrics = IngestMetrics()
+        # guards closed and putting; notified when the last put in progress ends
+        self.lock = threading.Condition()
+        self.closed = False
+        self.putting = 0
+        self.writer = threading.Thread(target=self.run, name='ingest-writer', daemon=True)
+        self.writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def log_sets(self, workout_id, exercise_id, sets_completed=1, reps_completed=0, timeout=None):
+        """Queue completed sets of an exercise in a workout.
+
+        Blocks while the queue is full; raises queue.Full if ``timeout``
+        seconds pass first, and RuntimeError once the queue is closed.
+        """
+        event = SetEvent(workout_id, exercise_id, sets_completed, reps_completed, time.perf_counter())
+        # counted as putting rather than holding the lock while waiting for room,
+        # so producers do not queue behind each other's timeouts; close() waits
+        # for the count to drop before it queues STOP
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("The ingest queue is closed.")
+            self.putting += 1
+        try:
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                with self.metrics.lock:
+                    self.metrics.blocked += 1
+                self.events.put(event, timeout=timeout)
+        finally:
+            with self.lock:
+                self.putting -= 1
+                if not self.putting:
+                    self.lock.notify_all()
+        with self.metrics.lock:
+            self.metrics.accepted += 1
+            self.metrics.max_depth = max(self.metrics.max_depth, self.events.qsize())
+
+    def close(self, timeout=None):
+        """Stop accepting events, commit the queued ones and wait for the writer to finish"""
+        with self.lock:
+            closing = not self.closed
+            self.closed = True
+            # the writer keeps draining, so puts in progress finish or time out
+            self.lock.wait_for(lambda: not self.putting)
+        if closing:
+            self.events.put(STOP)
+        self.writer.join(timeout)
+
+    def stats(self):
+        return self.metrics.snapshot(self.events.qsize())
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            event = self.events.get()
+            if event is STOP:
+                return
+            batch = [event]
+            deadline = event.queued_at + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    event = self.events.get(timeout=remaining) if remaining > 0 else self.events.get_nowait()
+                except queue.Empty:
+                    break
+                if event is STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+            self.commit(batch)
+
+    def commit(self, batch):
+        links = {}
+        for event in batch:
+            add_exercise_sets(links.setdefault(event.workout_id, {}), event.exercise_id, event.sets_completed, event.reps_completed)
+        rows = [
+            {'workout_id': workout_id, 'exercise_id': exercise_id, 'sets_completed': sets, 'reps_completed': reps}
+            for workout_id, exercise_links in links.items()
+            for exercise_id, (sets, reps) in exercise_links.items()
+        ]
+        session = self.Session()
+        try:
+            start = time.perf_counter()
+            WorkoutExercises.add_sets_many(session, rows)
+            session.commit()
+            committed_at = time.perf_counter()
+            self.metrics.record_batch(batch, len(rows), committed_at - start, committed_at)
+        except Exception:
+            session.rollback()
+            # one bad event (e.g. an unknown workout) should not lose the rest of the group
+            self.commit_each(session, batch)
+        finally:
+            session.close()
+
+    def commit_each(self, session, batch):
+        for event in batch:
+            row = {'workout_id': event.workout_id, 'exercise_id': event.exercise_id, 'sets_completed': event.sets_completed, 'reps_completed': event.reps_completed}
+            try:
+                start = time.perf_counter()
+                WorkoutExercises.add_sets_many(session, [row])
+                session.commit()
+                committed_at = time.perf_counter()
+                self.metrics.record_batch([event], 1, committed_at - start, committed_at)
+            except Exception as e:
+                session.rollback()
+                self.metrics.record_rejected(1, e)
+                if self.on_error:
+                    self.on_error(event, e)
@@ -0,0 +1,130 @@
+"""Load test the JSON API and report requests/sec and latency percentiles.
+
+Worker threads each keep one HTTP/1.1 connection open and send a mix of
+user, workout and exercise reads plus a share of workout writes. Without
+``--url`` the server is started in-process against a temporary SQLite file
+filled by seed_data, so the numbers cover the whole stack on this machine.
+
+    python load_test.py --requests 5000 --concurrency 16
+    python load_test.py --url http://127.0.0.1:8000 --users 1000
+"""
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+import click
+from profiling import percentile
+
+def request_mix(rng, users, write_ratio):
+    """Pick the next (method, path, body) to send"""
+    user_id = rng.randint(1, users)
+    if rng.random() < write_ratio:
+        return 'POST', f'/users/{user_id}/workouts', {'date': '2024-06-01', 'duration': 40, 'exercises': [
+            {'name': 'Squat', 'type': 'legs', 'difficulty': 3, 'sets': 5, 'reps': 5},
+        ]}
+    return rng.choice([
+        ('GET', f'/users/{user_id}', None),
+        ('GET', f'/users/{user_id}/workouts?limit=20', None),
+        ('GET', f'/users/{user_id}/exercises?limit=20', None),
+        ('GET', f'/users?after={user_id}&limit=20', None),
+        ('GET', '/exercises?limit=20', None),
+    ])
+
+def run_worker(host, port, count, users, write_ratio, seed, latencies, errors):
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    for _ in range(count):
+        method, path, body = request_mix(rng, users, write_ratio)
+        data = json.dumps(body) if body is not None else None
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=data, headers={'Content-Type': 'application/json'} if data else {})
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(f"{method} {path}: {response.status}")
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(f"{method} {path}: {e}")
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+def fetch_cache_stats(host, port):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        connection.request('GET', '/cache/stats')
+        response = connection.getresponse()
+        return json.loads(response.read()) if response.status == 200 else None
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+    finally:
+        connection.close()
+
+def run_load(host, port, requests, concurrency, users, write_ratio, seed):
+    """Send ``requests`` requests from ``concurrency`` threads and return (elapsed, latencies, errors)"""
+    latencies, errors = [], []
+    per_worker = [requests // concurrency + (1 if index < requests % concurrency else 0) for index in range(concurrency)]
+    threads = [threading.Thread(target=run_worker, args=(host, port, count, users, write_ratio, seed + index, latencies, errors)) for index, count in enumerate(per_worker)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sorted(latencies), errors
+
+@click.command()
+@click.option('--url', help='Running API server to test (default: start one on a temporary seeded database)')
+@click.option('--requests', 'total_requests', default=5000, show_default=True, type=click.IntRange(min=1))
+@click.option('--concurrency', default=16, show_default=True, type=click.IntRange(min=1), help='Client threads')
+@click.option('--users', default=200, show_default=True, type=click.IntRange(min=1), help='Users to seed, or already present at --url')
+@click.option('--workouts_per_user', default=20, show_default=True, type=click.IntRange(min=0), help='Workouts to seed per user')
+@click.option('--write_ratio', default=0.1, show_default=True, type=click.FloatRange(0, 1), help='Share of requests that log a workout')
+@click.option('--seed', default=0, show_default=True)
+def load_test(url, total_requests, concurrency, users, workouts_per_user, write_ratio, seed):
+    """Measure API throughput and latency under concurrent clients"""
+    server = directory = None
+    if url:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        from api_server import make_server
+        from database import setup_database
+        from seed_data import populate
+        directory = tempfile.TemporaryDirectory()
+        database = f"sqlite:///{os.path.join(directory.name, 'load_test.db')}"
+        click.echo(f"Seeding {users} users x {workouts_per_user} workouts...")
+        Session, engine = setup_database(database)
+        session = Session()
+        populate(session, users, workouts_per_user, seed=seed)
+        session.close()
+        engine.dispose()
+        server = make_server(port=0, database=database)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+
+    try:
+        elapsed, latencies, errors = run_load(host, port, total_requests, concurrency, users, write_ratio, seed)
+        cache_stats = fetch_cache_stats(host, port)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            directory.cleanup()
+
+    click.echo(f"{len(latencies)} requests in {elapsed:.2f}s with {concurrency} clients: {len(latencies) / elapsed:,.0f} requests/sec")
+    if latencies:
+        click.echo(f"Latency p50 {percentile(latencies, 0.50) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    if cache_stats:
+        click.echo(f"Lookup cache: {cache_stats['hit_rate']:.1%} hit rate ({cache_stats['hits']} hits, {cache_stats['misses']} misses), "
+                   f"{cache_stats['size']}/{cache_stats['maxsize']} entries, {cache_stats['evictions']} evictions, {cache_stats['expirations']} expirations")
+    if errors:
+        click.echo(click.style(f"{len(errors)} failed requests, e.g. {errors[0]}", fg='red'))
+
+if __name__ == '__main__':
+    load_test()
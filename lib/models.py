@@ -1,13 +1,264 @@
-from sqlalchemy import create_engine, Date, ForeignKey, Enum, inspect
+import calendar
+import os
+import weakref
+from collections import namedtuple
+from datetime import date
+from sqlalchemy import create_engine, Date, ForeignKey, Enum, inspect, func, event, text, select, bindparam, table, column
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, CheckConstraint
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy import Column, Integer, String, CheckConstraint, Index
+from sqlalchemy.orm import relationship, sessionmaker, Session, selectinload, joinedload, aliased
 from sqlalchemy.types import Enum as EnumType
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.orm.exc import NoResultFound
+from cache import LRUCache
 
 Base = declarative_base()
 
+EXERCISE_CACHE_SIZE = 1024
+
+# werkzeug hash method and salt length, e.g. "pbkdf2:sha256:600000" or "scrypt:32768:8:1";
+# unset uses werkzeug's default
+PASSWORD_HASH_METHOD = os.environ.get('FITNESS_TRACKER_PASSWORD_HASH')
+PASSWORD_SALT_LENGTH = int(os.environ.get('FITNESS_TRACKER_PASSWORD_SALT_LENGTH', 16))
+
+def hash_password(password, method=None, salt_length=None):
+    """Hash a password with the configured (or given) werkzeug method."""
+    from werkzeug.security import generate_password_hash
+    method = method or PASSWORD_HASH_METHOD
+    salt_length = salt_length or PASSWORD_SALT_LENGTH
+    if method:
+        return generate_password_hash(password, method=method, salt_length=salt_length)
+    return generate_password_hash(password, salt_length=salt_length)
+
+# (normalized name, type) -> exercise ID, one cache per engine
+exercise_id_caches = weakref.WeakKeyDictionary()
+
+def exercise_id_cache(session):
+    engine = session.get_bind()
+    if engine not in exercise_id_caches:
+        exercise_id_caches[engine] = LRUCache(EXERCISE_CACHE_SIZE)
+    return exercise_id_caches[engine]
+
+def normalize_exercise_key(name, exercise_type):
+    return name.strip().lower(), exercise_type.strip().lower()
+
+@event.listens_for(Session, 'after_commit')
+def cache_committed_exercise_ids(session):
+    for cache, key, exercise_id in session.info.pop('pending_exercise_ids', []):
+        cache.put(key, exercise_id)
+
+@event.listens_for(Session, 'after_transaction_end')
+def discard_uncommitted_exercise_ids(session, transaction):
+    # IDs seen in a transaction that rolled back may not exist
+    if transaction.parent is None:
+        session.info.pop('pending_exercise_ids', None)
+
+# (kind, key) -> immutable snapshot of a row, one cache per engine. Entries expire
+# after the TTL, which bounds staleness from writes made by other processes.
+LOOKUP_CACHE_SIZE = int(os.environ.get('FITNESS_TRACKER_LOOKUP_CACHE_SIZE', 10000))
+LOOKUP_CACHE_TTL = float(os.environ.get('FITNESS_TRACKER_LOOKUP_CACHE_TTL', 60))
+LOOKUP_KINDS = {'user': ('user', 'username'), 'workout': ('workout',), 'exercise': ('exercise',)}
+lookup_caches = weakref.WeakKeyDictionary()
+
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'username', 'name', 'age', 'fitness_goals'])
+WorkoutSnapshot = namedtuple('WorkoutSnapshot', ['id', 'date', 'duration', 'user_id'])
+ExerciseSnapshot = namedtuple('ExerciseSnapshot', ['id', 'name', 'type', 'difficulty', 'sets', 'reps'])
+
+def lookup_cache(session):
+    engine = session.get_bind()
+    if engine not in lookup_caches:
+        lookup_caches[engine] = LRUCache(LOOKUP_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL)
+    return lookup_caches[engine]
+
+def cached_lookup(session, key, load, snapshot_type):
+    """Return the cached snapshot for ``key``, or load the row and cache a snapshot of it"""
+    cache = lookup_cache(session)
+    found = cache.get(key)
+    if found is None:
+        instance = load()
+        if instance is None:
+            return None
+        found = snapshot_type(*(getattr(instance, field) for field in snapshot_type._fields))
+        cache.put(key, found)
+    return found
+
+def invalidate_lookups(session, kind, ids, field='id'):
+    """Drop cached snapshots whose ``field`` is in ``ids``, now and again once the transaction commits"""
+    ids = set(ids)
+    if not ids:
+        return
+    cache = lookup_cache(session)
+    kinds = LOOKUP_KINDS[kind]
+
+    def stale(key, value):
+        return key[0] in kinds and getattr(value, field) in ids
+
+    cache.discard_matching(stale)
+    session.info.setdefault('pending_lookup_invalidations', []).append((cache, stale))
+
+@event.listens_for(Session, 'after_flush')
+def invalidate_flushed_lookups(session, flush_context):
+    # ORM updates and deletes; bulk statements invalidate explicitly
+    changed = {User: set(), Workout: set(), Exercise: set()}
+    deleted_users = set()
+    for instance in list(session.dirty) + list(session.deleted):
+        if type(instance) in changed:
+            changed[type(instance)].add(instance.id)
+            if isinstance(instance, User) and instance in session.deleted:
+                deleted_users.add(instance.id)
+    invalidate_lookups(session, 'user', changed[User])
+    invalidate_lookups(session, 'workout', changed[Workout])
+    invalidate_lookups(session, 'workout', deleted_users, field='user_id')
+    invalidate_lookups(session, 'exercise', changed[Exercise])
+
+@event.listens_for(Session, 'after_commit')
+def apply_lookup_invalidations(session):
+    # a reader may have cached the old row again before the commit
+    for cache, stale in session.info.pop('pending_lookup_invalidations', []):
+        cache.discard_matching(stale)
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_lookup_invalidations(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('pending_lookup_invalidations', None)
+
+# Caches built from workouts (see columnar.py) keep appending newly logged
+# workouts, and reload when a transaction has edited or deleted existing ones.
+# Such transactions bump a counter in data_versions, once per transaction.
+WORKOUT_DATA = 'workouts'
+BUMP_DATA_VERSION = text(
+    "INSERT INTO data_versions (name, version) VALUES (:name, 1) "
+    "ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1"
+)
+
+def bump_data_version(connection, name=WORKOUT_DATA):
+    connection.execute(BUMP_DATA_VERSION, {'name': name})
+
+def data_version(connection, name=WORKOUT_DATA):
+    return connection.execute(text("SELECT version FROM data_versions WHERE name = :name"), {'name': name}).scalar() or 0
+
+def workouts_changed(session):
+    """Bump the workout data version in the session's transaction, unless it already was"""
+    if not session.info.get('workout_data_bumped'):
+        bump_data_version(session.connection())
+        session.info['workout_data_bumped'] = True
+
+@event.listens_for(Session, 'after_flush')
+def bump_flushed_data_version(session, flush_context):
+    # links added to workouts of earlier transactions are edits too; a new workout's own links are not
+    created = session.info.setdefault('created_workout_ids', set())
+    created.update(instance.id for instance in session.new if isinstance(instance, Workout))
+    changed = any(isinstance(instance, (Workout, WorkoutExercises, Exercise)) for instance in session.dirty)
+    deleted = any(isinstance(instance, (User, Workout, WorkoutExercises, Exercise)) for instance in session.deleted)
+    if changed or deleted or any(isinstance(instance, WorkoutExercises) and instance.workout_id not in created for instance in session.new):
+        workouts_changed(session)
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_data_version_bump(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('workout_data_bumped', None)
+        session.info.pop('created_workout_ids', None)
+
+# Workouts dated before a cutoff can be moved into an archive database that
+# every connection ATTACHes (see archive.py). These TEMP views read the hot and
+# archived rows together.
+ARCHIVE_SCHEMA = 'archive'
+all_workouts = table('all_workouts', column('id', Integer), column('date', Date), column('duration', Integer), column('user_id', Integer))
+
+def archive_attached(session):
+    return ARCHIVE_SCHEMA in session.connection().info.get('attached', ())
+
+def archive_cutoff(session):
+    """The date before which workouts may be archived, or None without an archive."""
+    if not archive_attached(session):
+        return None
+    cutoff = session.execute(text(f"SELECT cutoff FROM {ARCHIVE_SCHEMA}.archive_cutoff")).scalar()
+    return date.fromisoformat(cutoff) if cutoff else None
+
+def reaches_archive(session, start):
+    cutoff = archive_cutoff(session)
+    return cutoff is not None and (start is None or start < cutoff)
+
+def delete_archived(session, statement, ids):
+    """Run a DELETE against the archive with ``:ids`` expanded, returning the row count (0 without an archive)."""
+    if not archive_attached(session):
+        return 0
+    return session.execute(text(statement).bindparams(bindparam('ids', expanding=True)), {'ids': list(ids)}).rowcount
+
+def commit_or_flush(session, commit):
+    """Commit the session, or only flush it so the caller can commit a larger unit of work."""
+    if commit:
+        session.commit()
+    else:
+        session.flush()
+
+def begin_write(session):
+    """Take the write lock now, so IDs read next cannot be taken by another writer before the commit.
+
+    pysqlite defers BEGIN until the first write, so on SQLite this opens the
+    transaction with BEGIN IMMEDIATE; on PostgreSQL inserts into workouts are
+    locked out instead.
+    """
+    connection = session.connection()
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        dbapi_connection = connection.connection.connection
+        if not dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+    elif dialect == 'postgresql':
+        connection.exec_driver_sql("LOCK TABLE workouts IN SHARE ROW EXCLUSIVE MODE")
+
+def keyset_page(query, key_column, after_id=None, before_id=None, limit=20):
+    """Return one page of ``query`` ordered by ``key_column``.
+
+    Seeks past ``after_id`` (or back from ``before_id``) with an indexed range
+    condition instead of an OFFSET, so every page costs the same to fetch.
+    """
+    if before_id is not None:
+        rows = query.filter(key_column < before_id).order_by(key_column.desc()).limit(limit).all()
+        rows.reverse()
+        return rows
+    if after_id is not None:
+        query = query.filter(key_column > after_id)
+    return query.order_by(key_column).limit(limit).all()
+
+DELETE_CHUNK_SIZE = 500
+
+def id_chunks(ids, size=DELETE_CHUNK_SIZE):
+    """Split ids into sorted, de-duplicated chunks that stay under SQLite's bound parameter limit."""
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def stream_query(query, key_column, batch_size=1000):
+    """Iterate over ``query`` in ``key_column`` order, fetching ``batch_size`` rows at a time."""
+    return query.order_by(key_column).yield_per(batch_size)
+
+# Read-only listings select just the columns of a snapshot type with Core and
+# return namedtuples, skipping ORM instances and identity-map bookkeeping.
+
+def select_rows(row_type, table):
+    return select(*(table.c[field] for field in row_type._fields))
+
+def fetch_rows(session, statement, row_type):
+    return [row_type._make(row) for row in session.execute(statement)]
+
+def keyset_rows(session, statement, key_column, row_type, after_id=None, before_id=None, limit=20):
+    """Like keyset_page for a Core select, returning ``row_type`` records."""
+    if before_id is not None:
+        rows = fetch_rows(session, statement.where(key_column < before_id).order_by(key_column.desc()).limit(limit), row_type)
+        rows.reverse()
+        return rows
+    if after_id is not None:
+        statement = statement.where(key_column > after_id)
+    return fetch_rows(session, statement.order_by(key_column).limit(limit), row_type)
+
+def stream_rows(session, statement, key_column, row_type, batch_size=1000):
+    """Like stream_query for a Core select, yielding ``row_type`` records."""
+    result = session.execute(statement.order_by(key_column).execution_options(stream_results=True))
+    for partition in result.partitions(batch_size):
+        for row in partition:
+            yield row_type._make(row)
+
 class ExerciseType(EnumType):
     CORE = 'core'
     CARDIO = 'cardio'
@@ -30,27 +281,57 @@ class Exercise(Base):
 
     __table_args__ = (
         CheckConstraint('difficulty >= 1 AND difficulty <= 5', name='check_difficulty'),
-        CheckConstraint("lower(type) IN ('core', 'cardio', 'chest', 'triceps', 'shoulders', 'back', 'biceps', 'legs')", name='check_exercise_type_lower')
+        CheckConstraint("lower(type) IN ('core', 'cardio', 'chest', 'triceps', 'shoulders', 'back', 'biceps', 'legs')", name='check_exercise_type_lower'),
+        Index('uq_exercises_name_type', func.lower(func.trim(name)), func.lower(type), unique=True),
     )
 
-    workouts = relationship('WorkoutExercises', back_populates='exercise')
+    workouts = relationship('WorkoutExercises', back_populates='exercise', cascade='all, delete-orphan', passive_deletes=True)
 
     @classmethod
-    def create(cls, session, name, exercise_type, difficulty, sets, reps):
+    def create(cls, session, name, exercise_type, difficulty, sets, reps, commit=True):
         exercise = cls(name=name, type=exercise_type, difficulty=difficulty, sets=sets, reps=reps)
         session.add(exercise)
-        session.commit()
+        commit_or_flush(session, commit)
         return exercise
 
     @classmethod
     def delete(cls, session, exercise_id):
         exercise = cls.find_by_id(session, exercise_id)
         if exercise:
+            exercise_id_cache(session).discard(normalize_exercise_key(exercise.name, exercise.type))
+            invalidate_lookups(session, 'exercise', [exercise_id])
+            delete_archived(session, f"DELETE FROM {ARCHIVE_SCHEMA}.workout_exercises WHERE exercise_id IN :ids", [exercise_id])
             session.delete(exercise)
             session.commit()
 
     @classmethod
-    def get_all(cls, session):
+    def lookup(cls, session, exercise_id):
+        """Get a read-only snapshot of an exercise by ID, served from the lookup cache when possible."""
+        return cached_lookup(session, ('exercise', exercise_id), lambda: cls.find_by_id(session, exercise_id), ExerciseSnapshot)
+
+    @classmethod
+    def get_or_create_id(cls, session, name, exercise_type, difficulty, sets, reps, commit=True):
+        """Get the catalog ID of an exercise by name and type, adding it to the catalog if needed."""
+        key = normalize_exercise_key(name, exercise_type)
+        cache = exercise_id_cache(session)
+        exercise_id = cache.get(key)
+        if exercise_id is not None:
+            return exercise_id
+
+        exercise_id = session.query(cls.id).filter(func.lower(func.trim(cls.name)) == key[0], func.lower(cls.type) == key[1]).scalar()
+        if exercise_id is None:
+            exercise_id = cls.create(session, name=name.strip(), exercise_type=key[1], difficulty=difficulty, sets=sets, reps=reps, commit=commit).id
+            if commit:
+                cache.put(key, exercise_id)
+                return exercise_id
+        session.info.setdefault('pending_exercise_ids', []).append((cache, key, exercise_id))
+        return exercise_id
+
+    @classmethod
+    def get_all(cls, session, rows=False):
+        """Get every exercise; with ``rows``, as ExerciseSnapshot records instead of ORM instances."""
+        if rows:
+            return fetch_rows(session, cls.rows_select().order_by(cls.__table__.c.id), ExerciseSnapshot)
         return session.query(cls).all()
 
     @classmethod
@@ -60,7 +341,54 @@ class Exercise(Base):
     @classmethod
     def get_user_exercises(cls, session, user_id):
         """Get exercises for a specific user."""
-        return session.query(cls).join(WorkoutExercises).join(Workout).filter(Workout.user_id == user_id).all()
+        return session.query(cls).join(WorkoutExercises).join(Workout).filter(Workout.user_id == user_id).distinct().all()
+
+    @classmethod
+    def get_workout_exercises(cls, session, workout_id):
+        """Get exercises logged in a specific workout."""
+        return session.query(cls).join(WorkoutExercises).filter(WorkoutExercises.workout_id == workout_id).all()
+
+    @classmethod
+    def page_query(cls, session, user_id=None):
+        query = session.query(cls)
+        if user_id is not None:
+            query = query.join(WorkoutExercises).join(Workout).filter(Workout.user_id == user_id).distinct()
+        return query
+
+    @classmethod
+    def rows_select(cls, user_id=None):
+        statement = select_rows(ExerciseSnapshot, cls.__table__)
+        if user_id is not None:
+            joined = cls.__table__.join(WorkoutExercises.__table__).join(Workout.__table__)
+            statement = statement.select_from(joined).where(Workout.__table__.c.user_id == user_id).distinct()
+        return statement
+
+    @classmethod
+    def page_after(cls, session, last_id, limit, user_id=None, rows=False):
+        """Get the page of exercises following ``last_id`` (the first page when None)."""
+        if rows:
+            return keyset_rows(session, cls.rows_select(user_id), cls.__table__.c.id, ExerciseSnapshot, after_id=last_id, limit=limit)
+        return keyset_page(cls.page_query(session, user_id), cls.id, after_id=last_id, limit=limit)
+
+    @classmethod
+    def page_before(cls, session, first_id, limit, user_id=None, rows=False):
+        """Get the page of exercises preceding ``first_id``."""
+        if rows:
+            return keyset_rows(session, cls.rows_select(user_id), cls.__table__.c.id, ExerciseSnapshot, before_id=first_id, limit=limit)
+        return keyset_page(cls.page_query(session, user_id), cls.id, before_id=first_id, limit=limit)
+
+    @classmethod
+    def stream(cls, session, batch_size=1000, user_id=None, rows=False):
+        """Iterate over all exercises without loading them all at once."""
+        if rows:
+            return stream_rows(session, cls.rows_select(user_id), cls.__table__.c.id, ExerciseSnapshot, batch_size)
+        return stream_query(cls.page_query(session, user_id), cls.id, batch_size)
+
+    @classmethod
+    def bulk_insert(cls, session, rows):
+        """Insert many exercise rows with one executemany. The caller commits."""
+        if rows:
+            session.execute(cls.__table__.insert(), rows)
 
 class User(Base):
     __tablename__ = 'users'
@@ -72,70 +400,187 @@ class User(Base):
     age = Column(Integer)
     fitness_goals = Column(String)
 
-    workouts = relationship('Workout', back_populates='user')
+    workouts = relationship('Workout', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
 
     @staticmethod
     def set_password(password):
-        return generate_password_hash(password)
+        return hash_password(password)
 
     def check_password(self, password):
+        from werkzeug.security import check_password_hash
         return check_password_hash(self.password_hash, password)
 
     @classmethod
-    def create(cls, session, username, password, name, age, fitness_goals):
+    def create(cls, session, username, password, name, age, fitness_goals, commit=True):
         hashed_password = cls.set_password(password)
         user = cls(username=username, password_hash=hashed_password, name=name, age=age, fitness_goals=fitness_goals)
         session.add(user)
-        session.commit()
+        lookup_cache(session).discard(('username', username))
+        commit_or_flush(session, commit)
         return user
 
     @classmethod
     def delete(cls, session, user_id):
-        user = cls.find_by_id(session, user_id)
-        if user:
-            session.delete(user)
-            session.commit()
+        cls.delete_many(session, [user_id])
 
     @classmethod
-    def get_all(cls, session):
+    def lookup(cls, session, user_id):
+        """Get a read-only snapshot of a user by ID, served from the lookup cache when possible."""
+        return cached_lookup(session, ('user', user_id), lambda: cls.find_by_id(session, user_id), UserSnapshot)
+
+    @classmethod
+    def lookup_by_username(cls, session, username):
+        """Get a read-only snapshot of a user by username, served from the lookup cache when possible."""
+        return cached_lookup(session, ('username', username), lambda: cls.get_by_username(session, username), UserSnapshot)
+
+    @classmethod
+    def delete_many(cls, session, user_ids, commit=True):
+        """Delete users with their workouts and workout exercises in set-based statements.
+
+        Everything is removed in one transaction and the row counts per table
+        are returned. Objects already loaded in the session are not updated.
+        """
+        counts = {'workout_exercises': 0, 'workouts': 0, 'users': 0}
+        try:
+            for chunk in id_chunks(user_ids):
+                # dropping the records first spares the triggers from recomputing them row by row
+                session.query(PersonalRecord).filter(PersonalRecord.user_id.in_(chunk)).delete(synchronize_session=False)
+                session.query(ArchivedPersonalRecord).filter(ArchivedPersonalRecord.user_id.in_(chunk)).delete(synchronize_session=False)
+                user_workouts = session.query(Workout.id).filter(Workout.user_id.in_(chunk))
+                counts['workout_exercises'] += session.query(WorkoutExercises).filter(WorkoutExercises.workout_id.in_(user_workouts)).delete(synchronize_session=False)
+                counts['workouts'] += session.query(Workout).filter(Workout.user_id.in_(chunk)).delete(synchronize_session=False)
+                counts['users'] += session.query(cls).filter(cls.id.in_(chunk)).delete(synchronize_session=False)
+                counts['workout_exercises'] += delete_archived(session, f"DELETE FROM {ARCHIVE_SCHEMA}.workout_exercises WHERE workout_id IN (SELECT id FROM {ARCHIVE_SCHEMA}.workouts WHERE user_id IN :ids)", chunk)
+                counts['workouts'] += delete_archived(session, f"DELETE FROM {ARCHIVE_SCHEMA}.workouts WHERE user_id IN :ids", chunk)
+                invalidate_lookups(session, 'user', chunk)
+                invalidate_lookups(session, 'workout', chunk, field='user_id')
+            workouts_changed(session)
+            commit_or_flush(session, commit)
+        except Exception:
+            session.rollback()
+            raise
+        return counts
+
+    @classmethod
+    def get_all(cls, session, rows=False):
+        """Get every user; with ``rows``, as UserSnapshot records instead of ORM instances."""
+        if rows:
+            return fetch_rows(session, select_rows(UserSnapshot, cls.__table__).order_by(cls.__table__.c.id), UserSnapshot)
         return session.query(cls).all()
 
     @classmethod
     def find_by_id(cls, session, user_id):
         return session.query(cls).filter_by(id=user_id).first()
     
+    @classmethod
+    def existing_ids(cls, session, user_ids):
+        """Return the set of ``user_ids`` that belong to a user, with one query."""
+        if not user_ids:
+            return set()
+        return set(session.execute(select(cls.__table__.c.id).where(cls.__table__.c.id.in_(set(user_ids)))).scalars())
+
     @classmethod
     def get_by_username(cls, session, username):
         try:
             return session.query(cls).filter(cls.username == username).one()
         except NoResultFound:
             return None
+
+    @classmethod
+    def bulk_insert(cls, session, rows):
+        """Insert many user rows (with password hashes already set) with one executemany. The caller commits."""
+        if rows:
+            session.execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def find_with_history(cls, session, user_id):
+        """Get a user with every workout and its exercises: three queries, plus one per further 500 workouts."""
+        return session.query(cls).options(
+            selectinload(cls.workouts).selectinload(Workout.exercises).joinedload(WorkoutExercises.exercise)
+        ).filter_by(id=user_id).first()
+
+    @classmethod
+    def page_after(cls, session, last_id, limit, rows=False):
+        """Get the page of users following ``last_id`` (the first page when None)."""
+        if rows:
+            return keyset_rows(session, select_rows(UserSnapshot, cls.__table__), cls.__table__.c.id, UserSnapshot, after_id=last_id, limit=limit)
+        return keyset_page(session.query(cls), cls.id, after_id=last_id, limit=limit)
+
+    @classmethod
+    def page_before(cls, session, first_id, limit, rows=False):
+        """Get the page of users preceding ``first_id``."""
+        if rows:
+            return keyset_rows(session, select_rows(UserSnapshot, cls.__table__), cls.__table__.c.id, UserSnapshot, before_id=first_id, limit=limit)
+        return keyset_page(session.query(cls), cls.id, before_id=first_id, limit=limit)
+
+    @classmethod
+    def stream(cls, session, batch_size=1000, rows=False):
+        """Iterate over all users without loading them all at once."""
+        if rows:
+            return stream_rows(session, select_rows(UserSnapshot, cls.__table__), cls.__table__.c.id, UserSnapshot, batch_size)
+        return stream_query(session.query(cls), cls.id, batch_size)
+
 class Workout(Base):
     __tablename__ = 'workouts'
     id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
     duration = Column(Integer)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+
+    __table_args__ = (
+        Index('ix_workouts_user_id_date', 'user_id', 'date'),
+        # IDs of archived workouts are never handed out again
+        {'sqlite_autoincrement': True},
+    )
 
     user = relationship('User', back_populates='workouts')
-    exercises = relationship('WorkoutExercises', back_populates='workout')
+    exercises = relationship('WorkoutExercises', back_populates='workout', cascade='all, delete-orphan', passive_deletes=True)
 
     @classmethod
-    def create(cls, session, date, duration, user_id):
+    def create(cls, session, date, duration, user_id, commit=True):
         workout = cls(date=date, duration=duration, user_id=user_id)
         session.add(workout)
-        session.commit()
+        commit_or_flush(session, commit)
         return workout
 
     @classmethod
     def delete(cls, session, workout_id):
-        workout = cls.find_by_id(session, workout_id)
-        if workout:
-            session.delete(workout)
-            session.commit()
+        cls.delete_many(session, [workout_id])
 
     @classmethod
-    def get_all(cls, session):
+    def lookup(cls, session, workout_id):
+        """Get a read-only snapshot of a workout by ID, served from the lookup cache when possible."""
+        return cached_lookup(session, ('workout', workout_id), lambda: cls.find_by_id(session, workout_id), WorkoutSnapshot)
+
+    @classmethod
+    def delete_many(cls, session, workout_ids, commit=True):
+        """Delete workouts with their workout exercises in set-based statements.
+
+        Everything is removed in one transaction and the row counts per table
+        are returned. Objects already loaded in the session are not updated.
+        """
+        counts = {'workout_exercises': 0, 'workouts': 0}
+        try:
+            for chunk in id_chunks(workout_ids):
+                counts['workout_exercises'] += session.query(WorkoutExercises).filter(WorkoutExercises.workout_id.in_(chunk)).delete(synchronize_session=False)
+                counts['workouts'] += session.query(cls).filter(cls.id.in_(chunk)).delete(synchronize_session=False)
+                keys = archived_record_keys(session, chunk)
+                counts['workout_exercises'] += delete_archived(session, f"DELETE FROM {ARCHIVE_SCHEMA}.workout_exercises WHERE workout_id IN :ids", chunk)
+                counts['workouts'] += delete_archived(session, f"DELETE FROM {ARCHIVE_SCHEMA}.workouts WHERE id IN :ids", chunk)
+                recompute_archived_records(session, keys)
+                invalidate_lookups(session, 'workout', chunk)
+            workouts_changed(session)
+            commit_or_flush(session, commit)
+        except Exception:
+            session.rollback()
+            raise
+        return counts
+
+    @classmethod
+    def get_all(cls, session, rows=False):
+        """Get every workout; with ``rows``, as WorkoutSnapshot records instead of ORM instances."""
+        if rows:
+            return fetch_rows(session, cls.rows_select().order_by(cls.__table__.c.id), WorkoutSnapshot)
         return session.query(cls).all()
 
     @classmethod
@@ -143,26 +588,136 @@ class Workout(Base):
         return session.query(cls).filter_by(id=workout_id).first()
 
     @classmethod
-    def get_user_workouts(cls, session, user_id):
-        """Get workouts for a specific user."""
-        return session.query(cls).filter(cls.user_id == user_id).all()
+    def get_user_workouts(cls, session, user_id, start=None, end=None, rows=False):
+        """Get workouts for a specific user, optionally only those from ``start`` to ``end`` (inclusive).
+
+        Archived workouts are included when the range starts before the archive cutoff.
+        """
+        if rows:
+            source = all_workouts if reaches_archive(session, start) else cls.__table__
+            return fetch_rows(session, cls.rows_select(user_id, start, end, source).order_by(source.c.date, source.c.id), WorkoutSnapshot)
+        workout = cls.range_entity(session, start)
+        return cls.user_range_query(session, user_id, start, end, workout).order_by(workout.date, workout.id).all()
+
+    @classmethod
+    def count_user_workouts(cls, session, user_id, start=None, end=None):
+        """Count a user's workouts, optionally only those from ``start`` to ``end`` (inclusive)."""
+        workout = cls.range_entity(session, start)
+        return cls.user_range_query(session, user_id, start, end, workout).with_entities(func.count(workout.id)).scalar()
+
+    @classmethod
+    def get_user_workouts_in_month(cls, session, user_id, year, month):
+        """Get a user's workouts in one calendar month."""
+        first_day = date(year, month, 1)
+        last_day = date(year, month, calendar.monthrange(year, month)[1])
+        return cls.get_user_workouts(session, user_id, first_day, last_day)
+
+    @classmethod
+    def range_entity(cls, session, start=None):
+        """Workout, or Workout mapped over all_workouts when ``start`` reaches into the archive."""
+        if reaches_archive(session, start):
+            return aliased(cls, all_workouts, adapt_on_names=True)
+        return cls
+
+    @classmethod
+    def user_range_query(cls, session, user_id, start=None, end=None, workout=None):
+        # a range scan of ix_workouts_user_id_date (in both databases through all_workouts)
+        workout = workout or cls
+        query = session.query(workout).filter(workout.user_id == user_id)
+        if start is not None:
+            query = query.filter(workout.date >= start)
+        if end is not None:
+            query = query.filter(workout.date <= end)
+        return query
+
+    @classmethod
+    def find_with_exercises(cls, session, workout_id):
+        """Get a workout with its exercise links and exercises in a single query."""
+        return session.query(cls).options(
+            joinedload(cls.exercises).joinedload(WorkoutExercises.exercise)
+        ).filter_by(id=workout_id).first()
+
+    @classmethod
+    def get_user_history(cls, session, user_id):
+        """Get a user's workouts with their exercises: two queries, plus one per further 500 workouts."""
+        return session.query(cls).options(
+            selectinload(cls.exercises).joinedload(WorkoutExercises.exercise)
+        ).filter(cls.user_id == user_id).order_by(cls.date, cls.id).all()
+
+    @classmethod
+    def page_query(cls, session, user_id=None):
+        query = session.query(cls)
+        if user_id is not None:
+            query = query.filter(cls.user_id == user_id)
+        return query
+
+    @classmethod
+    def rows_select(cls, user_id=None, start=None, end=None, table=None):
+        table = cls.__table__ if table is None else table
+        statement = select_rows(WorkoutSnapshot, table)
+        if user_id is not None:
+            statement = statement.where(table.c.user_id == user_id)
+        if start is not None:
+            statement = statement.where(table.c.date >= start)
+        if end is not None:
+            statement = statement.where(table.c.date <= end)
+        return statement
+
+    @classmethod
+    def page_after(cls, session, last_id, limit, user_id=None, rows=False):
+        """Get the page of workouts following ``last_id`` (the first page when None)."""
+        if rows:
+            return keyset_rows(session, cls.rows_select(user_id), cls.__table__.c.id, WorkoutSnapshot, after_id=last_id, limit=limit)
+        return keyset_page(cls.page_query(session, user_id), cls.id, after_id=last_id, limit=limit)
+
+    @classmethod
+    def page_before(cls, session, first_id, limit, user_id=None, rows=False):
+        """Get the page of workouts preceding ``first_id``."""
+        if rows:
+            return keyset_rows(session, cls.rows_select(user_id), cls.__table__.c.id, WorkoutSnapshot, before_id=first_id, limit=limit)
+        return keyset_page(cls.page_query(session, user_id), cls.id, before_id=first_id, limit=limit)
+
+    @classmethod
+    def stream(cls, session, batch_size=1000, user_id=None, rows=False):
+        """Iterate over all workouts without loading them all at once."""
+        if rows:
+            return stream_rows(session, cls.rows_select(user_id), cls.__table__.c.id, WorkoutSnapshot, batch_size)
+        return stream_query(cls.page_query(session, user_id), cls.id, batch_size)
+
+    @classmethod
+    def max_id(cls, session):
+        """Get the highest assigned workout ID, archived workouts included (0 when there are none)."""
+        highest = session.query(func.max(cls.id)).scalar() or 0
+        if archive_attached(session):
+            highest = max(highest, session.execute(text(f"SELECT max(id) FROM {ARCHIVE_SCHEMA}.workouts")).scalar() or 0)
+        return highest
+
+    @classmethod
+    def bulk_insert(cls, session, rows):
+        """Insert many workout rows with one executemany. The caller commits."""
+        if rows:
+            session.execute(cls.__table__.insert(), rows)
 
 class WorkoutExercises(Base):
     __tablename__ = 'workout_exercises'
 
-    workout_id = Column(Integer, ForeignKey('workouts.id'), primary_key=True)
-    exercise_id = Column(Integer, ForeignKey('exercises.id'), primary_key=True)
+    workout_id = Column(Integer, ForeignKey('workouts.id', ondelete='CASCADE'), primary_key=True)
+    exercise_id = Column(Integer, ForeignKey('exercises.id', ondelete='CASCADE'), primary_key=True)
     sets_completed = Column(Integer)
     reps_completed = Column(Integer)
 
+    __table_args__ = (
+        Index('ix_workout_exercises_exercise_id', 'exercise_id'),
+    )
+
     exercise = relationship('Exercise', back_populates='workouts')
     workout = relationship('Workout', back_populates='exercises')
 
     @classmethod
-    def create(cls, session, workout_id, exercise_id, sets_completed, reps_completed):
+    def create(cls, session, workout_id, exercise_id, sets_completed, reps_completed, commit=True):
         workout_exercise = cls(workout_id=workout_id, exercise_id=exercise_id, sets_completed=sets_completed, reps_completed=reps_completed)
         session.add(workout_exercise)
-        session.commit()
+        commit_or_flush(session, commit)
         return workout_exercise
 
     @classmethod
@@ -179,3 +734,281 @@ class WorkoutExercises(Base):
     @classmethod
     def find_by_ids(cls, session, workout_id, exercise_id):
         return session.query(cls).filter_by(workout_id=workout_id, exercise_id=exercise_id).first()
+
+    @classmethod
+    def bulk_insert(cls, session, rows):
+        """Insert many workout/exercise links with one executemany. The caller commits."""
+        if rows:
+            session.execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def add_sets_many(cls, session, rows):
+        """Add completed sets to many links with one executemany. The caller commits.
+
+        Rows for a link that already exists are merged into it like
+        services.add_exercise_sets does: sets are summed and reps averaged
+        over them, rounded halves up in integer arithmetic as
+        services.average_reps does. Needs SQLite or PostgreSQL for the upsert.
+        """
+        if not rows:
+            return
+        dialect = session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            raise ValueError(f"Adding sets needs an upsert, available on SQLite and PostgreSQL but not {dialect}")
+        table = cls.__table__
+        statement = insert(table)
+        sets, reps = func.coalesce(table.c.sets_completed, 0), func.coalesce(table.c.reps_completed, 0)
+        new_sets, new_reps = func.coalesce(statement.excluded.sets_completed, 0), func.coalesce(statement.excluded.reps_completed, 0)
+        total_sets = sets + new_sets
+        # both databases truncate integer division, so this is average_reps
+        average = (2 * (sets * reps + new_sets * new_reps) + total_sets) / func.nullif(2 * total_sets, 0)
+        workouts_changed(session)
+        session.execute(statement.on_conflict_do_update(index_elements=[table.c.workout_id, table.c.exercise_id], set_={
+            'sets_completed': total_sets,
+            'reps_completed': func.coalesce(average, new_reps),
+        }), rows)
+
+class DataVersion(Base):
+    """A counter per group of tables, bumped by transactions that edit or delete their rows; see workouts_changed."""
+    __tablename__ = 'data_versions'
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+# Best sets, reps and volume (sets x reps) per user and exercise, each with the
+# first workout that reached it. Ties go to the lowest workout ID.
+PERSONAL_RECORDS_SELECT = """
+    SELECT user_id, exercise_id,
+           max(sets), max(CASE WHEN sets_rank = 1 THEN workout_id END),
+           max(reps), max(CASE WHEN reps_rank = 1 THEN workout_id END),
+           max(volume), max(CASE WHEN volume_rank = 1 THEN workout_id END)
+    FROM (
+        SELECT user_id, exercise_id, workout_id, sets, reps, volume,
+               row_number() OVER (PARTITION BY user_id, exercise_id ORDER BY sets DESC, workout_id) AS sets_rank,
+               row_number() OVER (PARTITION BY user_id, exercise_id ORDER BY reps DESC, workout_id) AS reps_rank,
+               row_number() OVER (PARTITION BY user_id, exercise_id ORDER BY volume DESC, workout_id) AS volume_rank
+        FROM (
+            SELECT w.user_id, we.exercise_id, we.workout_id,
+                   coalesce(we.sets_completed, 0) AS sets,
+                   coalesce(we.reps_completed, 0) AS reps,
+                   coalesce(we.sets_completed, 0) * coalesce(we.reps_completed, 0) AS volume
+            FROM {workout_exercises} we
+            JOIN {workouts} w ON w.id = we.workout_id
+            JOIN users u ON u.id = w.user_id
+            JOIN exercises e ON e.id = we.exercise_id
+            {where}
+            {archived_bests}
+        ) candidates
+    ) ranked
+    GROUP BY user_id, exercise_id
+"""
+PERSONAL_RECORDS_COLUMNS = "user_id, exercise_id, best_sets, best_sets_workout_id, best_reps, best_reps_workout_id, best_volume, best_volume_workout_id"
+
+# Each archived best as a candidate row that can only win its own metric, so
+# the bests rank against the hot rows as the archived rows themselves would.
+ARCHIVED_BESTS = """
+            UNION ALL SELECT a.user_id, a.exercise_id, a.best_sets_workout_id, a.best_sets, -1, -1 FROM archived_personal_records a {where}
+            UNION ALL SELECT a.user_id, a.exercise_id, a.best_reps_workout_id, -1, a.best_reps, -1 FROM archived_personal_records a {where}
+            UNION ALL SELECT a.user_id, a.exercise_id, a.best_volume_workout_id, -1, -1, a.best_volume FROM archived_personal_records a {where}"""
+
+def personal_records_select(where='', archived=False, archived_where=None):
+    """PERSONAL_RECORDS_SELECT over the hot tables, or with ``archived`` over the hot and archived ones.
+
+    With ``archived_where`` (a WHERE clause on ``a``, or '' for all rows) the
+    matching archived bests in archived_personal_records count as well, which
+    is how records see archived workouts without reading the archive.
+    """
+    archived_bests = ARCHIVED_BESTS.format(where=archived_where) if archived_where is not None else ''
+    if archived:
+        return PERSONAL_RECORDS_SELECT.format(where=where, workouts='all_workouts', workout_exercises='all_workout_exercises', archived_bests=archived_bests)
+    return PERSONAL_RECORDS_SELECT.format(where=where, workouts='workouts', workout_exercises='workout_exercises', archived_bests=archived_bests)
+
+def archived_records_select(where=''):
+    """PERSONAL_RECORDS_SELECT over the archived tables only, for archived_personal_records"""
+    return PERSONAL_RECORDS_SELECT.format(
+        where=where, workouts=f'{ARCHIVE_SCHEMA}.workouts', workout_exercises=f'{ARCHIVE_SCHEMA}.workout_exercises', archived_bests='',
+    )
+
+def recompute_where(workout_id, exercise_id):
+    # the unary + keeps SQLite off ix_workout_exercises_exercise_id, which would read every
+    # user's rows for the exercise; it starts from the user's workouts and probes the primary key
+    return f"WHERE w.user_id = (SELECT user_id FROM workouts WHERE id = {workout_id}) AND +we.exercise_id = {exercise_id}"
+
+def recompute_archived_where(workout_id, exercise_id):
+    return f"WHERE a.user_id = (SELECT user_id FROM workouts WHERE id = {workout_id}) AND a.exercise_id = {exercise_id}"
+
+def recompute_personal_record(workout_id, exercise_id, archived_bests=True):
+    """Trigger statements that recompute one (user, exercise) record from the remaining rows and the archived bests"""
+    user_id = f"(SELECT user_id FROM workouts WHERE id = {workout_id})"
+    archived_where = recompute_archived_where(workout_id, exercise_id) if archived_bests else None
+    select = personal_records_select(recompute_where(workout_id, exercise_id), archived_where=archived_where)
+    return f"""
+        DELETE FROM personal_records WHERE user_id = {user_id} AND exercise_id = {exercise_id};
+        INSERT INTO personal_records ({PERSONAL_RECORDS_COLUMNS}) {select};"""
+
+def improve_record(metric):
+    better = f"excluded.best_{metric} > best_{metric} OR (excluded.best_{metric} = best_{metric} AND excluded.best_{metric}_workout_id < best_{metric}_workout_id)"
+    return f"best_{metric}_workout_id = CASE WHEN {better} THEN excluded.best_{metric}_workout_id ELSE best_{metric}_workout_id END, best_{metric} = max(best_{metric}, excluded.best_{metric})"
+
+def personal_record_triggers(archived_bests=True):
+    """The CREATE TRIGGER statements; without ``archived_bests`` records are recomputed from hot rows only"""
+    return [
+        # inserts only ever raise a record, so they are an upsert of the new row
+        f"""CREATE TRIGGER IF NOT EXISTS personal_records_after_insert AFTER INSERT ON workout_exercises
+        BEGIN
+            INSERT INTO personal_records ({PERSONAL_RECORDS_COLUMNS})
+            SELECT w.user_id, NEW.exercise_id,
+                   coalesce(NEW.sets_completed, 0), NEW.workout_id,
+                   coalesce(NEW.reps_completed, 0), NEW.workout_id,
+                   coalesce(NEW.sets_completed, 0) * coalesce(NEW.reps_completed, 0), NEW.workout_id
+            FROM workouts w WHERE w.id = NEW.workout_id
+            ON CONFLICT (user_id, exercise_id) DO UPDATE SET {improve_record('sets')}, {improve_record('reps')}, {improve_record('volume')};
+        END""",
+        # a delete only matters if the row held one of the records; then that record is recomputed
+        f"""CREATE TRIGGER IF NOT EXISTS personal_records_after_delete AFTER DELETE ON workout_exercises
+        WHEN EXISTS (
+            SELECT 1 FROM personal_records
+            WHERE user_id = (SELECT user_id FROM workouts WHERE id = OLD.workout_id) AND exercise_id = OLD.exercise_id
+              AND OLD.workout_id IN (best_sets_workout_id, best_reps_workout_id, best_volume_workout_id)
+        )
+        BEGIN {recompute_personal_record('OLD.workout_id', 'OLD.exercise_id', archived_bests)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS personal_records_after_update AFTER UPDATE ON workout_exercises
+        BEGIN {recompute_personal_record('OLD.workout_id', 'OLD.exercise_id', archived_bests)} {recompute_personal_record('NEW.workout_id', 'NEW.exercise_id', archived_bests)}
+        END""",
+        # remove a workout's exercises while the workout still exists, so the delete trigger can find its user
+        """CREATE TRIGGER IF NOT EXISTS personal_records_before_workout_delete BEFORE DELETE ON workouts
+        BEGIN
+            DELETE FROM workout_exercises WHERE workout_id = OLD.id;
+        END""",
+    ]
+
+PERSONAL_RECORD_TRIGGERS = personal_record_triggers()
+
+class PersonalRecord(Base):
+    """A user's best sets, reps and volume for one exercise.
+
+    On SQLite the table is kept current by triggers on workout_exercises, so
+    every write path (ORM, executemany, cascades) updates it. On other
+    databases run ``rebuild`` after changing workouts. The triggers recompute
+    from the hot workouts and the archived bests in ArchivedPersonalRecord,
+    so records set by archived workouts are kept; ``rebuild`` reads both
+    databases.
+    """
+    __tablename__ = 'personal_records'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    exercise_id = Column(Integer, ForeignKey('exercises.id', ondelete='CASCADE'), primary_key=True)
+    best_sets = Column(Integer, nullable=False)
+    best_sets_workout_id = Column(Integer, nullable=False)
+    best_reps = Column(Integer, nullable=False)
+    best_reps_workout_id = Column(Integer, nullable=False)
+    best_volume = Column(Integer, nullable=False)
+    best_volume_workout_id = Column(Integer, nullable=False)
+
+    exercise = relationship('Exercise')
+
+    @classmethod
+    def find(cls, session, user_id, exercise_id):
+        return session.query(cls).filter_by(user_id=user_id, exercise_id=exercise_id).first()
+
+    @classmethod
+    def get_user_records(cls, session, user_id):
+        """Get a user's records with their exercises, best volume first."""
+        return session.query(cls).options(joinedload(cls.exercise)).filter(cls.user_id == user_id).order_by(cls.best_volume.desc(), cls.exercise_id).all()
+
+    @classmethod
+    def set_by_workout(cls, session, workout_id):
+        """Get the records currently held by a workout, i.e. whether logging it set a PR."""
+        user_id = session.query(Workout.user_id).filter(Workout.id == workout_id).scalar_subquery()
+        held = (cls.best_sets_workout_id == workout_id) | (cls.best_reps_workout_id == workout_id) | (cls.best_volume_workout_id == workout_id)
+        return session.query(cls).options(joinedload(cls.exercise)).filter(cls.user_id == user_id, held).all()
+
+    @classmethod
+    def expected_rows(cls, session):
+        return session.execute(text(personal_records_select(archived=archive_attached(session)))).all()
+
+    @classmethod
+    def rebuild(cls, session, commit=True):
+        """Recompute every record from workout_exercises, archived ones included, and return how many there are."""
+        if archive_attached(session):
+            session.query(ArchivedPersonalRecord).delete(synchronize_session=False)
+            session.execute(text(f"INSERT INTO archived_personal_records ({PERSONAL_RECORDS_COLUMNS}) {archived_records_select()}"))
+        session.query(cls).delete(synchronize_session=False)
+        # the archived bests stand in for the archive when it is not attached
+        session.execute(text(f"INSERT INTO personal_records ({PERSONAL_RECORDS_COLUMNS}) {personal_records_select(archived_where='')}"))
+        commit_or_flush(session, commit)
+        return session.query(func.count()).select_from(cls).scalar()
+
+    @classmethod
+    def check(cls, session):
+        """Compare the stored records with a fresh computation and describe each difference."""
+        columns = PERSONAL_RECORDS_COLUMNS.split(', ')
+        expected = {row[:2]: tuple(row) for row in cls.expected_rows(session)}
+        stored = {row[:2]: tuple(row) for row in session.query(*(getattr(cls, column) for column in columns))}
+        problems = []
+        for key in sorted(expected.keys() | stored.keys()):
+            if key not in stored:
+                problems.append(f"user {key[0]} exercise {key[1]}: missing record {expected[key][2:]}")
+            elif key not in expected:
+                problems.append(f"user {key[0]} exercise {key[1]}: stale record {stored[key][2:]}")
+            elif stored[key] != expected[key]:
+                problems.append(f"user {key[0]} exercise {key[1]}: stored {stored[key][2:]}, expected {expected[key][2:]}")
+        return problems
+
+class ArchivedPersonalRecord(Base):
+    """A user's best sets, reps and volume for one exercise among their archived workouts.
+
+    Kept in the main database so the personal record triggers, which cannot
+    read the attached archive, still count archived workouts. Written when
+    workouts are archived (see archive.py) and when archived workouts are
+    deleted.
+    """
+    __tablename__ = 'archived_personal_records'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    exercise_id = Column(Integer, ForeignKey('exercises.id', ondelete='CASCADE'), primary_key=True)
+    best_sets = Column(Integer, nullable=False)
+    best_sets_workout_id = Column(Integer, nullable=False)
+    best_reps = Column(Integer, nullable=False)
+    best_reps_workout_id = Column(Integer, nullable=False)
+    best_volume = Column(Integer, nullable=False)
+    best_volume_workout_id = Column(Integer, nullable=False)
+
+ARCHIVED_RECORD_KEYS = f"""
+    SELECT DISTINCT w.user_id, we.exercise_id FROM {ARCHIVE_SCHEMA}.workout_exercises we JOIN {ARCHIVE_SCHEMA}.workouts w ON w.id = we.workout_id
+    WHERE we.workout_id IN :ids"""
+RECOMPUTE_ARCHIVED_RECORD = [
+    "DELETE FROM archived_personal_records WHERE user_id = :user_id AND exercise_id = :exercise_id",
+    f"INSERT INTO archived_personal_records ({PERSONAL_RECORDS_COLUMNS}) {archived_records_select('WHERE w.user_id = :user_id AND we.exercise_id = :exercise_id')}",
+    "DELETE FROM personal_records WHERE user_id = :user_id AND exercise_id = :exercise_id",
+    f"""INSERT INTO personal_records ({PERSONAL_RECORDS_COLUMNS}) {personal_records_select(
+        'WHERE w.user_id = :user_id AND +we.exercise_id = :exercise_id', archived_where='WHERE a.user_id = :user_id AND a.exercise_id = :exercise_id'
+    )}""",
+]
+
+def archived_record_keys(session, workout_ids):
+    """The (user, exercise) pairs of archived workouts, whose archived bests change when they are deleted"""
+    if not archive_attached(session):
+        return []
+    return session.execute(text(ARCHIVED_RECORD_KEYS).bindparams(bindparam('ids', expanding=True)), {'ids': list(workout_ids)}).all()
+
+def recompute_archived_records(session, keys):
+    """Recompute the archived bests and the records of (user, exercise) pairs after archived rows were deleted"""
+    for user_id, exercise_id in keys:
+        for statement in RECOMPUTE_ARCHIVED_RECORD:
+            session.execute(text(statement), {'user_id': user_id, 'exercise_id': exercise_id})
+
+@event.listens_for(Base.metadata, 'after_create')
+def create_personal_record_triggers(metadata, connection, tables=(), **kw):
+    if connection.dialect.name != 'sqlite':
+        return
+    for trigger in PERSONAL_RECORD_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    if PersonalRecord.__table__ in tables:
+        # a new records table next to existing workouts starts out filled in
+        connection.exec_driver_sql(f"INSERT INTO personal_records ({PERSONAL_RECORDS_COLUMNS}) {personal_records_select()}")
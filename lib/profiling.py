@@ -0,0 +1,133 @@
+"""Per-call-site timing for CLI commands, model methods and the SQL they run.
+
+A Profiler wraps each CLI command and each model classmethod in a timer and
+listens to the engine's cursor events. Every SQL statement is charged to the
+innermost call site running when it executes. The collected numbers can be
+printed as a table or written as JSON to compare releases.
+"""
+import functools
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class CallSiteStats:
+    def __init__(self):
+        self.durations = []
+        self.statements = 0
+        self.sql_seconds = 0.0
+        # None until a call returns a list of rows
+        self.rows = None
+
+    def summary(self):
+        durations = sorted(self.durations)
+        return {
+            'calls': len(durations),
+            'total_ms': sum(durations) * 1000,
+            'p50_ms': percentile(durations, 0.50) * 1000,
+            'p95_ms': percentile(durations, 0.95) * 1000,
+            'p99_ms': percentile(durations, 0.99) * 1000,
+            'statements': self.statements,
+            'sql_ms': self.sql_seconds * 1000,
+            'rows': self.rows,
+        }
+
+def count_rows(result):
+    """Rows in a returned list, or None for anything else (a single instance, a scalar, a query or an iterator)"""
+    if isinstance(result, list) or (isinstance(result, tuple) and not hasattr(result, '_fields')):
+        return len(result)
+    return None
+
+class Profiler:
+    def __init__(self):
+        self.stats = defaultdict(CallSiteStats)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.instrumented = set()
+
+    def call_stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def timed(self, name, func):
+        """Wrap ``func`` so its calls, duration and returned rows are recorded under ``name``"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = self.call_stack()
+            stack.append(name)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                with self.lock:
+                    stats = self.stats[name]
+                    stats.durations.append(elapsed)
+                    rows = count_rows(result)
+                    if rows is not None:
+                        stats.rows = (stats.rows or 0) + rows
+        return wrapper
+
+    def instrument_models(self, *model_classes):
+        """Time every classmethod defined on the given model classes"""
+        for model in model_classes:
+            for attribute, value in list(vars(model).items()):
+                if isinstance(value, classmethod) and (model, attribute) not in self.instrumented:
+                    setattr(model, attribute, classmethod(self.timed(f"{model.__name__}.{attribute}", value.__func__)))
+                    self.instrumented.add((model, attribute))
+
+    def instrument_commands(self, group):
+        """Time the callback of every command in a click group"""
+        for name, command in group.commands.items():
+            if (group, name) not in self.instrumented and command.callback is not None:
+                command.callback = self.timed(f"cli {name}", command.callback)
+                self.instrumented.add((group, name))
+
+    def attach_engine(self, engine):
+        """Count and time every statement the engine executes"""
+        if engine in self.instrumented:
+            return
+        self.instrumented.add(engine)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('profiler_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info['profiler_start'].pop()
+            stack = self.call_stack()
+            with self.lock:
+                stats = self.stats[stack[-1] if stack else 'sql (no call site)']
+                stats.statements += 1
+                stats.sql_seconds += elapsed
+
+    def report(self):
+        return {name: stats.summary() for name, stats in sorted(self.stats.items())}
+
+    def format_table(self):
+        from prettytable import PrettyTable
+        table = PrettyTable()
+        table.field_names = ["Call site", "Calls", "Total ms", "p50 ms", "p95 ms", "p99 ms", "SQL stmts", "SQL ms", "Rows"]
+        table.align["Call site"] = 'l'
+        for name, summary in sorted(self.report().items(), key=lambda item: item[1]['total_ms'] or item[1]['sql_ms'], reverse=True):
+            table.add_row([name, summary['calls'], f"{summary['total_ms']:.2f}", f"{summary['p50_ms']:.2f}", f"{summary['p95_ms']:.2f}", f"{summary['p99_ms']:.2f}", summary['statements'], f"{summary['sql_ms']:.2f}", 'n/a' if summary['rows'] is None else summary['rows']])
+        return table
+
+    def write_json(self, path):
+        with open(path, 'w') as file:
+            json.dump({'generated_at': datetime.now().isoformat(timespec='seconds'), 'call_sites': self.report()}, file, indent=2)
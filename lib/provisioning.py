@@ -0,0 +1,99 @@
+"""Bulk user provisioning with password hashing spread across processes.
+
+Password hashing is deliberately slow and CPU bound, so it runs in a
+ProcessPoolExecutor while the main process validates records and inserts each
+batch of hashed users with one executemany and one commit.
+"""
+import functools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from models import User, hash_password
+
+class ProvisioningStats:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.seconds = {'validate': 0.0, 'hash': 0.0, 'insert': 0.0}
+
+    def throughput(self, stage):
+        return self.created / self.seconds[stage] if self.seconds[stage] else 0.0
+
+def parse_user_record(record):
+    """Validate a raw user record and return the column values with its password"""
+    username = str(record.get('username') or '').strip()
+    password = str(record.get('password') or '')
+    name = str(record.get('name') or '').strip()
+    if not username or not password or not name:
+        raise ValueError("username, password and name are required")
+    age = record.get('age')
+    age = int(age) if age not in (None, '') else None
+    if age is not None and age <= 0:
+        raise ValueError("age must be a positive integer")
+    return {'username': username, 'name': name, 'age': age, 'fitness_goals': record.get('fitness_goals') or None}, password
+
+def batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def provision_users(session, records, batch_size=1000, workers=None, method=None, salt_length=None, on_batch=None):
+    """Create users from an iterable of dicts, hashing passwords in parallel.
+
+    Usernames that already exist, or repeat within ``records``, are skipped.
+    Each batch is committed on its own. ``on_batch(stats)`` is called after
+    every commit so callers can report progress.
+    """
+    stats = ProvisioningStats()
+    workers = workers or os.cpu_count() or 1
+    seen = set()
+    hasher = functools.partial(hash_password, method=method, salt_length=salt_length)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for raw_batch in batches(records, batch_size):
+            start = time.perf_counter()
+            rows, passwords = [], []
+            for record in raw_batch:
+                try:
+                    row, password = parse_user_record(record)
+                except (TypeError, ValueError):
+                    stats.rejected += 1
+                    continue
+                if row['username'] in seen:
+                    stats.skipped += 1
+                    continue
+                seen.add(row['username'])
+                rows.append(row)
+                passwords.append(password)
+            existing = {username for (username,) in session.query(User.username).filter(User.username.in_([row['username'] for row in rows]))}
+            if existing:
+                keep = [index for index, row in enumerate(rows) if row['username'] not in existing]
+                stats.skipped += len(rows) - len(keep)
+                rows = [rows[index] for index in keep]
+                passwords = [passwords[index] for index in keep]
+            stats.seconds['validate'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            chunksize = max(1, len(passwords) // (4 * workers))
+            for row, password_hash in zip(rows, executor.map(hasher, passwords, chunksize=chunksize)):
+                row['password_hash'] = password_hash
+            stats.seconds['hash'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            try:
+                User.bulk_insert(session, rows)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            stats.seconds['insert'] += time.perf_counter() - start
+            stats.created += len(rows)
+            if on_batch is not None:
+                on_batch(stats)
+    return stats
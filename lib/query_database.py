@@ -7,22 +7,22 @@ DBSession, engine = setup_database()
 DBSession.configure(bind=engine)
 session = DBSession()
 
-users = session.query(User).all()
+users = User.stream(session, rows=True)
 
 for user in users:
     print(f"User ID: {user.id}, Name: {user.name}, Age: {user.age}, Fitness Goals: {user.fitness_goals}")
 
-workouts = session.query(Workout).all()
+workouts = Workout.stream(session, rows=True)
 
 for workout in workouts:
     print(f"Workout ID: {workout.id}, Date: {workout.date}, Duration: {workout.duration}, User ID: {workout.user_id}")
 
-exercises = session.query(Exercise).all()
+exercises = Exercise.stream(session, rows=True)
 
 for exercise in exercises:
     print(f"Exercise ID: {exercise.id}, Name: {exercise.name}, Type: {exercise.type}, Difficulty: {exercise.difficulty}, Sets: {exercise.sets}, Reps: {exercise.reps}")
 
-workout_exercises = session.query(WorkoutExercises).all()
+workout_exercises = session.query(WorkoutExercises).yield_per(1000)
 
 for we in workout_exercises:
     print(f"Workout Exercise - Workout ID: {we.workout_id}, Exercise ID: {we.exercise_id}, Sets Completed: {we.sets_completed}, Reps Completed: {we.reps_completed}")
@@ -0,0 +1,100 @@
+"""Deterministic synthetic data for benchmarking the model layer.
+
+The same seed and sizes always produce the same users, workouts and exercise
+links, so benchmark runs on different machines and releases are comparable.
+Rows are generated lazily and written with executemany in large batches.
+
+    python seed_data.py --database sqlite:///bench.db --users 10000 --workouts 500
+"""
+import random
+import time
+from datetime import date, timedelta
+import click
+from database import setup_database
+from models import User, Workout, Exercise, WorkoutExercises
+
+EXERCISE_CATALOG = {
+    'core': ['Plank', 'Crunch', 'Russian Twist', 'Hanging Leg Raise', 'Dead Bug'],
+    'cardio': ['Run', 'Row', 'Bike', 'Jump Rope', 'Stair Climber'],
+    'chest': ['Bench Press', 'Incline Press', 'Push Up', 'Chest Fly', 'Dip'],
+    'triceps': ['Skull Crusher', 'Pushdown', 'Close Grip Bench', 'Overhead Extension', 'Kickback'],
+    'shoulders': ['Overhead Press', 'Lateral Raise', 'Face Pull', 'Arnold Press', 'Upright Row'],
+    'back': ['Deadlift', 'Pull Up', 'Barbell Row', 'Lat Pulldown', 'Seated Row'],
+    'biceps': ['Curl', 'Hammer Curl', 'Preacher Curl', 'Chin Up', 'Concentration Curl'],
+    'legs': ['Squat', 'Lunge', 'Leg Press', 'Romanian Deadlift', 'Calf Raise'],
+}
+FIRST_DATE = date(2015, 1, 1)
+PASSWORD = 'password'
+
+def catalog_rows():
+    rows = []
+    for exercise_type, names in EXERCISE_CATALOG.items():
+        for name in names:
+            rows.append({'name': name, 'type': exercise_type, 'difficulty': len(name) % 5 + 1, 'sets': 3, 'reps': 10})
+    return rows
+
+def generate_rows(rng, users, workouts_per_user, exercises_per_workout, exercise_ids, password_hash, first_user_id, first_workout_id):
+    """Yield (users, workouts, links) row lists one user at a time"""
+    workout_id = first_workout_id
+    for user_id in range(first_user_id, first_user_id + users):
+        user = {'id': user_id, 'username': f'user{user_id}', 'password_hash': password_hash, 'name': f'User {user_id}', 'age': rng.randint(16, 80), 'fitness_goals': rng.choice(['Lose weight', 'Build muscle', 'Run a marathon', 'Stay healthy'])}
+        workouts, links = [], []
+        workout_date = FIRST_DATE + timedelta(days=rng.randint(0, 365))
+        for _ in range(workouts_per_user):
+            workouts.append({'id': workout_id, 'date': workout_date, 'duration': rng.randint(15, 120), 'user_id': user_id})
+            for exercise_id in rng.sample(exercise_ids, exercises_per_workout):
+                links.append({'workout_id': workout_id, 'exercise_id': exercise_id, 'sets_completed': rng.randint(1, 6), 'reps_completed': rng.randint(1, 20)})
+            workout_id += 1
+            workout_date += timedelta(days=rng.randint(1, 3))
+        yield user, workouts, links
+
+def populate(session, users, workouts_per_user, exercises_per_workout=4, seed=0, batch_size=50000):
+    """Add ``users`` users with ``workouts_per_user`` workouts each and return the number of rows written"""
+    from werkzeug.security import generate_password_hash
+    rng = random.Random(seed)
+    if not session.query(Exercise.id).first():
+        Exercise.bulk_insert(session, catalog_rows())
+    exercise_ids = [row.id for row in session.query(Exercise.id).order_by(Exercise.id)]
+    exercises_per_workout = min(exercises_per_workout, len(exercise_ids))
+    first_user_id = (session.query(User.id).order_by(User.id.desc()).limit(1).scalar() or 0) + 1
+    first_workout_id = Workout.max_id(session) + 1
+    password_hash = generate_password_hash(PASSWORD)
+
+    written = 0
+    user_rows, workout_rows, link_rows = [], [], []
+
+    def flush():
+        User.bulk_insert(session, user_rows)
+        Workout.bulk_insert(session, workout_rows)
+        WorkoutExercises.bulk_insert(session, link_rows)
+        session.commit()
+        user_rows.clear()
+        workout_rows.clear()
+        link_rows.clear()
+
+    for user, workouts, links in generate_rows(rng, users, workouts_per_user, exercises_per_workout, exercise_ids, password_hash, first_user_id, first_workout_id):
+        user_rows.append(user)
+        workout_rows.extend(workouts)
+        link_rows.extend(links)
+        written += 1 + len(workouts) + len(links)
+        if len(workout_rows) + len(link_rows) >= batch_size:
+            flush()
+    flush()
+    return written
+
+@click.command()
+@click.option('--database', help='Database URL (defaults to the FITNESS_TRACKER_DATABASE_URL setting)')
+@click.option('--users', default=1000, show_default=True, type=click.IntRange(min=1), help='Users to create')
+@click.option('--workouts', default=100, show_default=True, type=click.IntRange(min=0), help='Workouts per user')
+@click.option('--exercises', default=4, show_default=True, type=click.IntRange(min=0), help='Exercises per workout')
+@click.option('--seed', default=0, show_default=True, help='Random seed')
+def seed_data(database, users, workouts, exercises, seed):
+    """Populate a database with deterministic synthetic users and workouts"""
+    Session, engine = setup_database(database)
+    start = time.perf_counter()
+    written = populate(Session(), users, workouts, exercises, seed)
+    elapsed = time.perf_counter() - start
+    click.echo(f"Wrote {written} rows in {elapsed:.1f}s ({written / elapsed:,.0f} rows/sec) to {engine.url}")
+
+if __name__ == '__main__':
+    seed_data()
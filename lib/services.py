@@ -0,0 +1,71 @@
+from models import User, Workout, Exercise, WorkoutExercises, lookup_cache, workouts_changed
+
+def average_reps(total_reps, sets):
+    """Reps per set rounded to the nearest whole rep, halves up, in integer arithmetic"""
+    return (2 * total_reps + sets) // (2 * sets)
+
+def add_exercise_sets(links, exercise_id, sets, reps):
+    """Record sets against an exercise, merging repeats of the same exercise.
+
+    A workout has one link row per catalog exercise, so repeated entries are
+    combined into the total number of sets with the reps averaged over them.
+    Only whole reps are stored, so the merged total (sets x reps) can be off
+    by up to half a rep per set: 3x10 and 1x5 become 4x9.
+    """
+    if exercise_id in links:
+        previous_sets, previous_reps = links[exercise_id]
+        total_sets = previous_sets + sets
+        links[exercise_id] = (total_sets, average_reps(previous_sets * previous_reps + sets * reps, total_sets))
+    else:
+        links[exercise_id] = (sets, reps)
+
+def log_workout(session, user_id, date, duration, exercises):
+    """Log a workout and all of its exercises in a single transaction.
+
+    ``exercises`` is an iterable of dicts with ``name``, ``type``, ``difficulty``,
+    ``sets`` and ``reps`` keys. Exercises are looked up in the catalog by name
+    and type and only added when new. Nothing is written if any part of the
+    workout fails.
+    """
+    try:
+        workout = Workout.create(session, date=date, duration=duration, user_id=user_id, commit=False)
+        links = {}
+        for exercise_data in exercises:
+            exercise_id = Exercise.get_or_create_id(session, name=exercise_data['name'], exercise_type=exercise_data['type'], difficulty=exercise_data['difficulty'], sets=exercise_data['sets'], reps=exercise_data['reps'], commit=False)
+            add_exercise_sets(links, exercise_id, exercise_data['sets'], exercise_data['reps'])
+        for exercise_id, (sets, reps) in links.items():
+            WorkoutExercises.create(session, workout_id=workout.id, exercise_id=exercise_id, sets_completed=sets, reps_completed=reps, commit=False)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return workout
+
+def purge_orphans(session, dry_run=False):
+    """Delete workouts without a user and workout exercises without a workout or exercise.
+
+    These are left behind by deletes made before foreign keys were enforced.
+    Returns the number of rows per table; with ``dry_run`` they are only
+    counted.
+    """
+    orphan_workouts = session.query(Workout).filter(~Workout.user_id.in_(session.query(User.id)))
+    orphan_links = session.query(WorkoutExercises).filter(
+        ~WorkoutExercises.workout_id.in_(session.query(Workout.id).filter(Workout.user_id.in_(session.query(User.id))))
+        | ~WorkoutExercises.exercise_id.in_(session.query(Exercise.id))
+    )
+    if dry_run:
+        return {'workout_exercises': orphan_links.count(), 'workouts': orphan_workouts.count()}
+    try:
+        counts = {
+            'workout_exercises': orphan_links.delete(synchronize_session=False),
+            'workouts': orphan_workouts.delete(synchronize_session=False),
+        }
+        if any(counts.values()):
+            workouts_changed(session)
+        session.commit()
+        if counts['workouts']:
+            lookup_cache(session).clear()
+    except Exception:
+        session.rollback()
+        raise
+    return counts